@@ -0,0 +1,306 @@
+"""
+Async versions of the read-only lookup endpoints, for deployments served through
+falsecaller.asgi. They answer the same query parameters with the same payloads as the
+views in views.py and share their lookup cache entries, but query through the async ORM
+and cache API, so a waiting request holds no worker thread. display_detail awaits its
+three lookups together with asyncio.gather.
+"""
+import asyncio
+import logging
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from authentication.backends import CachedJWTAuthentication
+from authentication.models import Contact, NameTrigram, NumberIdentity, SpamAggregate
+from authentication.phone import phone_key
+from falsecaller.routers import read_from_replica
+from .bloom import spam_filter
+from .cache import contacts_key, identity_key, lookup_cache, spam_key, user_key
+from .pagination import STREAM_CHUNK_SIZE, achunked, astream_results, encode_cursor, wants_stream
+from .views import (
+    NAME_CURSOR_TYPES, NO_SPAM, SEARCH_MAX_PAGE_SIZE, current_spam_stats, get_pagination, name_matches, name_result,
+    spam_fields,
+)
+
+logger = logging.getLogger(__name__)
+
+CustomUser = get_user_model()
+
+authentication = CachedJWTAuthentication()
+
+
+def jwt_required(view):
+    """Authenticate the bearer token like CachedJWTAuthentication + IsAuthenticated do for DRF views."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            authenticated = await authentication.aauthenticate(request)
+        except AuthenticationFailed as e:
+            detail = e.detail if isinstance(e.detail, dict) else {"detail": e.detail}
+            response = JsonResponse(detail, status=e.status_code)
+            response["WWW-Authenticate"] = authentication.authenticate_header(request)
+            return response
+        if authenticated is None:
+            response = JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+            response["WWW-Authenticate"] = authentication.authenticate_header(request)
+            return response
+        request.user, request.auth = authenticated
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def refresh_spam_filter():
+    # Only the periodic catch-up touches the database; run it off the event loop.
+    if spam_filter.refresh_due():
+        await sync_to_async(spam_filter.refresh)()
+
+
+async def aget_spam_stats(key):
+    """get_spam_stats() for async views."""
+    await refresh_spam_filter()
+    if not spam_filter.might_contain(key, refresh=False):
+        return NO_SPAM
+    stats = await lookup_cache.aget_or_set(
+        spam_key(key),
+        SpamAggregate.objects.filter(pk=key).values_list("report_count", "score", "scored_at").afirst,
+    )
+    return current_spam_stats(*stats) if stats else NO_SPAM
+
+
+async def aget_registered_user(key):
+    return await lookup_cache.aget_or_set(
+        user_key(key),
+        CustomUser.objects.filter(phone_key=key).values("name", "phone_number", "email").afirst,
+    )
+
+
+async def aget_identity(key):
+    return await lookup_cache.aget_or_set(
+        identity_key(key),
+        NumberIdentity.objects.filter(pk=key).values("name", "votes", "total_votes", "alternates").afirst,
+    )
+
+
+async def aget_contact_entries(key, limit, after_id=None):
+    """Up to limit + 1 contact entries of a number after after_id; the first page is cached."""
+    contacts = Contact.objects.filter(phone_key=key).order_by("id").values("id", "name", "phone_number")
+    if after_id is not None:
+        return [row async for row in contacts.filter(id__gt=after_id)[:limit + 1]]
+
+    async def load():
+        return [row async for row in contacts[:SEARCH_MAX_PAGE_SIZE + 1]]
+    first_page = await lookup_cache.aget_or_set(contacts_key(key), load)
+    return first_page[:limit + 1]
+
+
+async def aget_spam_stats_many(keys):
+    """get_spam_stats_many() for async views."""
+    await refresh_spam_filter()
+    keys = {key for key in keys if spam_filter.might_contain(key, refresh=False)}
+    if not keys:
+        return {}
+    now = timezone.now()
+    rows = SpamAggregate.objects.filter(pk__in=keys).values_list("phone_key", "report_count", "score", "scored_at")
+    return {
+        key: current_spam_stats(report_count, score, scored_at, now)
+        async for key, report_count, score, scored_at in rows
+    }
+
+
+async def aname_results(rows):
+    async for chunk in achunked(rows):
+        spam_stats = await aget_spam_stats_many(row["phone_key"] for row in chunk)
+        for row in chunk:
+            yield name_result(row, spam_stats)
+
+
+def error(message, status_code):
+    return JsonResponse({"error": message}, status=status_code)
+
+
+def invalid_phone_number(phone_number):
+    logger.warning("Invalid phone number: %s", phone_number)
+    return error("Invalid phone number.", status.HTTP_400_BAD_REQUEST)
+
+
+@require_GET
+@jwt_required
+@read_from_replica
+async def search_by_name(request):
+    query = request.GET.get('name', None)
+
+    if not query:
+        logger.warning("Name query parameter missing.")
+        return error("Name query parameter is required.", status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit, offset, cursor = get_pagination(request, NAME_CURSOR_TYPES)
+    except ValueError as e:
+        logger.warning("Invalid pagination parameters: %s", e)
+        return error(str(e), status.HTTP_400_BAD_REQUEST)
+
+    custom_users = name_matches(CustomUser.objects.all(), query, NameTrigram.USER, cursor)
+    contacts = name_matches(Contact.objects.all(), query, NameTrigram.CONTACT, cursor)
+    matches = custom_users.union(contacts, all=True).order_by("rank", "name", "source", "id")
+
+    if wants_stream(request):
+        logger.info("Streaming search results for name query '%s'.", query)
+        return StreamingHttpResponse(
+            astream_results(aname_results(matches.aiterator(chunk_size=STREAM_CHUNK_SIZE))),
+            content_type="application/json",
+        )
+
+    page = [row async for row in matches[offset:offset + limit + 1]]
+    has_more = len(page) > limit
+    page = page[:limit]
+    spam_stats = await aget_spam_stats_many(row["phone_key"] for row in page)
+    results = [name_result(row, spam_stats) for row in page]
+
+    logger.info("Search results for name query '%s': %s results found.", query, len(results))
+
+    last = page[-1] if has_more else None
+    response_data = {
+        "results": results,
+        "next_cursor": encode_cursor([last["rank"], last["name"], last["source"], last["id"]]) if last else None,
+    }
+    if cursor is None:
+        response_data["next_offset"] = offset + limit if has_more else None
+
+    return JsonResponse(response_data, status=status.HTTP_200_OK)
+
+
+@require_GET
+@jwt_required
+@read_from_replica
+async def search_by_number(request):
+    phone_number = request.GET.get('phone_number', None)
+
+    if not phone_number:
+        logger.warning("Phone number query parameter missing.")
+        return error("Phone number is required.", status.HTTP_400_BAD_REQUEST)
+
+    key = phone_key(phone_number)
+    if key is None:
+        return invalid_phone_number(phone_number)
+
+    user = await aget_registered_user(key)
+    if user:
+        logger.info("User found for phone number: %s", phone_number)
+        return JsonResponse({
+            "message": "User found.",
+            "name": user["name"],
+            "phone_number": user["phone_number"]
+        }, status=status.HTTP_200_OK)
+
+    try:
+        limit, _, cursor = get_pagination(request, (int,))
+    except ValueError as e:
+        logger.warning("Invalid pagination parameters: %s", e)
+        return error(str(e), status.HTTP_400_BAD_REQUEST)
+
+    if wants_stream(request):
+        logger.info("Streaming contacts for phone number: %s", phone_number)
+        contacts = Contact.objects.filter(phone_key=key).order_by("id").values("name", "phone_number")
+        return StreamingHttpResponse(
+            astream_results(contacts.aiterator(chunk_size=STREAM_CHUNK_SIZE)),
+            content_type="application/json",
+        )
+
+    if cursor is None:
+        identity = await aget_identity(key)
+        if identity:
+            logger.info("Name found for phone number: %s", phone_number)
+            return JsonResponse({
+                "message": "Name found.",
+                "phone_number": phone_number,
+                **identity,
+            }, status=status.HTTP_200_OK)
+
+    page = await aget_contact_entries(key, limit, after_id=cursor[0] if cursor else None)
+    if page:
+        has_more = len(page) > limit
+        page = page[:limit]
+        logger.info("Contacts found for phone number: %s", phone_number)
+        return JsonResponse({
+            "message": "Contacts found.",
+            "results": [{"name": row["name"], "phone_number": row["phone_number"]} for row in page],
+            "next_cursor": encode_cursor([page[-1]["id"]]) if has_more else None,
+        }, status=status.HTTP_200_OK)
+
+    logger.warning("No results found for phone number: %s", phone_number)
+    return JsonResponse({"message": "No results found for this phone number."}, status=status.HTTP_404_NOT_FOUND)
+
+
+@require_GET
+@jwt_required
+@read_from_replica
+async def spam_counter(request):
+    phone_number = request.GET.get('phone_number', None)
+
+    if not phone_number:
+        logger.warning("Phone number query parameter missing.")
+        return error("Phone number is required.", status.HTTP_400_BAD_REQUEST)
+
+    key = phone_key(phone_number)
+    if key is None:
+        return invalid_phone_number(phone_number)
+
+    spam_stats = await aget_spam_stats(key)
+    spam_count = spam_stats[0]
+    logger.info("Spam report count for phone number %s: %s", phone_number, spam_count)
+
+    if spam_count > 0:
+        return JsonResponse({
+            "message": f"{spam_count} spam reports found for this phone number.",
+            **spam_fields(spam_stats),
+        }, status=status.HTTP_200_OK)
+
+    return JsonResponse({
+        "message": "No spam reports found for this phone number."
+    }, status=status.HTTP_404_NOT_FOUND)
+
+
+@require_GET
+@jwt_required
+@read_from_replica
+async def display_detail(request):
+    phone_number = request.GET.get('phone_number', None)
+
+    if not phone_number:
+        logger.warning("Phone number query parameter missing.")
+        return error("Phone number is required.", status.HTTP_400_BAD_REQUEST)
+
+    key = phone_key(phone_number)
+    if key is None:
+        return invalid_phone_number(phone_number)
+
+    # The contact check only matters when the number is registered, but issuing it
+    # alongside the other two lookups saves a round trip in the case where it does.
+    user, spam_stats, is_contact = await asyncio.gather(
+        aget_registered_user(key),
+        aget_spam_stats(key),
+        Contact.objects.filter(user=request.user, phone_key=key).aexists(),
+    )
+    if user:
+        logger.info("User details found for phone number: %s", phone_number)
+    else:
+        logger.warning("No user found for phone number: %s", phone_number)
+
+    response_data = {
+        "phone_number": phone_number,
+        **spam_fields(spam_stats),
+    }
+
+    if user:
+        response_data["name"] = user["name"]
+        response_data["email"] = user["email"] if is_contact else None
+
+    return JsonResponse(response_data, status=status.HTTP_200_OK)
@@ -0,0 +1,258 @@
+import logging
+import random
+import threading
+import time
+import timeit
+from collections import Counter, defaultdict
+from io import BytesIO
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from authentication.models import Contact, CustomUser, SpamAggregate
+from authentication.tokens import RefreshToken
+from .renderers import FastJSONParser, FastJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = {
+    "search_by_number": 30,
+    "spam_counter": 25,
+    "display_detail": 15,
+    "search_by_name": 15,
+    "spam_report": 10,
+    "login": 3,
+    "register": 2,
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, queries, statuses, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered), 3) if ordered else None,
+            "p50": percentile(ordered, 0.50),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": ordered[-1] if ordered else None,
+        },
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None,
+        "statuses": dict(statuses),
+        "errors": sum(count for status, count in statuses.items() if status >= 500),
+    }
+
+
+class Workload:
+    """Request generators for each endpoint, drawing numbers and names from the seeded data."""
+
+    def __init__(self, rng, sample_size=2000, users_with_tokens=50, password="password123"):
+        self.rng = rng
+        self.password = password
+        users = list(CustomUser.objects.order_by("?")[:users_with_tokens])
+        if not users:
+            raise ValueError("The benchmark database has no users; seed it first.")
+        self.users = users
+        self.tokens = [f"Bearer {RefreshToken.for_user(user).access_token}" for user in users]
+        self.user_numbers = list(CustomUser.objects.order_by("?").values_list("phone_number", flat=True)[:sample_size])
+        self.contact_numbers = list(Contact.objects.order_by("?").values_list("phone_number", flat=True)[:sample_size])
+        self.spam_numbers = [f"+{key}" for key in SpamAggregate.objects.order_by("?").values_list("phone_key", flat=True)[:sample_size]]
+        self.names = [
+            name.split()[0] for name in CustomUser.objects.order_by("?").values_list("name", flat=True)[:sample_size] if name
+        ]
+        self._registered = 0
+        self._lock = threading.Lock()
+
+    def number(self):
+        # Mostly known numbers, with a share that were never seen to exercise the negative path.
+        pool = self.rng.choices(
+            [self.user_numbers, self.contact_numbers, self.spam_numbers, None], weights=[35, 25, 25, 15]
+        )[0]
+        if pool:
+            return self.rng.choice(pool)
+        return f"6{self.rng.randrange(10 ** 9):09d}"
+
+    def request(self, endpoint):
+        """Return (method, path, data, authorization) for one request to endpoint."""
+        token = self.rng.choice(self.tokens)
+        if endpoint == "search_by_number":
+            return "get", "/api/search-by-number/", {"phone_number": self.number()}, token
+        if endpoint == "spam_counter":
+            return "get", "/api/spam-counter/", {"phone_number": self.number()}, token
+        if endpoint == "display_detail":
+            return "get", "/api/display-detail/", {"phone_number": self.number()}, token
+        if endpoint == "search_by_name":
+            query = self.rng.choice(self.names)[: self.rng.randint(3, 6)]
+            return "get", "/api/search-by-name/", {"name": query}, token
+        if endpoint == "spam_report":
+            return "post", "/api/spam-report/", {"phone_number": self.number()}, token
+        if endpoint == "login":
+            user = self.rng.choice(self.users)
+            return "post", "/auth/login/", {"phone_number": user.phone_number, "password": self.password}, None
+        if endpoint == "register":
+            with self._lock:
+                self._registered += 1
+                serial = self._registered
+            return "post", "/auth/register/", {
+                "name": f"Bench User {serial}",
+                "phone_number": f"7{self.rng.randrange(10 ** 9):09d}",
+                "email": f"bench{serial}@example.com",
+                "password": self.password,
+            }, None
+        raise ValueError(f"Unknown endpoint {endpoint!r}.")
+
+
+def run_benchmark(workload, mix=None, requests=1000, concurrency=4, warmup=50, seed=0):
+    """
+    Drive the endpoints in mix (endpoint -> weight) from concurrency threads, each with its
+    own test client, and return per-endpoint and overall throughput, latency percentiles
+    and queries per request.
+    """
+    mix = mix or DEFAULT_MIX
+    endpoints, weights = zip(*mix.items())
+    plan_rng = random.Random(seed)
+    plan = plan_rng.choices(endpoints, weights=weights, k=warmup + requests)
+    plans = [plan[:warmup]] + [plan[warmup + index::concurrency] for index in range(concurrency)]
+
+    samples = defaultdict(list)
+    samples_lock = threading.Lock()
+
+    def drive(endpoint_plan, record):
+        # Unhandled view errors come back as 500 responses instead of ending the thread.
+        client = Client(raise_request_exception=False)
+        local = []
+        for endpoint in endpoint_plan:
+            method, path, data, token = workload.request(endpoint)
+            headers = {"HTTP_AUTHORIZATION": token} if token else {}
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                try:
+                    status = getattr(client, method)(path, data, **headers).status_code
+                except Exception:
+                    logger.exception("Benchmark request to %s failed.", path)
+                    status = 500
+                latency = (time.perf_counter() - started) * 1000
+            local.append((endpoint, round(latency, 3), len(captured), status))
+        if record:
+            with samples_lock:
+                for endpoint, latency, queries, status in local:
+                    samples[endpoint].append((latency, queries, status))
+        connection.close()
+
+    drive(plans[0], record=False)
+
+    threads = [threading.Thread(target=drive, args=(endpoint_plan, True)) for endpoint_plan in plans[1:]]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {}
+    for endpoint, rows in sorted(samples.items()):
+        latencies, queries, statuses = zip(*rows)
+        results[endpoint] = summarize(latencies, queries, Counter(statuses), elapsed)
+    everything = [row for rows in samples.values() for row in rows]
+    latencies, queries, statuses = zip(*everything) if everything else ((), (), ())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "overall": summarize(latencies, queries, Counter(statuses), elapsed),
+        "endpoints": results,
+    }
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Return human-readable regressions of p95 latency or queries per request beyond tolerance."""
+    regressions = []
+    for endpoint, stats in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        for label, now, then in (
+            ("p95 latency", stats["latency_ms"]["p95"], before["latency_ms"]["p95"]),
+            ("queries/request", stats["queries_per_request"], before["queries_per_request"]),
+        ):
+            if now is not None and then and now > then * (1 + tolerance):
+                regressions.append(f"{endpoint}: {label} {then} -> {now}")
+    return regressions
+
+
+def sample_payloads(rng):
+    """Response bodies shaped like the lookup endpoints' and a contact sync request body."""
+
+    def number():
+        return f"+91{rng.randrange(10 ** 10):010d}"
+
+    def name():
+        return f"{rng.choice(['Asha', 'Ravi', 'Meera', 'John', 'Li', 'Zoë'])} {rng.choice(['Rao', 'Smith', 'Iyer', 'Chen'])}"
+
+    def spam():
+        score = round(rng.random() * 3, 4)
+        return {"spam_likelihood": "Spam" if score >= 1.5 else "Unknown", "spam_score": score, "spam_count": rng.randrange(40)}
+
+    responses = {
+        "spam_counter": {"phone_number": number(), **spam()},
+        "display_detail": {"name": name(), "phone_number": number(), "email": "asha@example.com", **spam()},
+        "search_by_number": {
+            "message": "Contacts found.",
+            "results": [{"name": name(), "phone_number": number()} for _ in range(20)],
+            "next_cursor": "WzEyMzQ1XQ",
+        },
+        "search_by_name": {
+            "results": [{"name": name(), "phone_number": number(), **spam()} for _ in range(50)],
+            "next_cursor": "WzAuNSwgMSwgOTg3XQ",
+        },
+        "bulk_lookup": {
+            "results": [
+                {"phone_number": number(), "name": name(), "email": None, "is_registered": bool(rng.getrandbits(1)), **spam()}
+                for _ in range(100)
+            ],
+        },
+    }
+    requests = {
+        "sync_contact_book": {
+            "mode": "full",
+            "contacts": [{"name": name(), "phone_number": number()} for _ in range(500)],
+        },
+    }
+    return responses, requests
+
+
+def best_per_call(function, iterations, repeat=5):
+    """Fastest of repeat runs of iterations calls, in microseconds per call."""
+    return min(timeit.repeat(function, number=iterations, repeat=repeat)) / iterations * 1e6
+
+
+def serialization_benchmark(responses, requests, iterations=2000):
+    """
+    Microseconds per call to render each response with DRF's JSONRenderer ("before") and
+    with FastJSONRenderer ("after"), and to parse each request body with both parsers.
+    """
+
+    def row(before, after):
+        return {"before_us": round(before, 2), "after_us": round(after, 2), "speedup": round(before / after, 2)}
+
+    results = {"render": {}, "parse": {}}
+    for name, payload in responses.items():
+        results["render"][name] = row(*(
+            best_per_call(lambda: renderer.render(payload, "application/json", {}), iterations)
+            for renderer in (JSONRenderer(), FastJSONRenderer())
+        ))
+    for name, payload in requests.items():
+        body = JSONRenderer().render(payload)
+        results["parse"][name] = row(*(
+            best_per_call(lambda: parser.parse(BytesIO(body), "application/json", {}), max(1, iterations // 10))
+            for parser in (JSONParser(), FastJSONParser())
+        ))
+    return results
@@ -0,0 +1,261 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from authentication.models import SpamAggregate, SpamReport
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over integer keys, using double hashing of one blake2b digest."""
+
+    HEADER = struct.Struct(">4sQQIQQd")
+    MAGIC = b"BLM2"
+
+    def __init__(self, capacity, false_positive_rate, num_bits=None, num_hashes=None, bits=None, count=0):
+        if capacity < 1 or not 0 < false_positive_rate < 1:
+            raise ValueError("capacity must be positive and false_positive_rate must be between 0 and 1.")
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.num_bits = num_bits or math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.num_hashes = num_hashes or max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+        self.count = count
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.to_bytes(8, "big"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        added = False
+        for position in self._positions(key):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def estimated_false_positive_rate(self):
+        """Expected false positive rate at the current fill, which exceeds the target past capacity."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def to_bytes(self, watermark=0, anchor=0):
+        header = self.HEADER.pack(
+            self.MAGIC, self.num_bits, self.capacity, self.num_hashes, watermark, anchor, self.false_positive_rate
+        )
+        return header + struct.pack(">Q", self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Return (filter, watermark, anchor) decoded from to_bytes() output."""
+        magic, num_bits, capacity, num_hashes, watermark, anchor, rate = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a Bloom filter file.")
+        offset = cls.HEADER.size
+        (count,) = struct.unpack_from(">Q", data, offset)
+        bits = bytearray(data[offset + 8:])
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError("Truncated Bloom filter file.")
+        return cls(capacity, rate, num_bits, num_hashes, bits, count), watermark, anchor
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class ReportedNumberFilter:
+    """
+    Bloom filter of every number with a spam report. A miss means the number has definitely
+    never been reported, so callers can skip the database.
+
+    The filter remembers the creation time of the newest report it has folded in and every
+    refresh_interval seconds reads the reports created since, minus catch_up_overlap
+    seconds for transactions that committed after newer ones. That picks up reports
+    written by other workers whatever order their ids commit in. One thread at a time reads
+    the database, without holding the lock lookups take; the others keep answering from
+    the current filter meanwhile.
+    """
+
+    def __init__(
+        self, path=None, capacity=1_000_000, false_positive_rate=0.01, refresh_interval=5, save_interval=60,
+        catch_up_overlap=60,
+    ):
+        self.path = path
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.refresh_interval = refresh_interval
+        self.save_interval = save_interval
+        self.catch_up_overlap = catch_up_overlap
+        self._filter = None
+        # created_at and id of the newest report folded in, or None before the first one.
+        self._newest = None
+        self._refreshed_at = 0.0
+        self._saved_at = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._counters = {"negatives": 0, "positives": 0, "refreshes": 0}
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**{key.lower(): value for key, value in getattr(settings, "SPAM_FILTER", {}).items()})
+
+    def _load(self):
+        """(filter, newest) read from path, or None if the file is missing, unreadable or stale."""
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as handle:
+                bloom, watermark, anchor = BloomFilter.from_bytes(handle.read())
+        except (OSError, ValueError, struct.error):
+            logger.warning("Discarding unreadable spam filter file %s", self.path, exc_info=True)
+            return None
+        if bloom.false_positive_rate != self.false_positive_rate or not anchor:
+            return None
+        newest = (EPOCH + timedelta(microseconds=watermark), anchor)
+        # The newest report the file saw must still be there as it was. After a reset or a
+        # restore it is not, and reports the file claims to cover may be missing from it.
+        if not SpamReport.objects.filter(pk=anchor, created_at=newest[0]).exists():
+            logger.info("Spam filter file %s belongs to another database; rebuilding.", self.path)
+            return None
+        return bloom, newest
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if self._newest is None:
+                return
+            created_at, anchor = self._newest
+            data = self._filter.to_bytes((created_at - EPOCH) // timedelta(microseconds=1), anchor)
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            with tempfile.NamedTemporaryFile(dir=directory, delete=False) as handle:
+                handle.write(data)
+            os.replace(handle.name, self.path)
+        except OSError:
+            logger.warning("Could not persist spam filter to %s", self.path, exc_info=True)
+            return
+        self._saved_at = time.monotonic()
+
+    def _newest_report(self):
+        return SpamReport.objects.order_by("-created_at", "-id").values_list("created_at", "id").first()
+
+    def _build(self):
+        """Build a fresh filter from SpamAggregate, which holds one row per reported number, and swap it in."""
+        # Read first: reports committed while the keys are read are picked up by the next catch-up.
+        newest = self._newest_report()
+        keys = SpamAggregate.objects.filter(report_count__gt=0).values_list("phone_key", flat=True).order_by()
+        capacity = max(self.capacity, 2 * SpamAggregate.objects.count())
+        bloom = BloomFilter(capacity, self.false_positive_rate)
+        for key in keys.iterator(chunk_size=10000):
+            bloom.add(key)
+        with self._lock:
+            self._filter, self._newest = bloom, newest
+            self._refreshed_at = time.monotonic()
+        self._save()
+        logger.info("Built spam filter with %d numbers.", bloom.count)
+
+    def _catch_up(self):
+        rows = SpamReport.objects.filter(phone_key__isnull=False)
+        if self._newest is not None:
+            rows = rows.filter(created_at__gte=self._newest[0] - timedelta(seconds=self.catch_up_overlap))
+        keys, newest = [], self._newest
+        for report_id, key, created_at in (
+            rows.order_by("created_at", "id").values_list("id", "phone_key", "created_at").iterator(chunk_size=10000)
+        ):
+            keys.append(key)
+            if newest is None or (created_at, report_id) > newest:
+                newest = (created_at, report_id)
+        with self._lock:
+            for key in keys:
+                if self._filter.add(key):
+                    self._dirty = True
+            self._newest = newest
+            self._refreshed_at = time.monotonic()
+            self._counters["refreshes"] += 1
+            oversized = self._filter.count > self._filter.capacity
+            save_due = self._dirty and time.monotonic() - self._saved_at >= self.save_interval
+        if oversized:
+            # Past capacity the false positive rate climbs, so size a fresh filter.
+            self._build()
+        elif save_due:
+            self._save()
+
+    def _refresh_held(self):
+        """Bring the filter up to date; the caller holds _refresh_lock."""
+        if self._filter is None:
+            loaded = self._load()
+            if loaded is None:
+                self._build()
+                return
+            with self._lock:
+                self._filter, self._newest = loaded
+        elif not self.refresh_due():
+            # Another thread refreshed while this one waited for the lock.
+            return
+        self._catch_up()
+
+    def refresh_due(self):
+        """Whether the next might_contain() call would read from the database."""
+        return self._filter is None or time.monotonic() - self._refreshed_at >= self.refresh_interval
+
+    def refresh(self):
+        with self._refresh_lock:
+            self._refresh_held()
+
+    def might_contain(self, key, refresh=True):
+        if self._filter is None:
+            # Nothing to answer from yet, so wait for the first build.
+            self.refresh()
+        elif refresh and self.refresh_due() and self._refresh_lock.acquire(blocking=False):
+            try:
+                self._refresh_held()
+            finally:
+                self._refresh_lock.release()
+        with self._lock:
+            found = key in self._filter
+            self._counters["positives" if found else "negatives"] += 1
+        return found
+
+    def add(self, key):
+        with self._lock:
+            if self._filter is not None and self._filter.add(key):
+                self._dirty = True
+
+    def rebuild(self):
+        with self._refresh_lock:
+            self._build()
+            return self._filter.count
+
+    def stats(self):
+        self.refresh()
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update(
+                numbers=self._filter.count,
+                capacity=self._filter.capacity,
+                size_bytes=len(self._filter.bits),
+                num_hashes=self._filter.num_hashes,
+                target_false_positive_rate=self._filter.false_positive_rate,
+                estimated_false_positive_rate=self._filter.estimated_false_positive_rate(),
+                watermark=self._newest[0].isoformat() if self._newest else None,
+            )
+        return stats
+
+
+spam_filter = ReportedNumberFilter.from_settings()
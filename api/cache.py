@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from falsecaller.routers import reading_from_replica, replica_aliases, replica_lag_window
+
+_MISSING = object()
+
+
+class LookupCache:
+    """
+    Two-tier read-through cache for number lookups: a bounded in-process LRU with a TTL
+    in front of a Django cache alias, so a shared backend can be swapped in via CACHES.
+
+    With replicas configured, deleting a key also marks it as recently written for the
+    read-your-writes window, and values read from a replica are not cached while the mark
+    lasts: the replica may not have the write yet, and caching its answer would serve the
+    stale value for the whole TIMEOUT.
+    """
+
+    def __init__(self, alias="default", max_entries=10000, timeout=60, key_prefix="lookup"):
+        self.alias = alias
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**{key.lower(): value for key, value in getattr(settings, "LOOKUP_CACHE", {}).items()})
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _shared_key(self, key):
+        return f"{self.key_prefix}:{key}"
+
+    def _written_key(self, key):
+        return f"{self.key_prefix}:written:{key}"
+
+    def _may_fill(self, key):
+        return not reading_from_replica() or self.shared.get(self._written_key(key)) is None
+
+    async def _amay_fill(self, key):
+        return not reading_from_replica() or await self.shared.aget(self._written_key(key)) is None
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    def _set_local(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def get_or_set(self, key, loader):
+        """Return the cached value for key, calling loader() to fill both tiers on a miss."""
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+
+        value = self.shared.get(self._shared_key(key), _MISSING)
+        if value is not _MISSING:
+            self._count("shared_hits")
+        else:
+            self._count("misses")
+            value = loader()
+            if not self._may_fill(key):
+                return value
+            self.shared.set(self._shared_key(key), value, self.timeout)
+        self._set_local(key, value)
+        return value
+
+    async def aget_or_set(self, key, loader):
+        """get_or_set() for async callers: loader is a coroutine function."""
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+
+        value = await self.shared.aget(self._shared_key(key), _MISSING)
+        if value is not _MISSING:
+            self._count("shared_hits")
+        else:
+            self._count("misses")
+            value = await loader()
+            if not await self._amay_fill(key):
+                return value
+            await self.shared.aset(self._shared_key(key), value, self.timeout)
+        self._set_local(key, value)
+        return value
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss, without loading it."""
+        value = self._get_local(key)
+        if value is not _MISSING:
+            return value
+
+        value = self.shared.get(self._shared_key(key), _MISSING)
+        if value is _MISSING:
+            self._count("misses")
+            return default
+        self._count("shared_hits")
+        self._set_local(key, value)
+        return value
+
+    def set(self, key, value):
+        """Fill both tiers with a value loaded by the caller."""
+        if not self._may_fill(key):
+            return
+        self.shared.set(self._shared_key(key), value, self.timeout)
+        self._set_local(key, value)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+            self._counters["invalidations"] += len(keys)
+        self.shared.delete_many([self._shared_key(key) for key in keys])
+        if replica_aliases():
+            self.shared.set_many({self._written_key(key): True for key in keys}, replica_lag_window())
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+        stats["max_entries"] = self.max_entries
+        stats["hit_rate"] = (stats["hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+lookup_cache = LookupCache.from_settings()
+
+
+def user_key(key):
+    return f"user:{key}"
+
+
+def contacts_key(key):
+    return f"contacts-page:{key}"
+
+
+def spam_key(key):
+    return f"spam-aggregate:{key}"
+
+
+def identity_key(key):
+    return f"identity:{key}"
@@ -0,0 +1,103 @@
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from authentication.models import NumberIdentity
+from .cache import identity_key, lookup_cache
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityRefresher:
+    """
+    Keeps NumberIdentity current off the request path. Writers mark the numbers whose
+    contacts changed; a background thread recomputes them refresh_delay seconds after the
+    first mark, so a burst of address-book syncs touching a popular number costs one refresh.
+    """
+
+    def __init__(self, refresh_delay=2.0, max_batch=1000):
+        self.refresh_delay = refresh_delay
+        self.max_batch = max_batch
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+        self._totals = {"marked": 0, "refreshed": 0, "refreshes": 0, "errors": 0}
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**{key.lower(): value for key, value in getattr(settings, "NUMBER_IDENTITY", {}).items()})
+
+    def mark(self, phone_keys):
+        """Queue numbers for a later refresh."""
+        with self._condition:
+            before = len(self._pending)
+            self._pending.update(key for key in phone_keys if key is not None)
+            self._totals["marked"] += len(self._pending) - before
+            if len(self._pending) == before:
+                return
+            self._ensure_worker()
+            if before == 0 or len(self._pending) >= self.max_batch:
+                self._condition.notify()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="number-identity-refresher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.refresh_delay
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Number identity refresh failed.")
+            finally:
+                close_old_connections()
+
+    def refresh(self):
+        """Recompute every marked number now. Returns how many were refreshed."""
+        with self._refresh_lock:
+            with self._condition:
+                keys, self._pending = self._pending, set()
+            if not keys:
+                return 0
+            try:
+                NumberIdentity.objects.refresh_numbers(keys, batch_size=self.max_batch)
+            except Exception:
+                with self._condition:
+                    self._totals["errors"] += 1
+                    # Mark them again so the next refresh retries them.
+                    self._pending |= keys
+                raise
+            lookup_cache.delete(*(identity_key(key) for key in keys))
+            with self._condition:
+                self._totals["refreshes"] += 1
+                self._totals["refreshed"] += len(keys)
+            logger.debug("Refreshed the identities of %d numbers.", len(keys))
+            return len(keys)
+
+    def stats(self):
+        with self._condition:
+            return {"pending": len(self._pending), "totals": dict(self._totals)}
+
+
+identity_refresher = IdentityRefresher.from_settings()
+
+
+@atexit.register
+def _refresh_on_exit():
+    try:
+        identity_refresher.refresh()
+    except Exception:
+        logger.exception("Could not refresh number identities on exit.")
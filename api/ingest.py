@@ -0,0 +1,254 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from authentication.models import CompactedSpamReport, CustomUser, SpamAggregate, SpamReport
+from authentication.scoring import add_reports
+from .bloom import spam_filter
+from .cache import lookup_cache, spam_key
+
+logger = logging.getLogger(__name__)
+
+
+class SpamReportBuffer:
+    """
+    In-process write buffer for spam reports. Requests only enqueue; a background thread
+    flushes the buffer once it holds max_batch reports or flush_interval seconds after the
+    first pending report. Repeats of a (reporter, number) pair are absorbed in the buffer
+    and, across flushes, by the unique constraint on SpamReport.
+
+    A flush the database rejects with a data or integrity error is written again in ever
+    smaller parts, down to single reports, and the reports it still rejects are dropped.
+    Any other failure puts the batch back, to be retried after a delay that doubles with
+    each consecutive failure, up to max_retry_delay seconds.
+    """
+
+    def __init__(self, max_batch=500, flush_interval=1.0, max_pending=50000, max_retry_delay=30.0, history=100):
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retry_delay = max_retry_delay
+        self._failures = 0
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._flushes = deque(maxlen=history)
+        self._totals = {"accepted": 0, "buffered_duplicates": 0, "inserted": 0, "stored_duplicates": 0, "flushes": 0, "errors": 0, "dropped": 0}
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**{key.lower(): value for key, value in getattr(settings, "SPAM_REPORT_BUFFER", {}).items()})
+
+    def enqueue(self, reporter_id, phone_number, key):
+        """
+        Accept a report for a later flush. Returns False if the buffer is full; raises
+        ValueError for a number that could not be stored.
+        """
+        if key is None or len(phone_number) > SpamReport._meta.get_field("phone_number").max_length:
+            raise ValueError(f"Cannot store a spam report for {phone_number!r}.")
+        with self._condition:
+            pair = (reporter_id, key)
+            if pair in self._pending:
+                self._totals["buffered_duplicates"] += 1
+                return True
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending[pair] = phone_number
+            self._totals["accepted"] += 1
+            self._ensure_worker()
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._condition.notify()
+        return True
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="spam-report-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Spam report flush failed; retrying in %.1f s.", self.retry_delay())
+                time.sleep(self.retry_delay())
+            finally:
+                close_old_connections()
+
+    def retry_delay(self):
+        """Seconds to wait before retrying after the current run of failed flushes."""
+        return min(self.max_retry_delay, self.flush_interval * 2 ** max(self._failures - 1, 0))
+
+    def _insert(self, batch, attempts=3):
+        """Insert the reports of batch that are not stored yet. Returns the reports inserted."""
+        keys = {key for _, key in batch}
+        reporters = {reporter_id for reporter_id, _ in batch}
+        for attempt in range(attempts):
+            # Compacted reports count as stored too: their reporters already reported the number.
+            stored = set(
+                SpamReport.objects.filter(phone_key__in=keys, reported_by_id__in=reporters)
+                .values_list("reported_by_id", "phone_key")
+                .union(
+                    CompactedSpamReport.objects.filter(phone_key__in=keys, reported_by_id__in=reporters)
+                    .values_list("reported_by_id", "phone_key")
+                )
+            )
+            new = [
+                SpamReport(reported_by_id=reporter_id, phone_number=phone_number, phone_key=key)
+                for (reporter_id, key), phone_number in batch.items()
+                if (reporter_id, key) not in stored
+            ]
+            try:
+                with transaction.atomic():
+                    SpamReport.objects.bulk_create(new, batch_size=self.max_batch)
+                return new
+            except IntegrityError:
+                # Another worker stored some of these pairs since the check; check again.
+                if attempt == attempts - 1:
+                    raise
+
+    def _write(self, batch):
+        """Store a batch in one transaction. Returns the reports inserted."""
+        with transaction.atomic():
+            new = self._insert(batch)
+            now = timezone.now()
+            SpamAggregate.objects.add_new_reports([report.phone_key for report in new], now)
+            add_reports([(report.reported_by_id, report.phone_key) for report in new], now)
+        return new
+
+    def _write_apart(self, batch, pairs=None):
+        """
+        Write the given pairs of batch (by default all of them) in halves, down to single
+        reports, to find the reports the database rejects. Written and rejected reports are
+        removed from batch as it goes, so whatever is left can be retried. Returns the
+        reports inserted and how many were rejected.
+        """
+        pairs = list(batch) if pairs is None else pairs
+        if not pairs:
+            return [], 0
+        if len(pairs) == 1:
+            pair = pairs[0]
+            try:
+                new = self._write({pair: batch[pair]})
+            except (DataError, IntegrityError):
+                logger.exception("Dropped a spam report the database rejects: %s.", pair)
+                del batch[pair]
+                return [], 1
+            del batch[pair]
+            return new, 0
+
+        middle = len(pairs) // 2
+        new, rejected = [], 0
+        for half in (pairs[:middle], pairs[middle:]):
+            try:
+                new += self._write({pair: batch[pair] for pair in half})
+            except (DataError, IntegrityError):
+                written, half_rejected = self._write_apart(batch, half)
+                new += written
+                rejected += half_rejected
+            else:
+                for pair in half:
+                    del batch[pair]
+        return new, rejected
+
+    def _drop_orphans(self, batch):
+        """Remove the reports of reporters that no longer exist from batch. Returns how many were removed."""
+        reporters = {reporter_id for reporter_id, _ in batch}
+        existing = set(CustomUser.objects.filter(pk__in=reporters).values_list("pk", flat=True))
+        orphans = [pair for pair in batch if pair[0] not in existing]
+        for pair in orphans:
+            del batch[pair]
+        if orphans:
+            logger.warning(
+                "Dropped %d spam reports from %d deleted reporters.", len(orphans), len(reporters - existing)
+            )
+        return len(orphans)
+
+    def flush(self):
+        """Write every pending report now. Returns the metrics of this flush."""
+        with self._flush_lock:
+            with self._condition:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return None
+
+            started = time.perf_counter()
+            keys = {key for _, key in batch}
+            size = len(batch)
+            dropped = 0
+            try:
+                try:
+                    new = self._write(batch)
+                except (DataError, IntegrityError):
+                    # Reports of reporters deleted since they reported fail the whole batch,
+                    # as does any report the database refuses; set those aside.
+                    dropped = self._drop_orphans(batch)
+                    new, rejected = self._write_apart(batch)
+                    dropped += rejected
+            except Exception:
+                with self._condition:
+                    self._failures += 1
+                    self._totals["errors"] += 1
+                    self._totals["dropped"] += dropped
+                    # Put back what was not written so the next flush retries it.
+                    for pair, phone_number in batch.items():
+                        self._pending.setdefault(pair, phone_number)
+                raise
+
+            for key in keys:
+                spam_filter.add(key)
+            lookup_cache.delete(*(spam_key(key) for key in keys))
+
+            metrics = {
+                "at": time.time(),
+                "batch": size,
+                "inserted": len(new),
+                "stored_duplicates": size - dropped - len(new),
+                "dropped": dropped,
+                "numbers": len(keys),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            }
+            with self._condition:
+                self._failures = 0
+                self._flushes.append(metrics)
+                self._totals["flushes"] += 1
+                self._totals["inserted"] += metrics["inserted"]
+                self._totals["stored_duplicates"] += metrics["stored_duplicates"]
+                self._totals["dropped"] += dropped
+            logger.info(
+                "Flushed %d spam reports (%d new) in %.1f ms.", metrics["batch"], metrics["inserted"], metrics["duration_ms"]
+            )
+            return metrics
+
+    def stats(self):
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "totals": dict(self._totals),
+                "recent_flushes": list(self._flushes),
+            }
+
+
+report_buffer = SpamReportBuffer.from_settings()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        report_buffer.flush()
+    except Exception:
+        logger.exception("Could not flush spam reports on exit.")
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from api.benchmark import DEFAULT_MIX, Workload, compare, run_benchmark
+from api.bloom import spam_filter
+from api.ingest import report_buffer
+
+class Command(BaseCommand):
+    help = 'Load-test the API endpoints in-process and report throughput, latency percentiles and queries per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help='Users to seed (contacts and reports scale with it)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the dataset and the request plan')
+        parser.add_argument('--requests', type=int, default=2000, help='Measured requests across all threads')
+        parser.add_argument('--warmup', type=int, default=100, help='Unmeasured requests sent first')
+        parser.add_argument('--concurrency', type=int, default=4, help='Client threads (always 1 on SQLite)')
+        parser.add_argument('--mix', help='Endpoint weights such as "spam_counter=5,search_by_name=1"')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against an earlier JSON result and fail on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative p95 and query count growth')
+        parser.add_argument('--existing-db', action='store_true', help='Use the configured database as-is instead of a seeded test database')
+        parser.add_argument('--keep-logs', action='store_true', help='Keep view logging on while measuring')
+
+    def parse_mix(self, value):
+        if not value:
+            return DEFAULT_MIX
+        mix = {}
+        for part in value.split(','):
+            endpoint, _, weight = part.partition('=')
+            if endpoint.strip() not in DEFAULT_MIX:
+                raise CommandError(f'Unknown endpoint {endpoint!r}; choose from {", ".join(DEFAULT_MIX)}.')
+            mix[endpoint.strip()] = float(weight or 1)
+        return mix
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        sqlite = connection.vendor == 'sqlite'
+        if options['concurrency'] > 1 and sqlite:
+            # Concurrent writers fail on SQLite with "database table is locked".
+            self.stderr.write(self.style.WARNING('SQLite allows one writer at a time; running with --concurrency 1.'))
+            options['concurrency'] = 1
+        setup_test_environment(debug=False)
+        old_config = directory = None
+        if not options['existing_db']:
+            if sqlite and not connection.settings_dict['TEST'].get('NAME'):
+                # The in-memory test database fails writes that overlap with the spam report
+                # flusher thread instead of waiting for them, so seed a file next to it.
+                directory = tempfile.mkdtemp()
+                connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+            # Keep the seeded numbers out of the persisted filter of the real database.
+            spam_filter.path = None
+        try:
+            if not options['existing_db']:
+                self.stdout.write(f"Seeding {options['users']} users...")
+                call_command('populate_fake_data', users=options['users'], seed=options['seed'], stdout=StringIO())
+
+            workload = Workload(random.Random(options['seed']))
+            if not options['keep_logs']:
+                logging.disable(logging.INFO)
+            self.stdout.write(f"Sending {options['requests']} requests from {options['concurrency']} threads...")
+            try:
+                results = run_benchmark(
+                    workload,
+                    mix=mix,
+                    requests=options['requests'],
+                    concurrency=options['concurrency'],
+                    warmup=options['warmup'],
+                    seed=options['seed'],
+                )
+            finally:
+                logging.disable(logging.NOTSET)
+                report_buffer.flush()
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+            teardown_test_environment()
+
+        results['run'] = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'database': connection.vendor,
+            'mix': mix,
+            **{key: options[key] for key in ('users', 'seed', 'requests', 'warmup', 'concurrency', 'existing_db')},
+        }
+        self.print_table(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                regressions = compare(results, json.load(handle), options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(self.style.ERROR(f'Regression: {line}'))
+                raise CommandError(f'{len(regressions)} regressions against {options["baseline"]}.')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def print_table(self, results):
+        self.stdout.write(f"{'endpoint':<18}{'reqs':>7}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+        rows = list(results['endpoints'].items()) + [('overall', results['overall'])]
+        for endpoint, stats in rows:
+            latency = stats['latency_ms']
+            # Stats are None for an endpoint without measured requests.
+            cells = [
+                '-' if value is None else value
+                for value in (
+                    stats['requests'], stats['throughput_rps'], latency['p50'], latency['p95'], latency['p99'],
+                    stats['queries_per_request'], stats['errors'],
+                )
+            ]
+            self.stdout.write(
+                f"{endpoint:<18}{cells[0]:>7}{cells[1]:>10}{cells[2]:>10}{cells[3]:>10}{cells[4]:>10}{cells[5]:>9}{cells[6]:>8}"
+            )
@@ -0,0 +1,32 @@
+import json
+import random
+from django.core.management.base import BaseCommand
+from api.benchmark import sample_payloads, serialization_benchmark
+from api.renderers import orjson
+
+class Command(BaseCommand):
+    help = "Time rendering the lookup responses and parsing a contact sync with DRF's JSON classes and with the API's"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Renders timed per run (parses are a tenth of it)')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the sample payloads')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; both columns time the stdlib encoder.'))
+        responses, requests = sample_payloads(random.Random(options['seed']))
+        results = serialization_benchmark(responses, requests, iterations=options['iterations'])
+
+        self.stdout.write(f"{'':<8}{'payload':<20}{'bytes':>8}{'before us':>12}{'after us':>11}{'speedup':>9}")
+        for kind, payloads in (('render', responses), ('parse', requests)):
+            for name, stats in results[kind].items():
+                size = len(json.dumps(payloads[name], separators=(',', ':'), ensure_ascii=False).encode())
+                self.stdout.write(
+                    f"{kind:<8}{name:<20}{size:>8}{stats['before_us']:>12}{stats['after_us']:>11}{stats['speedup']:>8}x"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,32 @@
+import sqlite3
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from falsecaller.routers import replica_aliases
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto every SQLite replica, standing in for replication in local setups'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            self.stderr.write(self.style.ERROR('The primary database is not SQLite; use the database\'s own replication.'))
+            return
+        if not replica_aliases():
+            self.stderr.write(self.style.ERROR('No replicas are configured in DATABASE_REPLICAS.'))
+            return
+
+        for alias in replica_aliases():
+            replica = settings.DATABASES[alias]
+            if replica['ENGINE'] != 'django.db.backends.sqlite3':
+                self.stderr.write(self.style.WARNING(f'Skipping {alias}: it is not SQLite.'))
+                continue
+            # The backup API takes a consistent copy even while the primary is being written.
+            source = sqlite3.connect(primary['NAME'])
+            target = sqlite3.connect(replica['NAME'])
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self.stdout.write(self.style.SUCCESS(f"Copied {primary['NAME']} to {alias} ({replica['NAME']})."))
@@ -0,0 +1,60 @@
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from authentication.models import SpamAggregate
+from authentication.scoring import spam_scorer
+from api.snapshot import EPOCH, SnapshotFile, delta_path, latest_chain, microseconds, snapshot_path, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Export every reported number with its spam count and score as a memory-mappable snapshot or delta file'
+
+    def add_arguments(self, parser):
+        config = getattr(settings, 'SPAM_SNAPSHOT', {})
+        parser.add_argument('--output-dir', default=config.get('DIR'), help='Directory the files are written to')
+        parser.add_argument('--delta', action='store_true', help='Only export numbers whose aggregate changed since the newest file in the directory')
+        parser.add_argument('--overlap', type=float, default=config.get('DELTA_OVERLAP', 60),
+                            help='Seconds before the base version a delta also covers, for transactions that committed late')
+
+    def handle(self, *args, **options):
+        directory = options['output_dir']
+        os.makedirs(directory, exist_ok=True)
+        # A number's score is recomputed whenever its aggregate row changes, including when
+        # its last report goes, which leaves the row with a count of 0; scored_at versions the rows.
+        rows = SpamAggregate.objects.order_by('phone_key')
+
+        base_version = 0
+        if options['delta']:
+            chain = latest_chain(directory)
+            if not chain:
+                self.stderr.write(self.style.ERROR(f'No snapshot in {directory} to build a delta on; export a full snapshot first.'))
+                return
+            base = SnapshotFile(chain[-1])
+            base_version = base.version
+            base.close()
+            since = EPOCH + timedelta(microseconds=base_version) - timedelta(seconds=options['overlap'])
+            rows = rows.filter(scored_at__gt=since)
+        else:
+            rows = rows.filter(report_count__gt=0)
+
+        last = rows.aggregate(last=Max('scored_at'))['last']
+        version = max(base_version, microseconds(last)) if last else base_version
+        if options['delta'] and version == base_version:
+            self.stdout.write(self.style.SUCCESS(f'No changes since version {base_version}.'))
+            return
+        version = version or 1
+
+        path = delta_path(directory, base_version, version) if options['delta'] else snapshot_path(directory, version)
+        count = write_snapshot(
+            path,
+            rows.values_list('phone_key', 'report_count', 'score', 'scored_at').iterator(chunk_size=10000),
+            version,
+            spam_scorer.spam_threshold,
+            spam_scorer.decay_rate,
+            base_version=base_version,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {count} numbers to {path} ({os.path.getsize(path)} bytes, version {version}).'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.bloom import spam_filter
+
+class Command(BaseCommand):
+    help = 'Rebuild the Bloom filter of reported numbers and write it to SPAM_FILTER PATH'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding spam filter...'))
+        count = spam_filter.rebuild()
+        stats = spam_filter.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {count} numbers in {stats['size_bytes']} bytes "
+            f"(estimated false positive rate {stats['estimated_false_positive_rate']:.4%})."
+        ))
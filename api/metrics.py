@@ -0,0 +1,208 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import LazyObject
+
+# Upper bounds, in milliseconds, of the latency histogram buckets.
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class ViewStats:
+    def __init__(self, window):
+        self.count = 0
+        self.errors = 0
+        self.totals = defaultdict(float)
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.recent = deque(maxlen=window)
+
+    def record(self, sample, status):
+        self.count += 1
+        self.errors += status >= 500
+        for name, value in sample.items():
+            self.totals[name] += value
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, sample["wall_ms"])] += 1
+        self.recent.append(sample)
+
+    def summary(self):
+        recent = list(self.recent)
+        summary = {
+            "requests": self.count,
+            "errors": self.errors,
+            "mean": {name: round(total / self.count, 3) for name, total in self.totals.items()},
+            "recent": {"samples": len(recent)},
+        }
+        for name in ("wall_ms", "db_ms", "queries", "render_ms", "response_bytes"):
+            values = sorted(sample[name] for sample in recent)
+            summary["recent"][name] = {
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "p99": values[min(len(values) - 1, int(len(values) * 0.99))],
+                "max": values[-1],
+            } if values else None
+        return summary
+
+
+class MetricsRegistry:
+    """Per-view counters, cumulative latency histograms and a rolling window of recent requests."""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view, sample, status):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = ViewStats(self.window)
+            stats.record(sample, status)
+
+    def snapshot(self):
+        with self._lock:
+            return {view: stats.summary() for view, stats in sorted(self._views.items())}
+
+    def prometheus(self):
+        lines = [
+            "# HELP falsecaller_request_duration_ms Request wall time by view.",
+            "# TYPE falsecaller_request_duration_ms histogram",
+        ]
+        counters = (
+            ("falsecaller_db_queries_total", "queries", "Database queries issued by view."),
+            ("falsecaller_db_duration_ms_total", "db_ms", "Time spent in the database by view."),
+            ("falsecaller_render_duration_ms_total", "render_ms", "Time spent rendering responses by view."),
+            ("falsecaller_response_bytes_total", "response_bytes", "Response body bytes by view."),
+        )
+        with self._lock:
+            views = sorted(self._views.items())
+            for view, stats in views:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS_MS + ("+Inf",), stats.buckets):
+                    cumulative += count
+                    lines.append(f'falsecaller_request_duration_ms_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'falsecaller_request_duration_ms_sum{{view="{view}"}} {stats.totals["wall_ms"]:.3f}')
+                lines.append(f'falsecaller_request_duration_ms_count{{view="{view}"}} {stats.count}')
+            for metric, field, description in counters:
+                lines.append(f"# HELP {metric} {description}")
+                lines.append(f"# TYPE {metric} counter")
+                for view, stats in views:
+                    lines.append(f'{metric}{{view="{view}"}} {stats.totals[field]:.3f}')
+            lines.append("# HELP falsecaller_request_errors_total Responses with a 5xx status by view.")
+            lines.append("# TYPE falsecaller_request_errors_total counter")
+            for view, stats in views:
+                lines.append(f'falsecaller_request_errors_total{{view="{view}"}} {stats.errors}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry(**{key.lower(): value for key, value in getattr(settings, "REQUEST_METRICS", {}).items()})
+
+
+class QueryTimer:
+    """Counts the queries issued while it is the current request's timer and sums their time."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Context variables follow a request into sync_to_async threads, which a per-connection
+# execute_wrapper() entered by the middleware would not see for async views.
+_current_timer = ContextVar("request_query_timer", default=None)
+
+
+def timed_execute(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.seconds += time.perf_counter() - started
+        timer.queries += 1
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver: route every query of the new connection through timed_execute."""
+    if timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(timed_execute)
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure every request's wall time, database queries and time, render time and response
+    size. The numbers are recorded per view name, and returned in a Server-Timing header to
+    admin users, or to everyone when METRICS_ACCESS's SERVER_TIMING is on.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, "METRICS_ACCESS", {}).get("SERVER_TIMING", False)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer, token, started = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer, started)
+
+    async def __acall__(self, request):
+        timer, token, started = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer, started)
+
+    def _start(self, request):
+        timer = QueryTimer()
+        request._render_seconds = 0.0
+        return timer, _current_timer.set(timer), time.perf_counter()
+
+    def _finish(self, request, response, timer, started):
+        wall = time.perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        sample = {
+            "wall_ms": round(wall * 1000, 3),
+            "db_ms": round(timer.seconds * 1000, 3),
+            "queries": timer.queries,
+            "render_ms": round(request._render_seconds * 1000, 3),
+            "response_bytes": 0 if response.streaming else len(response.content),
+        }
+        registry.record(view, sample, response.status_code)
+        if self.server_timing or self._is_staff(request):
+            response["Server-Timing"] = ", ".join((
+                f'db;dur={sample["db_ms"]};desc="{timer.queries} queries"',
+                f'render;dur={sample["render_ms"]}',
+                f'total;dur={sample["wall_ms"]}',
+            ))
+        return response
+
+    @staticmethod
+    def _is_staff(request):
+        # DRF views leave the authenticated user on the request. A lazy session user that
+        # nothing has loaded yet is not loaded here, which would query, or fail in async views.
+        user = getattr(request, "user", None)
+        return user is not None and not isinstance(user, LazyObject) and user.is_staff
+
+    def process_template_response(self, request, response):
+        # DRF responses render after this hook; time the render with a post-render callback.
+        started = time.perf_counter()
+
+        def finished(rendered):
+            request._render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(finished)
+        return response
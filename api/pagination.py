@@ -0,0 +1,76 @@
+import base64
+import binascii
+import json
+from .renderers import dumps
+
+STREAM_CHUNK_SIZE = 500
+
+
+def encode_cursor(values):
+    """Opaque token for the sort key of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, types):
+    """Sort key from encode_cursor(), checked against the expected field types."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError("cursor is not valid.")
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(type(value) is kind for value, kind in zip(values, types))
+    ):
+        raise ValueError("cursor is not valid.")
+    return values
+
+
+def wants_stream(request):
+    return request.GET.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def stream_results(results):
+    """
+    Yield the JSON document {"results": [...]} piece by piece, so a response built from a
+    queryset iterator never holds more than one chunk of rows in memory. Rows are encoded
+    like the API's renderer encodes them, so the document matches the unstreamed one.
+    """
+    yield b'{"results":['
+    separator = b""
+    for result in results:
+        yield separator + dumps(result)
+        separator = b","
+    yield b"]}"
+
+
+async def astream_results(results):
+    """stream_results() over an async iterable, for async views."""
+    yield b'{"results":['
+    separator = b""
+    async for result in results:
+        yield separator + dumps(result)
+        separator = b","
+    yield b"]}"
+
+
+def chunked(iterable, size=STREAM_CHUNK_SIZE):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def achunked(iterable, size=STREAM_CHUNK_SIZE):
+    chunk = []
+    async for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,24 @@
+from ipaddress import ip_address, ip_network
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+
+
+class IsAdminOrMetricsScraper(BasePermission):
+    """
+    Allow staff users, and scrapers that send METRICS_ACCESS's SCRAPE_TOKEN in an
+    X-Metrics-Token header or connect from one of its SCRAPE_ADDRESSES.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        access = getattr(settings, "METRICS_ACCESS", {})
+        token = access.get("SCRAPE_TOKEN")
+        if token and constant_time_compare(request.headers.get("X-Metrics-Token", ""), token):
+            return True
+        try:
+            address = ip_address(request.META.get("REMOTE_ADDR", ""))
+        except ValueError:
+            return False
+        return any(address in ip_network(network) for network in access.get("SCRAPE_ADDRESSES", ()))
@@ -0,0 +1,90 @@
+import threading
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from authentication.models import CompactedSpamReport, Contact, CustomUser, SpamAggregate, SpamReport
+from authentication.scoring import score_numbers
+from .bloom import spam_filter
+from .cache import contacts_key, lookup_cache, spam_key, user_key
+from .identity import identity_refresher
+from .metrics import install_query_timer
+
+
+def _invalidate_after_commit(cache_key, using):
+    transaction.on_commit(lambda: lookup_cache.delete(cache_key), using=using)
+
+
+@receiver(pre_save, sender=CustomUser)
+@receiver(pre_save, sender=Contact)
+def remember_previous_phone_key(sender, instance, using=None, update_fields=None, **kwargs):
+    """Keep the stored number of an edited row, whose lookups go stale as well."""
+    previous = None
+    if not instance._state.adding and (update_fields is None or "phone_number" in update_fields):
+        previous = sender._base_manager.using(using).filter(pk=instance.pk).values_list("phone_key", flat=True).first()
+    instance._previous_phone_key = previous
+
+
+def _affected_phone_keys(instance):
+    """The row's number, and its number before this save if that differed."""
+    return {instance.phone_key, getattr(instance, "_previous_phone_key", None)} - {None}
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_save, sender=Contact)
+@receiver(post_delete, sender=Contact)
+def invalidate_number_lookups(sender, instance, using=None, **kwargs):
+    keys = [
+        cache_key(key)
+        for key in _affected_phone_keys(instance)
+        for cache_key in (user_key, contacts_key, spam_key)
+    ]
+    transaction.on_commit(lambda: lookup_cache.delete(*keys), using=using)
+
+
+@receiver(post_save, sender=Contact)
+@receiver(post_delete, sender=Contact)
+def refresh_number_identity(sender, instance, using=None, **kwargs):
+    # A contact moved to another number takes its vote away from the old one.
+    keys = list(_affected_phone_keys(instance))
+    transaction.on_commit(lambda: identity_refresher.mark(keys), using=using)
+
+
+@receiver(post_save, sender=SpamReport)
+@receiver(post_delete, sender=SpamReport)
+def invalidate_spam_lookup(sender, instance, using=None, **kwargs):
+    _invalidate_after_commit(spam_key(instance.phone_key), using)
+
+
+# Numbers whose reports were deleted in this thread's open transaction, per database alias.
+_deleted_reports = threading.local()
+
+
+def _refresh_spam_aggregates(using):
+    keys = _deleted_reports.__dict__.pop(using, None)
+    if not keys:
+        return
+    with transaction.atomic(using=using):
+        SpamAggregate.objects.db_manager(using).refresh_numbers(keys)
+        score_numbers(keys)
+    lookup_cache.delete(*(spam_key(key) for key in keys))
+
+
+@receiver(post_delete, sender=SpamReport)
+@receiver(post_delete, sender=CompactedSpamReport)
+def refresh_spam_aggregate(sender, instance, using=None, **kwargs):
+    # Deleting a user deletes their reports one signal at a time; the first callback
+    # refreshes every number of the transaction and the others find nothing left to do.
+    if instance.phone_key is not None:
+        _deleted_reports.__dict__.setdefault(using, set()).add(instance.phone_key)
+        transaction.on_commit(lambda: _refresh_spam_aggregates(using), using=using)
+
+
+@receiver(post_save, sender=SpamReport)
+def add_to_spam_filter(sender, instance, created=False, using=None, **kwargs):
+    if created and instance.phone_key is not None:
+        transaction.on_commit(lambda: spam_filter.add(instance.phone_key), using=using)
+
+
+connection_created.connect(install_query_timer)
@@ -0,0 +1,194 @@
+"""
+Memory-mapped snapshots of every reported number's spam count and score, for processes
+that should answer spam lookups without a database (caller-ID clients, edge workers).
+
+A file is a header followed by four columns of equal length: the sorted canonical
+number keys (uint64), their scores (float64), the times the scores were computed at
+(int64 microseconds since the epoch) and their report counts (uint32), all
+little-endian. Lookups binary-search the mapped key column in place, so opening a file
+costs nothing however many numbers it holds, and decay the score to the current time
+with the header's decay rate, as the API does. Delta files have the same layout and hold
+only the numbers whose aggregate changed after their base version; a count of 0 marks a
+number that no longer has reports.
+"""
+import glob
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from authentication.phone import phone_key
+
+
+class SnapshotFile:
+    """One mapped snapshot or delta file."""
+
+    HEADER = struct.Struct("<8sQQQdd")
+    MAGIC = b"FCSPAM02"
+
+    def __init__(self, path):
+        if sys.byteorder != "little":
+            raise ValueError("Spam snapshots are little-endian and can only be mapped on little-endian hosts.")
+        self.path = path
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (
+                magic, self.version, self.base_version, self.count, self.spam_threshold, self.decay_rate,
+            ) = self.HEADER.unpack_from(self._map)
+        except struct.error:
+            self._map.close()
+            raise ValueError(f"{path} is not a spam snapshot.")
+        if magic != self.MAGIC or len(self._map) != self.HEADER.size + 28 * self.count:
+            self._map.close()
+            raise ValueError(f"{path} is not a spam snapshot.")
+        view = memoryview(self._map)
+        keys_end = self.HEADER.size + 8 * self.count
+        scores_end = keys_end + 8 * self.count
+        scored_at_end = scores_end + 8 * self.count
+        self._keys = view[self.HEADER.size:keys_end].cast("Q")
+        self._scores = view[keys_end:scores_end].cast("d")
+        self._scored_at = view[scores_end:scored_at_end].cast("q")
+        self._counts = view[scored_at_end:].cast("I")
+
+    @property
+    def is_delta(self):
+        return self.base_version != 0
+
+    def get(self, key, now=None):
+        """
+        (report_count, score) of key with the score decayed to now (microseconds since the
+        epoch, by default the current time), or None if this file does not mention it.
+        """
+        index = bisect_left(self._keys, key)
+        if index < self.count and self._keys[index] == key:
+            now = time.time_ns() // 1000 if now is None else now
+            age = max(now - self._scored_at[index], 0) / 1e6
+            return self._counts[index], round(self._scores[index] * math.exp(-self.decay_rate * age), 4)
+        return None
+
+    def close(self):
+        for view in (self._keys, self._scores, self._scored_at, self._counts):
+            view.release()
+        self._map.close()
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def microseconds(moment):
+    return (moment - EPOCH) // timedelta(microseconds=1)
+
+
+def write_snapshot(path, rows, version, spam_threshold, decay_rate, base_version=0):
+    """
+    Write (phone_key, report_count, score, scored_at) rows, sorted by phone_key, as a
+    snapshot (or, with a base_version, a delta) file. The file is replaced atomically.
+    """
+    keys, scores, scored_at, counts = array("Q"), array("d"), array("q"), array("I")
+    for key, report_count, score, computed_at in rows:
+        keys.append(key)
+        scores.append(score)
+        scored_at.append(microseconds(computed_at) if computed_at else 0)
+        counts.append(min(report_count, 2 ** 32 - 1))
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as handle:
+        handle.write(SnapshotFile.HEADER.pack(
+            SnapshotFile.MAGIC, version, base_version, len(keys), spam_threshold, decay_rate,
+        ))
+        for column in (keys, scores, scored_at, counts):
+            if sys.byteorder != "little":
+                column.byteswap()
+            handle.write(column.tobytes())
+    # The files are meant to be shipped to other processes and hosts, unlike a private temp file.
+    os.chmod(handle.name, 0o644)
+    os.replace(handle.name, path)
+    return len(keys)
+
+
+def snapshot_path(directory, version):
+    return os.path.join(directory, f"snapshot-{version:020d}.bin")
+
+
+def delta_path(directory, base_version, version):
+    return os.path.join(directory, f"delta-{base_version:020d}-{version:020d}.bin")
+
+
+_DELTA_NAME = re.compile(r"delta-(\d{20})-(\d{20})\.bin$")
+
+
+def latest_chain(directory):
+    """Paths of the newest snapshot in directory and of the deltas that continue it, in order."""
+    snapshots = sorted(glob.glob(os.path.join(directory, "snapshot-*.bin")))
+    if not snapshots:
+        return []
+    chain = [snapshots[-1]]
+    version = int(os.path.basename(snapshots[-1])[len("snapshot-"):-len(".bin")])
+    deltas = {}
+    for path in glob.glob(os.path.join(directory, "delta-*.bin")):
+        match = _DELTA_NAME.search(path)
+        if match:
+            deltas[int(match.group(1))] = (int(match.group(2)), path)
+    while version in deltas:
+        version, path = deltas.pop(version)
+        chain.append(path)
+    return chain
+
+
+class SpamSnapshot:
+    """The newest snapshot in a directory with its deltas applied, answering spam lookups."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = []
+        self.reload()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(getattr(settings, "SPAM_SNAPSHOT", {}).get("DIR"))
+
+    @property
+    def version(self):
+        return self._files[-1].version if self._files else 0
+
+    def reload(self):
+        """Map the newest chain of files; call after new snapshots or deltas are exported."""
+        # Replaced files are not closed here: a lookup in another thread may still hold
+        # them, and their maps are released once the last reference goes away.
+        self._files = [SnapshotFile(path) for path in latest_chain(self.directory)]
+
+    def lookup(self, key, now=None):
+        """(report_count, score) of a canonical number, its score decayed to now, or None if it has no reports."""
+        for file in reversed(self._files):
+            found = file.get(key, now)
+            if found is not None:
+                return found if found[0] else None
+        return None
+
+    def spam_counter(self, phone_number):
+        """The (status, body) the spam-counter endpoint would answer, read from the files alone."""
+        key = phone_key(phone_number) if phone_number else None
+        if key is None:
+            return 400, {"error": "Invalid phone number." if phone_number else "Phone number is required."}
+        found = self.lookup(key)
+        if not found:
+            return 404, {"message": "No spam reports found for this phone number."}
+        spam_count, spam_score = found
+        return 200, {
+            "message": f"{spam_count} spam reports found for this phone number.",
+            "spam_likelihood": "Spam" if spam_score >= self._files[-1].spam_threshold else "Unknown",
+            "spam_score": spam_score,
+            "spam_count": spam_count,
+        }
+
+    def close(self):
+        for file in self._files:
+            file.close()
+        self._files = []
@@ -1,3 +1,739 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DataError, router
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from authentication.backends import TokenUserCache
+from authentication.models import CompactedSpamReport, Contact, CustomUser, SpamAggregate, SpamReport, SpamReportSummary
+from authentication.phone import phone_key
+from authentication.retention import compact_reports
+from authentication.scoring import spam_scorer
+from authentication.tokens import RefreshToken, blacklist_index
+from falsecaller.routers import read_from_replica
+from .bloom import EPOCH, BloomFilter, ReportedNumberFilter, spam_filter
+from .cache import lookup_cache, spam_key
+from .identity import identity_refresher
+from .ingest import SpamReportBuffer, report_buffer
+from .pagination import stream_results
+from .renderers import FastJSONParser, FastJSONRenderer
+from .snapshot import SpamSnapshot
 
-# Create your tests here.
+
+class LookupTestCase(TestCase):
+    """
+    Starts every test with empty lookup caches and a spam filter built from the test
+    database. Identity refreshes are recorded in self.marked instead of being run by the
+    background thread, which cannot see the test transaction.
+    """
+
+    def setUp(self):
+        mark = mock.patch.object(identity_refresher, "mark")
+        self.marked = mark.start()
+        self.addCleanup(mark.stop)
+        spam_filter.path = None
+        spam_filter._filter = None
+        lookup_cache.clear_local()
+        cache.clear()
+        self.viewer = self.make_user("9000000000", "Viewer")
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def make_user(self, phone_number, name):
+        return CustomUser.objects.create_user(phone_number, name, password="password123")
+
+    def report(self, reporter, phone_number):
+        """Store a report the way a spam report buffer flush does."""
+        report = SpamReport.objects.create(reported_by=reporter, phone_number=phone_number)
+        SpamAggregate.objects.refresh_numbers([report.phone_key])
+        return report
+
+
+class SpamAggregateTests(LookupTestCase):
+    def test_reports_deleted_with_their_reporter_leave_the_aggregate(self):
+        alice, bob = self.make_user("9111111111", "Alice"), self.make_user("9222222222", "Bob")
+        self.report(alice, "9876543210")
+        self.report(bob, "9876543210")
+        self.assertEqual(self.client.get("/api/spam-counter/", {"phone_number": "9876543210"}).data["spam_count"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alice.delete()
+        aggregate = SpamAggregate.objects.get(pk=919876543210)
+        self.assertEqual((aggregate.report_count, aggregate.reporter_count), (1, 1))
+        self.assertEqual(self.client.get("/api/spam-counter/", {"phone_number": "9876543210"}).data["spam_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.delete()
+        aggregate = SpamAggregate.objects.get(pk=919876543210)
+        self.assertEqual((aggregate.report_count, aggregate.score), (0, 0.0))
+        self.assertEqual(self.client.get("/api/spam-counter/", {"phone_number": "9876543210"}).status_code, 404)
+
+
+class SpamScoreDecayTests(LookupTestCase):
+    def test_lookups_decay_the_stored_score(self):
+        owner = self.make_user("9111111111", "Owner")
+        self.report(owner, "9876543210")
+        half_life = timedelta(days=spam_scorer.half_life_days)
+        SpamAggregate.objects.filter(pk=919876543210).update(score=4.0, scored_at=timezone.now() - half_life)
+
+        for path in ("/api/spam-counter/", "/api/lookup/"):
+            self.assertAlmostEqual(self.client.get(path, {"phone_number": "9876543210"}).data["spam_score"], 2.0, 3)
+        results = self.client.get("/api/search-by-partial-number/", {"suffix": "3210"}).data["results"]
+        self.assertAlmostEqual(results[0]["spam_score"], 2.0, 3)
+        response = self.client.post("/api/bulk-lookup/", {"phone_numbers": ["9876543210"]}, format="json")
+        self.assertAlmostEqual(response.data["results"][0]["spam_score"], 2.0, 3)
+
+
+class SearchPaginationTests(LookupTestCase):
+    def pages(self, path, **params):
+        """Every page of a listing, following next_cursor; returns the rows of each page."""
+        pages, cursor = [], None
+        while True:
+            data = self.client.get(path, {**params, **({"cursor": cursor} if cursor else {})}).data
+            pages.append(data["results"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                return pages
+
+    def streamed(self, path, **params):
+        response = self.client.get(path, {**params, "stream": "1"})
+        self.assertTrue(response.streaming)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_name_cursors_neither_skip_nor_repeat_rows_across_inserts(self):
+        for index, name in enumerate(("Mark", "Marla", "Marlon", "Martha", "Marvin")):
+            Contact.objects.create(user=self.viewer, name=name, phone_number=f"98765000{index:02d}")
+        first = self.client.get("/api/search-by-name/", {"name": "mar", "limit": 2}).data
+        # Rows inserted before and after the cursor's position while the client pages.
+        Contact.objects.create(user=self.viewer, name="Mara", phone_number="9876500010")
+        Contact.objects.create(user=self.viewer, name="Marzipan", phone_number="9876500011")
+
+        names = [row["name"] for row in first["results"]]
+        rest = self.pages("/api/search-by-name/", name="mar", limit=2, cursor=first["next_cursor"])
+        names += [row["name"] for page in rest for row in page]
+        self.assertEqual(names, ["Mark", "Marla", "Marlon", "Martha", "Marvin", "Marzipan"])
+
+    def test_streamed_name_results_match_the_pages(self):
+        self.make_user("9111111111", "Mary Anne")
+        for index, name in enumerate(("Rosemary", "Mary", "Annemarie", "Marty")):
+            Contact.objects.create(user=self.viewer, name=name, phone_number=f"98765000{index:02d}")
+        paged = [row for page in self.pages("/api/search-by-name/", name="mar", limit=2) for row in page]
+        self.assertEqual(self.streamed("/api/search-by-name/", name="mar"), {"results": paged})
+
+    def test_number_contact_cursors_and_stream(self):
+        owners = [self.make_user(f"91111111{index:02d}", f"Owner {index}") for index in range(5)]
+        for index, owner in enumerate(owners[:3]):
+            Contact.objects.create(user=owner, name=f"Plumber {index}", phone_number="9876543210")
+        first = self.client.get("/api/search-by-number/", {"phone_number": "9876543210", "limit": 2}).data
+        self.assertEqual([row["name"] for row in first["results"]], ["Plumber 0", "Plumber 1"])
+        for index, owner in enumerate(owners[3:], start=3):
+            Contact.objects.create(user=owner, name=f"Plumber {index}", phone_number="9876543210")
+
+        rest = self.pages("/api/search-by-number/", phone_number="9876543210", limit=2, cursor=first["next_cursor"])
+        self.assertEqual([row["name"] for page in rest for row in page], ["Plumber 2", "Plumber 3", "Plumber 4"])
+        self.assertEqual(
+            self.streamed("/api/search-by-number/", phone_number="9876543210"),
+            {"results": [{"name": f"Plumber {index}", "phone_number": "9876543210"} for index in range(5)]},
+        )
+
+
+class NumberLookupTests(LookupTestCase):
+    def test_one_query_plan_answers_the_caller_screen(self):
+        CustomUser.objects.create_user("9111111111", "Alice", password="password123", email="alice@example.com")
+        Contact.objects.create(user=self.viewer, name="My Alice", phone_number="9111111111")
+        bob = self.make_user("9222222222", "Bob")
+        self.report(bob, "9111111111")
+        Contact.objects.create(user=bob, name="Plumber", phone_number="9876500001")
+        spam_filter.rebuild()
+
+        # The user, the viewer's saved flag and the contacts in one query; the spam stats in one more.
+        with self.assertNumQueries(2):
+            data = self.client.get("/api/lookup/", {"phone_number": "9111111111"}).data
+        self.assertEqual(
+            (data["name"], data["is_registered"], data["email"], data["spam_count"]), ("Alice", True, "alice@example.com", 1)
+        )
+        # Cached, only whether the viewer saved the number is checked again.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/api/lookup/", {"phone_number": "9111111111"}).data, data)
+
+        # Numbers nobody reported skip the spam query.
+        with self.assertNumQueries(1):
+            data = self.client.get("/api/lookup/", {"phone_number": "9876500001"}).data
+        self.assertEqual((data["name"], data["is_registered"], data["spam_count"]), ("Plumber", False, 0))
+        self.assertEqual(data["contacts"], [{"name": "Plumber", "phone_number": "9876500001"}])
+
+
+class PartialNumberSearchTests(LookupTestCase):
+    def search(self, **params):
+        return self.client.get("/api/search-by-partial-number/", params).data["results"]
+
+    def test_registered_numbers_rank_first_then_by_spam_score(self):
+        self.make_user("9876511111", "Registered")
+        reporters = [self.make_user(f"91111111{index:02d}", f"Reporter {index}") for index in range(3)]
+        for reporter in reporters:
+            self.report(reporter, "9876522222")
+        self.report(reporters[0], "9876533333")
+        Contact.objects.create(user=reporters[0], name="Plumber", phone_number="9876544444")
+        Contact.objects.create(user=reporters[0], name="Baker", phone_number="9876555555")
+        SpamAggregate.objects.filter(pk=919876522222).update(score=3.0, scored_at=timezone.now())
+        SpamAggregate.objects.filter(pk=919876533333).update(score=1.0, scored_at=timezone.now())
+        # Matches none of the searches below.
+        Contact.objects.create(user=reporters[0], name="Elsewhere", phone_number="9123456789")
+
+        expected = ["+919876511111", "+919876522222", "+919876533333", "+919876544444", "+919876555555"]
+        results = self.search(prefix="98765")
+        self.assertEqual([row["phone_number"] for row in results], expected)
+        self.assertEqual(
+            [(row["name"], row["is_registered"]) for row in results[:1] + results[3:]],
+            [("Registered", True), ("Plumber", False), ("Baker", False)],
+        )
+        self.assertEqual(self.search(prefix="+9198765", limit=2), self.search(prefix="98765")[:2])
+
+        self.make_user("9555522222", "Same Ending")
+        self.assertEqual(
+            [row["phone_number"] for row in self.search(suffix="22222")], ["+919555522222", "+919876522222"]
+        )
+        self.assertEqual([row["phone_number"] for row in self.search(suffix="4444")], ["+919876544444"])
+        self.assertEqual(self.search(prefix="98764"), [])
+
+
+class BulkLookupTests(LookupTestCase):
+    def lookup(self, phone_numbers):
+        return self.client.post("/api/bulk-lookup/", {"phone_numbers": phone_numbers}, format="json").data["results"]
+
+    def test_the_query_count_does_not_grow_with_the_batch(self):
+        alice = self.make_user("9111111111", "Alice")
+        Contact.objects.create(user=self.viewer, name="My Alice", phone_number="9111111111")
+        Contact.objects.create(user=alice, name="Plumber", phone_number="9876500001")
+        self.report(alice, "9876500002")
+        numbers = ["9111111111", "9876500001", "9876500002", "9876500003", "not a number"]
+        extra = [f"98765100{index:02d}" for index in range(20)]
+        for index, phone_number in enumerate(extra):
+            if index % 2:
+                self.make_user(phone_number, f"User {index}")
+            else:
+                Contact.objects.create(user=alice, name=f"Contact {index}", phone_number=phone_number)
+            self.report(alice, phone_number)
+        spam_filter.rebuild()
+
+        with self.assertNumQueries(4):
+            results = self.lookup(numbers)
+        with self.assertNumQueries(4):
+            self.assertEqual(len(self.lookup(numbers + extra)), 25)
+        self.assertEqual(
+            [(row.get("name"), row.get("is_registered"), row.get("spam_count")) for row in results],
+            [("Alice", True, 0), ("Plumber", False, 0), (None, False, 1), (None, False, 0), (None, None, None)],
+        )
+        self.assertEqual(results[0]["email"], alice.email)
+        self.assertEqual(results[4]["error"], "Invalid phone number.")
+
+
+class ContactSyncTests(LookupTestCase):
+    def sync(self, payload):
+        return self.client.post("/api/contacts/sync/", payload, format="json")
+
+    def test_mode_and_contacts_are_required(self):
+        Contact.objects.create(user=self.viewer, name="Plumber", phone_number="9876500001")
+        for payload in ({}, {"mode": "full"}, {"contacts": []}, {"mode": "delta", "contacts": None}):
+            self.assertEqual(self.sync(payload).status_code, 400, payload)
+        self.assertEqual(Contact.objects.filter(user=self.viewer).count(), 1)
+
+    def test_clearing_the_book_must_be_explicit(self):
+        Contact.objects.create(user=self.viewer, name="Plumber", phone_number="9876500001")
+        self.assertEqual(self.sync({"mode": "full", "contacts": []}).status_code, 400)
+        self.assertEqual(Contact.objects.filter(user=self.viewer).count(), 1)
+
+        response = self.sync({"mode": "full", "contacts": [], "clear": True})
+        self.assertEqual(response.data["deleted"], 1)
+        self.assertFalse(Contact.objects.filter(user=self.viewer).exists())
+
+    def test_contacts_without_a_phone_key_are_left_alone(self):
+        Contact.objects.create(user=self.viewer, name="Plumber", phone_number="9876500001")
+        Contact.objects.bulk_create([
+            Contact(user=self.viewer, name="Old", phone_number="ext 12"),
+            Contact(user=self.viewer, name="Older", phone_number="call me"),
+        ])
+
+        response = self.sync({"mode": "delta", "contacts": [{"name": "Baker", "phone_number": "9876500002"}]})
+        self.assertEqual((response.data["created"], response.data["deleted"]), (1, 0))
+        response = self.sync({"mode": "full", "contacts": [{"name": "Baker", "phone_number": "9876500002"}]})
+        self.assertEqual(response.data["deleted"], 1)
+        self.assertEqual(
+            sorted(Contact.objects.filter(user=self.viewer).values_list("name", flat=True)), ["Baker", "Old", "Older"]
+        )
+
+
+class SpamReportCompactionTests(LookupTestCase):
+    def test_reporters_cannot_report_a_compacted_number_again(self):
+        buffer = SpamReportBuffer(flush_interval=3600)
+        reporters = [self.make_user("9111111111", "Alice"), self.make_user("9222222222", "Bob")]
+        for _ in range(2):
+            for reporter in reporters:
+                buffer.enqueue(reporter.pk, "9876543210", 919876543210)
+            buffer.flush()
+            compact_reports(timezone.now() + timedelta(days=1))
+
+        self.assertFalse(SpamReport.objects.exists())
+        aggregate = SpamAggregate.objects.get(pk=919876543210)
+        self.assertEqual((aggregate.report_count, aggregate.reporter_count), (2, 2))
+        self.assertEqual(buffer.stats()["totals"]["stored_duplicates"], 2)
+        SpamAggregate.objects.rebuild()
+        aggregate.refresh_from_db()
+        self.assertEqual((aggregate.report_count, aggregate.reporter_count), (2, 2))
+
+
+    def test_deleting_a_reporter_takes_their_compacted_report_out(self):
+        alice, bob = self.make_user("9111111111", "Alice"), self.make_user("9222222222", "Bob")
+        self.report(alice, "9876543210")
+        self.report(bob, "9876543210")
+        compact_reports(timezone.now() + timedelta(days=1))
+        summary = SpamReportSummary.objects.get(phone_key=919876543210)
+        self.assertEqual(summary.report_count, 2)
+        bob_weight = CompactedSpamReport.objects.get(reported_by=bob).weight
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alice.delete()
+        summary.refresh_from_db()
+        self.assertEqual(summary.report_count, 1)
+        self.assertAlmostEqual(summary.weight, bob_weight)
+        aggregate = SpamAggregate.objects.get(pk=919876543210)
+        self.assertEqual((aggregate.report_count, aggregate.reporter_count), (1, 1))
+        self.assertEqual(self.client.get("/api/spam-counter/", {"phone_number": "9876543210"}).data["spam_count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.delete()
+        self.assertFalse(SpamReportSummary.objects.exists())
+        aggregate.refresh_from_db()
+        self.assertEqual((aggregate.report_count, aggregate.reporter_count, aggregate.score), (0, 0, 0.0))
+
+
+class SearchByNameTests(LookupTestCase):
+    def test_prefix_matches_rank_before_other_matches(self):
+        self.make_user("9111111111", "Mary Anne")
+        for name, phone_number in (("Rosemary", "9876500001"), ("Mary", "9876500002"), ("Annemarie", "9876500003")):
+            Contact.objects.create(user=self.viewer, name=name, phone_number=phone_number)
+        results = self.client.get("/api/search-by-name/", {"name": "mar"}).data["results"]
+        self.assertEqual([row["name"] for row in results], ["Mary", "Mary Anne", "Annemarie", "Rosemary"])
+
+
+class PhoneNumberInputTests(LookupTestCase):
+    def test_non_ascii_digits_are_an_invalid_number(self):
+        for value in ("²", "٩٨٧٦٥٤٣٢١٠"):
+            response = self.client.get("/api/search-by-number/", {"phone_number": value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertEqual(response.data, {"error": "Invalid phone number."})
+
+    def test_letters_and_short_numbers_are_an_invalid_number(self):
+        for value in ("98765٤٣٢١٠", "abc123", "1-800-FLOWERS", "98765 4321O", "12", "+44 12"):
+            response = self.client.get("/api/search-by-number/", {"phone_number": value})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_formatted_numbers_share_one_key(self):
+        for value in ("+91-98765 43210", "(098765) 43210", "0091.98765.43210", "98765/43210 ext. 12"):
+            self.assertEqual(phone_key(value), 919876543210, value)
+
+    def test_partial_numbers_with_letters_are_refused(self):
+        response = self.client.get("/api/search-by-partial-number/", {"prefix": "98a76"})
+        self.assertEqual(response.status_code, 400)
+
+
+class LookupCacheInvalidationTests(LookupTestCase):
+    def lookup(self, phone_number):
+        return self.client.get("/api/lookup/", {"phone_number": phone_number}).data
+
+    def test_editing_a_contact_number_drops_the_old_number_from_the_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            contact = Contact.objects.create(user=self.viewer, name="Plumber", phone_number="9876500001")
+        self.assertEqual(self.lookup("9876500001")["name"], "Plumber")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            contact.phone_number = "9876500002"
+            contact.save()
+        self.assertEqual(self.lookup("9876500001")["contacts"], [])
+        self.assertEqual(self.lookup("9876500002")["name"], "Plumber")
+        self.assertEqual(set(self.marked.call_args.args[0]), {919876500001, 919876500002})
+
+    def test_changing_a_user_number_drops_the_old_number_from_the_cache(self):
+        user = self.make_user("9876500003", "Carol")
+        self.assertTrue(self.lookup("9876500003")["is_registered"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.phone_number = "9876500004"
+            user.save()
+        self.assertFalse(self.lookup("9876500003")["is_registered"])
+        self.assertEqual(self.lookup("9876500004")["name"], "Carol")
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTests(LookupTestCase):
+    def read_alias(self, user):
+        @read_from_replica
+        def view(request):
+            return router.db_for_read(SpamAggregate)
+        return view(SimpleNamespace(user=user))
+
+    def test_lookups_read_from_a_replica_until_the_user_writes(self):
+        self.assertEqual(self.read_alias(self.viewer), "replica")
+        self.assertEqual(router.db_for_write(SpamAggregate), "default")
+
+        with mock.patch.object(report_buffer, "enqueue", return_value=True):
+            self.assertEqual(self.client.post("/api/spam-report/", {"phone_number": "9876543210"}).status_code, 202)
+        self.assertEqual(self.read_alias(self.viewer), "default")
+        self.assertEqual(self.read_alias(self.make_user("9111111111", "Other")), "replica")
+
+
+class ReplicaLookupCacheTests(LookupTestCase):
+    def spam_count(self):
+        return self.client.get("/api/spam-counter/", {"phone_number": "9876543210"}).data["spam_count"]
+
+    @override_settings(DATABASE_REPLICAS=["default"])
+    def test_replica_reads_of_a_changed_number_are_not_cached(self):
+        reporter = self.make_user("9111111111", "Reporter")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.report(reporter, "9876543210")
+        self.assertEqual(self.spam_count(), 1)
+        self.assertIsNone(lookup_cache.get(spam_key(919876543210)))
+
+        # Once the read-your-writes window has passed, replica reads are cached again.
+        cache.clear()
+        self.assertEqual(self.spam_count(), 1)
+        self.assertIsNotNone(lookup_cache.get(spam_key(919876543210)))
+
+
+class ReportedNumberFilterTests(LookupTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reporter = self.make_user("9111111111", "Reporter")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "spam_filter.bin")
+
+    def test_a_file_from_another_database_is_rebuilt(self):
+        report = self.report(self.reporter, "9876500001")
+        # Written by a database whose newest report, far above this one's id, is gone.
+        stale = BloomFilter(1000, 0.01).to_bytes((timezone.now() - EPOCH) // timedelta(microseconds=1), report.pk + 1000)
+        with open(self.path, "wb") as handle:
+            handle.write(stale)
+        self.assertTrue(ReportedNumberFilter(path=self.path, false_positive_rate=0.01).might_contain(report.phone_key))
+
+    def test_a_saved_file_is_reused_by_the_same_database(self):
+        report = self.report(self.reporter, "9876500001")
+        ReportedNumberFilter(path=self.path).rebuild()
+        reloaded = ReportedNumberFilter(path=self.path)
+        with mock.patch.object(reloaded, "_build") as build:
+            self.assertTrue(reloaded.might_contain(report.phone_key))
+        build.assert_not_called()
+
+    def test_catch_up_finds_reports_committed_out_of_id_order(self):
+        bloom = ReportedNumberFilter(refresh_interval=0)
+        SpamReport.objects.create(id=100, reported_by=self.reporter, phone_number="9876500001")
+        self.assertFalse(bloom.might_contain(919876500002))
+        # A lower id committed after the filter had seen id 100.
+        late = SpamReport.objects.create(id=50, reported_by=self.reporter, phone_number="9876500002")
+        self.assertTrue(bloom.might_contain(late.phone_key))
+
+    def test_lookups_do_not_wait_for_another_threads_refresh(self):
+        bloom = ReportedNumberFilter(refresh_interval=0)
+        bloom.refresh()
+        with bloom._refresh_lock:
+            answered = threading.Event()
+            threading.Thread(target=lambda: (bloom.might_contain(919876500001), answered.set())).start()
+            self.assertTrue(answered.wait(5))
+
+
+class SpamSnapshotTests(LookupTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def export(self, *args):
+        call_command("export_spam_snapshot", *args, output_dir=self.directory, stdout=StringIO())
+        snapshot = SpamSnapshot(self.directory)
+        self.addCleanup(snapshot.close)
+        return snapshot
+
+    def test_a_rebuild_removes_numbers_without_reports_from_the_next_delta(self):
+        reporter = self.make_user("9111111111", "Reporter")
+        kept, removed = self.report(reporter, "9876500001"), self.report(reporter, "9876500002")
+        self.assertEqual(self.export().lookup(removed.phone_key)[0], 1)
+
+        # Deleted without the post_delete refresh, which only runs once the transaction commits.
+        removed.delete()
+        SpamAggregate.objects.rebuild()
+        snapshot = self.export("--delta")
+        self.assertEqual(len(snapshot._files), 2)
+        self.assertIsNone(snapshot.lookup(removed.phone_key))
+        self.assertEqual(snapshot.lookup(kept.phone_key)[0], 1)
+
+    def test_lookups_decay_the_exported_score(self):
+        self.report(self.make_user("9111111111", "Reporter"), "9876543210")
+        half_life = timedelta(days=spam_scorer.half_life_days)
+        SpamAggregate.objects.filter(pk=919876543210).update(score=4.0, scored_at=timezone.now() - half_life)
+        status_code, body = self.export().spam_counter("9876543210")
+        self.assertEqual(status_code, 200)
+        self.assertAlmostEqual(body["spam_score"], 2.0, 3)
+
+
+class SpamReportBufferTests(TransactionTestCase):
+    # Foreign keys are checked at commit, so flushes need real transactions.
+
+    def setUp(self):
+        spam_filter.path = None
+        spam_filter._filter = None
+        self.buffer = SpamReportBuffer(flush_interval=3600)
+
+    def test_reports_of_deleted_reporters_do_not_block_the_batch(self):
+        reporter = CustomUser.objects.create_user("9111111111", "Reporter", password="password123")
+        deleted = CustomUser.objects.create_user("9222222222", "Deleted", password="password123")
+        self.buffer.enqueue(reporter.pk, "9876500001", 919876500001)
+        self.buffer.enqueue(deleted.pk, "9876500002", 919876500002)
+        deleted.delete()
+
+        metrics = self.buffer.flush()
+        self.assertEqual((metrics["inserted"], metrics["dropped"]), (1, 1))
+        self.assertEqual(list(SpamReport.objects.values_list("reported_by", "phone_key")), [(reporter.pk, 919876500001)])
+        self.assertEqual(SpamAggregate.objects.get(pk=919876500001).report_count, 1)
+        stats = self.buffer.stats()
+        self.assertEqual((stats["pending"], stats["totals"]["dropped"]), (0, 1))
+
+    def test_a_failed_flush_keeps_the_batch_and_backs_off(self):
+        self.buffer.max_retry_delay = 10 * self.buffer.flush_interval
+        reporter = CustomUser.objects.create_user("9111111111", "Reporter", password="password123")
+        self.buffer.enqueue(reporter.pk, "9876500001", 919876500001)
+        with mock.patch.object(SpamReport.objects, "bulk_create", side_effect=RuntimeError("database is locked")):
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    self.buffer.flush()
+        self.assertEqual(self.buffer.stats()["pending"], 1)
+        self.assertEqual(self.buffer.retry_delay(), 2 * self.buffer.flush_interval)
+
+        self.buffer.flush()
+        self.assertEqual(SpamReport.objects.count(), 1)
+        self.assertEqual(self.buffer.retry_delay(), self.buffer.flush_interval)
+
+
+    def test_flushes_count_new_reports_without_recounting_the_number(self):
+        reporters = [
+            CustomUser.objects.create_user(f"91111111{index:02d}", f"Reporter {index}", password="password123")
+            for index in range(3)
+        ]
+        self.buffer.enqueue(reporters[0].pk, "9876500001", 919876500001)
+        self.buffer.flush()
+        compact_reports(timezone.now() + timedelta(days=1))
+        for reporter in reporters:
+            self.buffer.enqueue(reporter.pk, "9876500001", 919876500001)
+        self.buffer.enqueue(reporters[1].pk, "9876500002", 919876500002)
+
+        with mock.patch.object(SpamAggregate.objects, "refresh_numbers") as refresh:
+            metrics = self.buffer.flush()
+        refresh.assert_not_called()
+        self.assertEqual((metrics["inserted"], metrics["stored_duplicates"]), (3, 1))
+        counts = dict(SpamAggregate.objects.values_list("phone_key", "report_count"))
+        SpamAggregate.objects.rebuild()
+        self.assertEqual(dict(SpamAggregate.objects.values_list("phone_key", "report_count")), counts)
+        self.assertEqual(counts, {919876500001: 3, 919876500002: 1})
+
+    def test_reports_stored_by_another_worker_mid_flush_are_not_counted(self):
+        first = CustomUser.objects.create_user("9111111111", "First", password="password123")
+        second = CustomUser.objects.create_user("9222222222", "Second", password="password123")
+        self.buffer.enqueue(first.pk, "9876500001", 919876500001)
+        self.buffer.enqueue(second.pk, "9876500001", 919876500001)
+        # Another worker stores a report of the batch just after the flush checked for it.
+        SpamReport.objects.create(reported_by=first, phone_number="9876500001")
+        filter_reports = SpamReport.objects.filter
+        checks = []
+
+        def racing_filter(*args, **kwargs):
+            checks.append(kwargs)
+            return filter_reports(pk__in=[]) if len(checks) == 1 else filter_reports(*args, **kwargs)
+
+        with mock.patch.object(SpamReport.objects, "filter", side_effect=racing_filter):
+            metrics = self.buffer.flush()
+        self.assertEqual((metrics["inserted"], metrics["stored_duplicates"]), (1, 1))
+        self.assertEqual(SpamReport.objects.count(), 2)
+        # The other worker counts its own report into the aggregate.
+        self.assertEqual(SpamAggregate.objects.get(pk=919876500001).report_count, 1)
+
+    def test_reports_the_database_rejects_are_dropped_alone(self):
+        reporter = CustomUser.objects.create_user("9111111111", "Reporter", password="password123")
+        for index in range(5):
+            self.buffer.enqueue(reporter.pk, f"987650000{index}", 919876500000 + index)
+        bulk_create = SpamReport.objects.bulk_create
+
+        def rejecting_bulk_create(reports, **kwargs):
+            if any(report.phone_key == 919876500003 for report in reports):
+                raise DataError("value too long for type character varying(15)")
+            return bulk_create(reports, **kwargs)
+
+        with mock.patch.object(SpamReport.objects, "bulk_create", side_effect=rejecting_bulk_create):
+            metrics = self.buffer.flush()
+        self.assertEqual((metrics["inserted"], metrics["dropped"]), (4, 1))
+        self.assertEqual(self.buffer.stats()["pending"], 0)
+        self.assertNotIn(919876500003, SpamReport.objects.values_list("phone_key", flat=True))
+
+    def test_numbers_that_cannot_be_stored_are_refused_at_enqueue(self):
+        with self.assertRaises(ValueError):
+            self.buffer.enqueue(1, "+91 98765 43210 ext 12", 919876543210)
+        with self.assertRaises(ValueError):
+            self.buffer.enqueue(1, "12", None)
+        self.assertEqual(self.buffer.stats()["pending"], 0)
+
+        reporter = CustomUser.objects.create_user("9111111111", "Reporter", password="password123")
+        client = APIClient()
+        client.force_authenticate(reporter)
+        response = client.post("/api/spam-report/", {"phone_number": "+91 98765 43210 ext 12"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class TokenUserCacheTests(LookupTestCase):
+    def test_invalidation_reaches_workers_sharing_the_cache(self):
+        first, second = TokenUserCache(), TokenUserCache()
+        expires_at = timezone.now().timestamp() + 300
+        first.set("jti", self.viewer, expires_at, first.version(self.viewer.pk))
+        self.assertEqual(first.get("jti"), self.viewer)
+
+        second.invalidate_user(self.viewer.pk)
+        self.assertIsNone(first.get("jti"))
+
+    def test_saving_a_user_stops_serving_the_cached_copy(self):
+        token_cache = TokenUserCache()
+        token_cache.set("jti", self.viewer, timezone.now().timestamp() + 300, token_cache.version(self.viewer.pk))
+        self.viewer.is_active = False
+        self.viewer.save()
+        self.assertIsNone(token_cache.get("jti"))
+
+
+class RefreshTokenBlacklistTests(LookupTestCase):
+    def setUp(self):
+        super().setUp()
+        # Start and end with an empty index: row ids are reused once a test rolls back.
+        self.reset_index()
+        self.addCleanup(self.reset_index)
+
+    def reset_index(self):
+        blacklist_index._expiry, blacklist_index._watermark = {}, None
+
+    def test_a_token_blacklisted_by_another_worker_is_refused_once_the_index_catches_up(self):
+        token = RefreshToken.for_user(self.viewer)
+        self.assertNotIn(token["jti"], blacklist_index)
+        # Blacklisted without telling this worker's index.
+        BlacklistedToken.objects.create(token=OutstandingToken.objects.get(jti=token["jti"]))
+        with self.assertNumQueries(0):
+            RefreshToken(str(token))
+
+        blacklist_index._refreshed_at -= blacklist_index.refresh_interval
+        with self.assertRaises(TokenError):
+            RefreshToken(str(token))
+        self.assertEqual(self.client.post("/auth/token/refresh/", {"refresh": str(token)}).status_code, 401)
+
+    def test_a_token_blacklisted_here_is_refused_at_once(self):
+        token = RefreshToken.for_user(self.viewer)
+        self.assertNotIn(token["jti"], blacklist_index)
+        RefreshToken(str(token)).blacklist()
+        with self.assertNumQueries(0), self.assertRaises(TokenError):
+            RefreshToken(str(token))
+
+
+class MetricsAccessTests(LookupTestCase):
+    def scrape(self, **headers):
+        return APIClient().get("/api/metrics/", **headers).status_code
+
+    def test_local_requests_need_a_token_or_an_allowed_address(self):
+        self.assertIn(self.scrape(), (401, 403))
+        with override_settings(METRICS_ACCESS={"SCRAPE_TOKEN": "secret"}):
+            self.assertIn(self.scrape(HTTP_X_METRICS_TOKEN="wrong"), (401, 403))
+            self.assertEqual(self.scrape(HTTP_X_METRICS_TOKEN="secret"), 200)
+        with override_settings(METRICS_ACCESS={"SCRAPE_ADDRESSES": ["127.0.0.0/8"]}):
+            self.assertEqual(self.scrape(), 200)
+
+    def test_server_timing_is_only_sent_to_admin_users(self):
+        response = self.client.get("/api/spam-counter/", {"phone_number": "9876543210"})
+        self.assertNotIn("Server-Timing", response)
+
+        self.viewer.is_staff = True
+        self.viewer.save()
+        response = self.client.get("/api/spam-counter/", {"phone_number": "9876543210"})
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+
+class JSONRenderingTests(SimpleTestCase):
+    payload = {
+        "name": "Zoë \u2028 \U0001f4de",
+        "score": 0.1,
+        "count": 2 ** 40,
+        "at": datetime(2026, 10, 17, 18, 30, 5, 123456, tzinfo=dt_timezone.utc),
+        "day": date(2026, 10, 17),
+        "amount": Decimal("1.50"),
+        "pair": (1, None),
+        "nested": {"ok": True, "empty": []},
+    }
+
+    def test_the_renderer_writes_what_drf_writes(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+        self.assertEqual(FastJSONRenderer().render(None), JSONRenderer().render(None))
+        indented = {"renderer_context": {"indent": 2}}
+        self.assertEqual(
+            FastJSONRenderer().render(self.payload, **indented), JSONRenderer().render(self.payload, **indented)
+        )
+
+    def test_streamed_results_match_the_rendered_document(self):
+        rows = [self.payload, {"name": "Plumber"}]
+        self.assertEqual(b"".join(stream_results(rows)), JSONRenderer().render({"results": rows}))
+        self.assertEqual(b"".join(stream_results([])), JSONRenderer().render({"results": []}))
+
+    def test_the_parser_reads_what_drf_reads(self):
+        body = JSONRenderer().render({**self.payload, "at": "2026-10-17T18:30:05Z", "amount": 1.5, "pair": [1, None]})
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for invalid in (b'{"a": NaN}', b'{"a": 1', b"\xff"):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(invalid))
+            with self.assertRaises(ParseError):
+                JSONParser().parse(BytesIO(invalid))
+
+
+class AsyncViewTests(LookupTestCase):
+    def test_async_views_answer_like_the_sync_views(self):
+        owner = self.make_user("9111111111", "Owner")
+        self.report(owner, "9876500001")
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.create(user=owner, name="Plumber", phone_number="9876500001")
+            for index in range(3):
+                Contact.objects.create(user=self.viewer, name=f"Plumber {index}", phone_number="9876500002")
+        SpamAggregate.objects.filter(pk=919876500001).update(
+            score=4.0, scored_at=timezone.now() - timedelta(days=spam_scorer.half_life_days)
+        )
+        token = f"Bearer {RefreshToken.for_user(self.viewer).access_token}"
+        for path, params in (
+            ("search-by-number", {"phone_number": "9876500001"}),
+            ("search-by-number", {"phone_number": "9111111111"}),
+            ("search-by-number", {"phone_number": "9876500002", "limit": 2}),
+            ("search-by-name", {"name": "plumb", "limit": 2}),
+            ("spam-counter", {"phone_number": "9876500001"}),
+            ("display-detail", {"phone_number": "9111111111"}),
+            ("display-detail", {"phone_number": "9876500001"}),
+        ):
+            # The sync view fills the cache for the async one, then the other way round.
+            expected = self.client.get(f"/api/{path}/", params)
+            response = APIClient().get(f"/api/async/{path}/", params, HTTP_AUTHORIZATION=token)
+            self.assertEqual((response.status_code, response.json()), (expected.status_code, expected.json()), (path, params))
+            lookup_cache.clear_local()
+            cache.clear()
+            response = APIClient().get(f"/api/async/{path}/", params, HTTP_AUTHORIZATION=token)
+            expected = self.client.get(f"/api/{path}/", params)
+            self.assertEqual((response.status_code, response.json()), (expected.status_code, expected.json()), (path, params))
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('spam-report/', views.mark_spam , name='mark_spam'),
@@ -7,4 +7,17 @@ urlpatterns = [
     path('search-by-number/',views.search_by_number, name='search_by_number'),
     path('spam-counter/', views.spam_counter, name="spam-counter"),
     path('display-detail/', views.display_detail, name="display-details"),
+    path('search-by-partial-number/', views.search_by_partial_number, name="search-by-partial-number"),
+    path('lookup/', views.number_lookup, name="lookup"),
+    path('bulk-lookup/', views.bulk_lookup, name="bulk-lookup"),
+    path('contacts/sync/', views.sync_contact_book, name="contacts-sync"),
+    path('cache-stats/', views.lookup_cache_stats, name="cache-stats"),
+    path('spam-filter-stats/', views.spam_filter_stats, name="spam-filter-stats"),
+    path('spam-report-stats/', views.spam_report_buffer_stats, name="spam-report-stats"),
+    path('request-stats/', views.request_stats, name="request-stats"),
+    path('metrics/', views.prometheus_metrics, name="metrics"),
+    path('async/search-by-name/', async_views.search_by_name, name="async-search-by-name"),
+    path('async/search-by-number/', async_views.search_by_number, name="async-search-by-number"),
+    path('async/spam-counter/', async_views.spam_counter, name="async-spam-counter"),
+    path('async/display-detail/', async_views.display_detail, name="async-display-detail"),
 ]
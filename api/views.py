@@ -1,37 +1,283 @@
 import logging
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from django.contrib.auth import get_user_model
-from authentication.models import SpamReport, Contact
+from authentication.models import SpamReport, SpamAggregate, Contact, NameTrigram, NumberIdentity
+from authentication.contacts import sync_contacts
+from authentication.phone import MAX_E164_DIGITS, digits_prefix_range, format_phone_key, partial_digits, phone_key
+from authentication.scoring import spam_scorer
+from authentication.search import filter_by_name
 from rest_framework.exceptions import ValidationError
 from django.db.models import Q
-from django.db.models import Case, When, IntegerField
+from django.db.models import BooleanField, Case, CharField, Exists, When, IntegerField, Value
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from falsecaller.routers import read_from_replica, record_write
+from .bloom import spam_filter
+from .cache import contacts_key, identity_key, lookup_cache, spam_key, user_key
+from .identity import identity_refresher
+from .ingest import report_buffer
+from .metrics import registry
+from .pagination import STREAM_CHUNK_SIZE, chunked, decode_cursor, encode_cursor, stream_results, wants_stream
+from .permissions import IsAdminOrMetricsScraper
 
 logger = logging.getLogger(__name__)
 
 CustomUser = get_user_model()
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated]) 
-def mark_spam(request):
-    auth_header = request.headers.get("Authorization", None)
 
-    if auth_header is None:
-        logger.warning("Authorization header missing.")
-        return Response(
-            {"error": "Authorization header missing"},
-            status=status.HTTP_401_UNAUTHORIZED,
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_PAGE_SIZE = 200
+BULK_LOOKUP_MAX_NUMBERS = 500
+PARTIAL_NUMBER_MIN_DIGITS = 3
+PARTIAL_NUMBER_PAGE_SIZE = 20
+PARTIAL_NUMBER_MAX_PAGE_SIZE = 50
+# Rows read from each table before ranking, which bounds the work of short, common prefixes.
+PARTIAL_NUMBER_CANDIDATES = 500
+CONTACT_SYNC_MAX_ENTRIES = 10000
+
+# (report_count, score) of a number nobody reported.
+NO_SPAM = (0, 0.0)
+
+
+def current_spam_stats(report_count, score, scored_at, now=None):
+    """(report_count, score) of a stored aggregate, its score decayed from scored_at to now."""
+    return report_count, round(spam_scorer.decayed(score, scored_at, now or timezone.now()), 4)
+
+
+def get_spam_stats(key):
+    """(report_count, score) of a number, its stored score decayed to now."""
+    if not spam_filter.might_contain(key):
+        return NO_SPAM
+    # The stored row is cached, so the decay is applied fresh on every read.
+    stats = lookup_cache.get_or_set(
+        spam_key(key),
+        lambda: SpamAggregate.objects.filter(pk=key).values_list("report_count", "score", "scored_at").first(),
+    )
+    return current_spam_stats(*stats) if stats else NO_SPAM
+
+
+def get_identity(key):
+    """The crowd-sourced name of a number with its votes and alternates, or None."""
+    return lookup_cache.get_or_set(
+        identity_key(key),
+        lambda: NumberIdentity.objects.filter(pk=key).values("name", "votes", "total_votes", "alternates").first(),
+    )
+
+
+def get_spam_stats_many(keys):
+    """Return {phone_key: (report_count, score)} for the given canonical numbers in at most one query."""
+    keys = {key for key in keys if spam_filter.might_contain(key)}
+    if not keys:
+        return {}
+    now = timezone.now()
+    return {
+        key: current_spam_stats(report_count, score, scored_at, now)
+        for key, report_count, score, scored_at in SpamAggregate.objects.filter(pk__in=keys).values_list(
+            "phone_key", "report_count", "score", "scored_at"
         )
+    }
+
+
+def spam_fields(spam_stats):
+    spam_count, spam_score = spam_stats
+    return {
+        "spam_likelihood": spam_scorer.label(spam_score),
+        "spam_score": spam_score,
+        "spam_count": spam_count,
+    }
+
+
+LOOKUP_USER, LOOKUP_CONTACT = 0, 1
+
+_UNCACHED = object()
+
+
+def number_rows(key, viewer=None, after_id=None, limit=SEARCH_MAX_PAGE_SIZE):
+    """
+    In one query: the registered user with this number, annotated with whether viewer saved
+    the number, followed by up to limit + 1 of its contact entries after after_id in id order.
+    """
+    saved = Exists(Contact.objects.filter(user=viewer, phone_key=key)) if viewer else Value(False)
+    users = CustomUser.objects.filter(phone_key=key).annotate(
+        source=Value(LOOKUP_USER, output_field=IntegerField()),
+        is_contact=saved,
+    )
+    contacts = Contact.objects.filter(phone_key=key).annotate(
+        email=Value(None, output_field=CharField()),
+        source=Value(LOOKUP_CONTACT, output_field=IntegerField()),
+        is_contact=Value(False, output_field=BooleanField()),
+    )
+    if after_id is not None:
+        contacts = contacts.filter(id__gt=after_id)
+    fields = ("id", "name", "phone_number", "email", "source", "is_contact")
+    rows = users.values(*fields).union(contacts.values(*fields), all=True).order_by("source", "id")
+    return list(rows[:limit + 2])
+
+
+def lookup_number(key, viewer=None, limit=SEARCH_PAGE_SIZE, after_id=None, people=True, spam=True):
+    """
+    Everything the lookup endpoints answer about a number: the registered user, a page of
+    the contact entries saving it, whether viewer saved it (which decides if the user's
+    email is shown) and its spam stats. With people=False or spam=False that half is skipped.
+
+    The user and the first page of contacts are cached. A miss costs one number_rows()
+    query, and the spam stats at most one more; a hit only checks viewer's contacts.
+    """
+    lookup = {
+        "user": None,
+        "is_contact": False,
+        "contacts": [],
+        "has_more": False,
+        "spam_stats": get_spam_stats(key) if spam else NO_SPAM,
+    }
+    if not people:
+        return lookup
+
+    user = lookup_cache.get(user_key(key), _UNCACHED)
+    contacts = lookup_cache.get(contacts_key(key), _UNCACHED) if after_id is None else _UNCACHED
+    if user is _UNCACHED or contacts is _UNCACHED:
+        rows = number_rows(key, viewer, after_id, limit if after_id is not None else SEARCH_MAX_PAGE_SIZE)
+        user = next((row for row in rows if row["source"] == LOOKUP_USER), None)
+        contacts = [
+            {"id": row["id"], "name": row["name"], "phone_number": row["phone_number"]}
+            for row in rows if row["source"] == LOOKUP_CONTACT
+        ]
+        lookup["is_contact"] = bool(user and user["is_contact"])
+        if user:
+            user = {"name": user["name"], "phone_number": user["phone_number"], "email": user["email"]}
+        lookup_cache.set(user_key(key), user)
+        if after_id is None:
+            lookup_cache.set(contacts_key(key), contacts)
+    elif user and viewer:
+        lookup["is_contact"] = Contact.objects.filter(user=viewer, phone_key=key).exists()
+
+    lookup["user"] = user
+    lookup["contacts"] = contacts[:limit]
+    lookup["has_more"] = len(contacts) > limit
+    return lookup
+
+
+def partial_number_matches(digits, suffix=False, limit=PARTIAL_NUMBER_PAGE_SIZE):
+    """
+    Numbers whose canonical digits start (or with suffix=True, end) with digits, registered
+    users first, then by spam score. Each table answers with one index range scan on its
+    prefix or suffix key, capped at PARTIAL_NUMBER_CANDIDATES rows.
+    """
+    field = "phone_suffix_key" if suffix else "phone_prefix_key"
+    low, high = digits_prefix_range(digits[::-1] if suffix else digits)
+
+    def matching(queryset, *order):
+        return queryset.filter(**{f"{field}__gte": low, f"{field}__lt": high}).order_by(field, *order)
+
+    users = {
+        row["phone_key"]: row
+        for row in matching(CustomUser.objects.all()).values("phone_key", "name")[:PARTIAL_NUMBER_CANDIDATES]
+    }
+    now = timezone.now()
+    spam_stats = {
+        key: current_spam_stats(report_count, score, scored_at, now)
+        for key, report_count, score, scored_at in matching(SpamAggregate.objects.all()).values_list(
+            "phone_key", "report_count", "score", "scored_at"
+        )[:PARTIAL_NUMBER_CANDIDATES]
+    }
+    contact_names = {}
+    for key, name in matching(Contact.objects.all(), "id").values_list("phone_key", "name")[:PARTIAL_NUMBER_CANDIDATES]:
+        contact_names.setdefault(key, name)
+    # Numbers past the aggregate cap can still have reports.
+    spam_stats.update(get_spam_stats_many((users.keys() | contact_names.keys()) - spam_stats.keys()))
+
+    ranked = sorted(
+        users.keys() | contact_names.keys() | spam_stats.keys(),
+        key=lambda key: (key not in users, -spam_stats.get(key, NO_SPAM)[1], key),
+    )
+    return [
+        {
+            "phone_number": format_phone_key(key),
+            "name": users[key]["name"] if key in users else contact_names.get(key),
+            "is_registered": key in users,
+            **spam_fields(spam_stats.get(key, NO_SPAM)),
+        }
+        for key in ranked[:limit]
+    ]
+
+
+def invalid_phone_number(phone_number):
+    logger.warning("Invalid phone number: %s", phone_number)
+    return Response({"error": "Invalid phone number."}, status=status.HTTP_400_BAD_REQUEST)
 
+
+def get_pagination(request, cursor_types):
+    """Return (limit, offset, cursor); cursor is the decoded sort key of the previous page's last row."""
     try:
-        token = auth_header.split(" ")[1]
-        jwt_auth = JWTAuthentication()
-        validated_token = jwt_auth.get_validated_token(token)
-        user = jwt_auth.get_user(validated_token)
+        limit = int(request.GET.get("limit", SEARCH_PAGE_SIZE))
+        offset = int(request.GET.get("offset", 0))
+    except (TypeError, ValueError):
+        raise ValueError("limit and offset must be integers.")
+    if limit < 1 or offset < 0:
+        raise ValueError("limit must be positive and offset must not be negative.")
+    cursor = request.GET.get("cursor")
+    if cursor is not None:
+        if offset:
+            raise ValueError("cursor and offset cannot be combined.")
+        cursor = decode_cursor(cursor, cursor_types)
+    return min(limit, SEARCH_MAX_PAGE_SIZE), offset, cursor
+
+
+NAME_CURSOR_TYPES = (int, str, int, int)
+
+
+def name_matches(queryset, query, source, cursor=None):
+    """
+    Rows of queryset whose name contains query, ranked with prefix matches first. With a
+    cursor, only rows sorting after it on (rank, name, source, id) are returned.
+    """
+    matches = filter_by_name(queryset, query, source).annotate(
+        rank=Case(
+            When(name__istartswith=query, then=0),
+            default=1,
+            output_field=IntegerField(),
+        ),
+        source=Value(source, output_field=IntegerField()),
+    )
+    if cursor is not None:
+        rank, name, cursor_source, last_id = cursor
+        later = Q(rank__gt=rank) | Q(rank=rank, name__gt=name)
+        # source is constant within this queryset, so the tie-break reduces to one branch.
+        if source > cursor_source:
+            later |= Q(rank=rank, name=name)
+        elif source == cursor_source:
+            later |= Q(rank=rank, name=name, id__gt=last_id)
+        matches = matches.filter(later)
+    return matches.values("id", "name", "phone_number", "phone_key", "rank", "source").order_by()
+
+
+def name_result(row, spam_stats):
+    return {
+        "name": row["name"],
+        "phone_number": row["phone_number"],
+        **spam_fields(spam_stats.get(row["phone_key"], NO_SPAM)),
+    }
+
+
+def name_results(rows):
+    """Search results for matched rows, with spam scores looked up once per chunk."""
+    for chunk in chunked(rows):
+        spam_stats = get_spam_stats_many(row["phone_key"] for row in chunk)
+        for row in chunk:
+            yield name_result(row, spam_stats)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated]) 
+def mark_spam(request):
+    # request.user was already resolved from the bearer token by the authentication class.
+    user = request.user
 
+    try:
         phone_number = request.data.get("phone_number")
         
         if not phone_number:
@@ -40,24 +286,30 @@ def mark_spam(request):
                 {"error": "Phone number is required."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        phone_number = str(phone_number)
+        key = phone_key(phone_number)
+        if key is None:
+            return invalid_phone_number(phone_number)
+        if len(phone_number) > SpamReport._meta.get_field("phone_number").max_length:
+            return Response(
+                {"error": "Phone number is too long; send it without spaces or an extension."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        spam_report = SpamReport.objects.create(
-            reported_by=user, 
-            phone_number=phone_number
-        )
-        logger.info(f"Spam report created for phone number: {phone_number} by user {user.username}")
+        if not report_buffer.enqueue(user.pk, phone_number, key):
+            logger.error("Spam report buffer is full.")
+            return Response(
+                {"error": "Too many pending spam reports, try again shortly."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        record_write(user.pk)
+        logger.info("Spam report accepted for phone number: %s by user %s", phone_number, user.phone_number)
 
         return Response(
-            {"message": f"Spam report for {phone_number} created successfully."},
-            status=status.HTTP_201_CREATED,
+            {"message": f"Spam report for {phone_number} accepted."},
+            status=status.HTTP_202_ACCEPTED,
         )
     
-    except IndexError:
-        logger.error("Invalid token format.")
-        return Response(
-            {"error": "Invalid token format."},
-            status=status.HTTP_401_UNAUTHORIZED,
-        )
     except Exception as e:
         logger.exception("Error occurred in mark_spam view.")
         return Response(
@@ -68,6 +320,7 @@ def mark_spam(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])  
+@read_from_replica
 def search_by_name(request):
     query = request.GET.get('name', None)
     
@@ -78,52 +331,45 @@ def search_by_name(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    custom_users = CustomUser.objects.filter(name__icontains=query).order_by(
-        Case(
-            When(name__istartswith=query, then=0),
-            default=1,
-            output_field=IntegerField(),
-        ),
-        'name'
-    )
-    
-    contacts = Contact.objects.filter(name__icontains=query).order_by(
-        Case(
-            When(name__istartswith=query, then=0),
-            default=1,
-            output_field=IntegerField(),
-        ),
-        'name'
-    )
+    try:
+        limit, offset, cursor = get_pagination(request, NAME_CURSOR_TYPES)
+    except ValueError as e:
+        logger.warning("Invalid pagination parameters: %s", e)
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    results = []
-    for user in custom_users:
-        spam_likelihood = "Unknown"  
-        if SpamReport.objects.filter(phone_number=user.phone_number).exists():
-            spam_likelihood = "Spam"
-        results.append({
-            "name": user.name,
-            "phone_number": user.phone_number,
-            "spam_likelihood": spam_likelihood
-        })
+    custom_users = name_matches(CustomUser.objects.all(), query, NameTrigram.USER, cursor)
+    contacts = name_matches(Contact.objects.all(), query, NameTrigram.CONTACT, cursor)
+    matches = custom_users.union(contacts, all=True).order_by("rank", "name", "source", "id")
 
-    for contact in contacts:
-        spam_likelihood = "Unknown"  
-        if SpamReport.objects.filter(phone_number=contact.phone_number).exists():
-            spam_likelihood = "Spam"
-        results.append({
-            "name": contact.name,
-            "phone_number": contact.phone_number,
-            "spam_likelihood": spam_likelihood
-        })
+    if wants_stream(request):
+        logger.info("Streaming search results for name query '%s'.", query)
+        return StreamingHttpResponse(
+            stream_results(name_results(matches.iterator(chunk_size=STREAM_CHUNK_SIZE))),
+            content_type="application/json",
+        )
 
-    logger.info(f"Search results for name query '{query}': {len(results)} results found.")
-    
-    return Response({"results": results}, status=status.HTTP_200_OK)
+    # Fetch one extra row so we know whether another page exists without a COUNT(*).
+    page = list(matches[offset:offset + limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    results = list(name_results(page))
+
+    logger.info("Search results for name query '%s': %s results found.", query, len(results))
+
+    last = page[-1] if has_more else None
+    response_data = {
+        "results": results,
+        "next_cursor": encode_cursor([last["rank"], last["name"], last["source"], last["id"]]) if last else None,
+    }
+    if cursor is None:
+        response_data["next_offset"] = offset + limit if has_more else None
+
+    return Response(response_data, status=status.HTTP_200_OK)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def search_by_number(request):
     phone_number = request.query_params.get('phone_number', None)
     
@@ -131,30 +377,72 @@ def search_by_number(request):
         logger.warning("Phone number query parameter missing.")
         return Response({"error": "Phone number is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = CustomUser.objects.filter(phone_number=phone_number).first()
+    key = phone_key(phone_number)
+    if key is None:
+        return invalid_phone_number(phone_number)
+
+    # A registered number answers before its pagination parameters are looked at.
+    try:
+        limit, _, cursor = get_pagination(request, (int,))
+        pagination_error = None
+    except ValueError as e:
+        limit, cursor, pagination_error = 0, None, e
+    streaming = wants_stream(request)
+    lookup = lookup_number(
+        key,
+        limit=0 if streaming else limit,
+        after_id=cursor[0] if cursor else None,
+        spam=False,
+    )
+
+    user = lookup["user"]
     if user:
-        logger.info(f"User found for phone number: {phone_number}")
+        logger.info("User found for phone number: %s", phone_number)
         return Response({
             "message": "User found.",
-            "name": user.name,
-            "phone_number": user.phone_number
+            "name": user["name"],
+            "phone_number": user["phone_number"]
         }, status=status.HTTP_200_OK)
 
-    contacts = Contact.objects.filter(phone_number=phone_number)
-    if contacts.exists():
-        contact_results = [{"name": contact.name, "phone_number": contact.phone_number} for contact in contacts]
-        logger.info(f"Contacts found for phone number: {phone_number}")
+    if pagination_error:
+        logger.warning("Invalid pagination parameters: %s", pagination_error)
+        return Response({"error": str(pagination_error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    if streaming:
+        logger.info("Streaming contacts for phone number: %s", phone_number)
+        contacts = Contact.objects.filter(phone_key=key).order_by("id").values("name", "phone_number")
+        return StreamingHttpResponse(
+            stream_results(contacts.iterator(chunk_size=STREAM_CHUNK_SIZE)),
+            content_type="application/json",
+        )
+
+    if cursor is None:
+        identity = get_identity(key)
+        if identity:
+            logger.info("Name found for phone number: %s", phone_number)
+            return Response({
+                "message": "Name found.",
+                "phone_number": phone_number,
+                **identity,
+            }, status=status.HTTP_200_OK)
+
+    # Numbers whose identity the background refresh has not computed yet list their contacts.
+    page = lookup["contacts"]
+    if page:
+        logger.info("Contacts found for phone number: %s", phone_number)
         return Response({
             "message": "Contacts found.",
-            "results": contact_results
+            "results": [{"name": row["name"], "phone_number": row["phone_number"]} for row in page],
+            "next_cursor": encode_cursor([page[-1]["id"]]) if lookup["has_more"] else None,
         }, status=status.HTTP_200_OK)
 
-    logger.warning(f"No results found for phone number: {phone_number}")
+    logger.warning("No results found for phone number: %s", phone_number)
     return Response({"message": "No results found for this phone number."}, status=status.HTTP_404_NOT_FOUND)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def spam_counter(request):
     phone_number = request.query_params.get('phone_number', None)
     
@@ -162,13 +450,18 @@ def spam_counter(request):
         logger.warning("Phone number query parameter missing.")
         return Response({"error": "Phone number is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    spam_count = SpamReport.objects.filter(phone_number=phone_number).count()
-    logger.info(f"Spam report count for phone number {phone_number}: {spam_count}")
+    key = phone_key(phone_number)
+    if key is None:
+        return invalid_phone_number(phone_number)
+
+    spam_stats = lookup_number(key, people=False)["spam_stats"]
+    spam_count = spam_stats[0]
+    logger.info("Spam report count for phone number %s: %s", phone_number, spam_count)
 
     if spam_count > 0:
         return Response({
             "message": f"{spam_count} spam reports found for this phone number.",
-            "spam_count": spam_count
+            **spam_fields(spam_stats),
         }, status=status.HTTP_200_OK)
     
     return Response({
@@ -178,6 +471,7 @@ def spam_counter(request):
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def display_detail(request):
     phone_number = request.query_params.get('phone_number', None)
     
@@ -185,30 +479,232 @@ def display_detail(request):
         logger.warning("Phone number query parameter missing.")
         return Response({"error": "Phone number is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        user = CustomUser.objects.get(phone_number=phone_number)
-        logger.info(f"User details found for phone number: {phone_number}")
-    except CustomUser.DoesNotExist:
-        user = None
-        logger.warning(f"No user found for phone number: {phone_number}")
+    key = phone_key(phone_number)
+    if key is None:
+        return invalid_phone_number(phone_number)
 
-    spam_count = SpamReport.objects.filter(phone_number=phone_number).count()
+    lookup = lookup_number(key, viewer=request.user, limit=0)
+    user = lookup["user"]
+    if user:
+        logger.info("User details found for phone number: %s", phone_number)
+    else:
+        logger.warning("No user found for phone number: %s", phone_number)
 
     response_data = {
         "phone_number": phone_number,
-        "spam_likelihood": spam_count,
+        **spam_fields(lookup["spam_stats"]),
     }
 
     if user:
-        current_user = request.user  
-        is_contact = Contact.objects.filter(user=current_user, phone_number=phone_number).exists()
-
-        response_data["name"] = user.name
-        if is_contact:
-            response_data["email"] = user.email  
-        else:
-            response_data["email"] = None  
+        response_data["name"] = user["name"]
+        response_data["email"] = user["email"] if lookup["is_contact"] else None
 
-    logger.info(f"Details response for phone number {phone_number}: {response_data}")
-    
     return Response(response_data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def number_lookup(request):
+    """Caller-screen lookup: what search-by-number, spam-counter and display-detail answer, in one request."""
+    phone_number = request.query_params.get('phone_number', None)
+
+    if not phone_number:
+        logger.warning("Phone number query parameter missing.")
+        return Response({"error": "Phone number is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    key = phone_key(phone_number)
+    if key is None:
+        return invalid_phone_number(phone_number)
+
+    try:
+        limit, _, cursor = get_pagination(request, (int,))
+    except ValueError as e:
+        logger.warning("Invalid pagination parameters: %s", e)
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    lookup = lookup_number(key, viewer=request.user, limit=limit, after_id=cursor[0] if cursor else None)
+    user, contacts = lookup["user"], lookup["contacts"]
+    logger.info("Lookup for phone number %s: registered=%s, %s contacts.", phone_number, bool(user), len(contacts))
+
+    return Response({
+        "phone_number": phone_number,
+        "is_registered": user is not None,
+        "name": user["name"] if user else (contacts[0]["name"] if contacts else None),
+        "email": user["email"] if user and lookup["is_contact"] else None,
+        **spam_fields(lookup["spam_stats"]),
+        "contacts": [{"name": row["name"], "phone_number": row["phone_number"]} for row in contacts],
+        "next_cursor": encode_cursor([contacts[-1]["id"]]) if lookup["has_more"] else None,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def search_by_partial_number(request):
+    prefix = request.query_params.get('prefix', None)
+    suffix = request.query_params.get('suffix', None)
+
+    if bool(prefix) == bool(suffix):
+        logger.warning("Partial number search needs exactly one of prefix and suffix.")
+        return Response({"error": "Pass either prefix or suffix."}, status=status.HTTP_400_BAD_REQUEST)
+
+    digits = partial_digits(prefix or suffix, suffix=bool(suffix))
+    if not PARTIAL_NUMBER_MIN_DIGITS <= len(digits) <= MAX_E164_DIGITS:
+        logger.warning("Invalid partial number: %s", prefix or suffix)
+        return Response(
+            {"error": f"A partial number needs {PARTIAL_NUMBER_MIN_DIGITS} to {MAX_E164_DIGITS} digits."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        limit = min(int(request.query_params.get('limit', PARTIAL_NUMBER_PAGE_SIZE)), PARTIAL_NUMBER_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return Response({"error": "limit must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    results = partial_number_matches(digits, suffix=bool(suffix), limit=limit)
+    logger.info("Partial number search for '%s': %s results found.", prefix or suffix, len(results))
+
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def bulk_lookup(request):
+    phone_numbers = request.data.get("phone_numbers", None)
+
+    if not isinstance(phone_numbers, list) or not phone_numbers:
+        logger.warning("Phone numbers list missing.")
+        return Response({"error": "phone_numbers must be a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(phone_numbers) > BULK_LOOKUP_MAX_NUMBERS:
+        logger.warning("Bulk lookup of %s numbers rejected.", len(phone_numbers))
+        return Response(
+            {"error": f"At most {BULK_LOOKUP_MAX_NUMBERS} phone numbers can be looked up at once."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    keys = {phone_number: phone_key(phone_number) for phone_number in map(str, phone_numbers)}
+    wanted = {key for key in keys.values() if key is not None}
+
+    # Four IN queries answer the whole batch: users, contact names, spam counts, and
+    # which of the numbers the caller has saved (for email visibility).
+    users = {
+        user["phone_key"]: user
+        for user in CustomUser.objects.filter(phone_key__in=wanted).values("phone_key", "name", "email")
+    }
+    contact_names = {}
+    for key, name in (
+        Contact.objects.filter(phone_key__in=wanted - users.keys())
+        .order_by("phone_key", "id")
+        .values_list("phone_key", "name")
+    ):
+        contact_names.setdefault(key, name)
+    spam_stats = get_spam_stats_many(wanted)
+    saved = set(
+        Contact.objects.filter(user=request.user, phone_key__in=users.keys()).values_list("phone_key", flat=True)
+    )
+
+    results = []
+    for phone_number, key in keys.items():
+        if key is None:
+            results.append({"phone_number": phone_number, "error": "Invalid phone number."})
+            continue
+        user = users.get(key)
+        results.append({
+            "phone_number": phone_number,
+            "name": user["name"] if user else contact_names.get(key),
+            "is_registered": user is not None,
+            **spam_fields(spam_stats.get(key, NO_SPAM)),
+            "email": user["email"] if user and key in saved else None,
+        })
+
+    logger.info("Bulk lookup resolved %s phone numbers.", len(results))
+
+    return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sync_contact_book(request):
+    mode = request.data.get("mode", None)
+    contacts = request.data.get("contacts", None)
+    deleted = request.data.get("deleted", [])
+
+    if mode not in ("full", "delta"):
+        return Response({"error": "mode must be 'full' or 'delta'."}, status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(contacts, list) or not isinstance(deleted, list):
+        return Response({"error": "contacts and deleted must be lists."}, status=status.HTTP_400_BAD_REQUEST)
+    if mode == "full" and deleted:
+        return Response({"error": "deleted is only accepted in delta mode."}, status=status.HTTP_400_BAD_REQUEST)
+    if mode == "full" and not contacts and request.data.get("clear") is not True:
+        # An empty full sync deletes the whole book; make sure the client means it.
+        return Response(
+            {"error": "An empty full sync deletes every contact; pass \"clear\": true to do that."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(contacts) + len(deleted) > CONTACT_SYNC_MAX_ENTRIES:
+        logger.warning("Contact sync of %s entries rejected.", len(contacts))
+        return Response(
+            {"error": f"At most {CONTACT_SYNC_MAX_ENTRIES} contacts can be synced at once."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    entries = []
+    for contact in contacts:
+        if not isinstance(contact, dict) or not contact.get("name") or not contact.get("phone_number"):
+            return Response(
+                {"error": "Every contact needs a name and a phone_number."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        name, phone_number = str(contact["name"]), str(contact["phone_number"])
+        if len(name) > Contact._meta.get_field("name").max_length or len(phone_number) > Contact._meta.get_field("phone_number").max_length:
+            return Response({"error": f"Contact {name!r} is too long."}, status=status.HTTP_400_BAD_REQUEST)
+        entries.append((name, phone_number))
+
+    result = sync_contacts(request.user, entries, deleted=map(str, deleted), replace=mode == "full")
+    record_write(request.user.pk)
+    changed_keys = result.pop("changed_keys")
+    if changed_keys:
+        changed = [contacts_key(key) for key in changed_keys]
+        transaction.on_commit(lambda: lookup_cache.delete(*changed))
+        transaction.on_commit(lambda: identity_refresher.mark(changed_keys))
+
+    logger.info(
+        "Contact sync for user %s: %s created, %s updated, %s deleted.",
+        request.user.phone_number, result["created"], result["updated"], result["deleted"],
+    )
+
+    return Response(result, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def lookup_cache_stats(request):
+    return Response(lookup_cache.stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def spam_filter_stats(request):
+    return Response(spam_filter.stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def spam_report_buffer_stats(request):
+    return Response(report_buffer.stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_stats(request):
+    return Response(registry.snapshot(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminOrMetricsScraper])
+def prometheus_metrics(request):
+    return HttpResponse(registry.prometheus(), content_type="text/plain; version=0.0.4")
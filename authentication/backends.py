@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+
+class TokenUserCache:
+    """
+    Bounded LRU mapping an access token's jti to its user until the token expires.
+
+    Each entry remembers the user's version in a shared cache alias; invalidate_user()
+    bumps the version, so every worker sharing that alias drops its entries for the user on
+    their next use. That costs one shared cache read per authenticated request, which is
+    what makes a deactivated user's tokens stop working everywhere at once.
+    """
+
+    def __init__(self, max_entries=10000, cache_alias="default"):
+        self.max_entries = max_entries
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def _version_key(self, user_id):
+        return f"token-user-version:{user_id}"
+
+    def version(self, user_id):
+        """The user's current version; read it before loading the user that set() stores."""
+        return self.shared.get(self._version_key(user_id), 0)
+
+    async def aversion(self, user_id):
+        return await self.shared.aget(self._version_key(user_id), 0)
+
+    def _get_local(self, jti):
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is None:
+                return None
+            expires_at, user, version = entry
+            if expires_at <= time.time():
+                del self._entries[jti]
+                return None
+            self._entries.move_to_end(jti)
+            return user, version
+
+    def _check(self, jti, entry, current):
+        if entry is None:
+            return None
+        user, version = entry
+        if version != current:
+            with self._lock:
+                self._entries.pop(jti, None)
+            return None
+        return user
+
+    def get(self, jti):
+        entry = self._get_local(jti)
+        return self._check(jti, entry, self.version(entry[0].pk) if entry else None)
+
+    async def aget(self, jti):
+        entry = self._get_local(jti)
+        return self._check(jti, entry, await self.aversion(entry[0].pk) if entry else None)
+
+    def set(self, jti, user, expires_at, version):
+        with self._lock:
+            self._entries[jti] = (expires_at, user, version)
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        # Versions only need to outlive the access tokens whose entries they guard.
+        timeout = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+        self.shared.set(self._version_key(user_id), time.time_ns(), timeout)
+        with self._lock:
+            for jti in [jti for jti, (_, user, _) in self._entries.items() if user.pk == user_id]:
+                del self._entries[jti]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_user_cache = TokenUserCache(**{
+    key.lower(): value for key, value in getattr(settings, "JWT_USER_CACHE", {}).items()
+})
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that remembers the user behind each access token, so repeated
+    requests with the same token skip the user query until the token expires.
+    """
+
+    def get_user(self, validated_token):
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is None:
+            return super().get_user(validated_token)
+
+        user = token_user_cache.get(jti)
+        if user is None:
+            version = token_user_cache.version(validated_token.get(api_settings.USER_ID_CLAIM))
+            user = super().get_user(validated_token)
+            token_user_cache.set(jti, user, validated_token["exp"], version)
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for async views. Token validation is CPU only, so the only thing
+        that leaves the event loop is the user query on a token cache miss.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        user = await token_user_cache.aget(jti) if jti is not None else None
+        if user is None:
+            user = await sync_to_async(self.get_user)(validated_token)
+        return user, validated_token
@@ -0,0 +1,97 @@
+from django.db import DEFAULT_DB_ALIAS, transaction
+from .models import Contact, NameTrigram
+from .phone import match_keys, phone_key
+from .search import index_names
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def sync_contacts(user, entries, deleted=(), replace=True, using=None, batch_size=500):
+    """
+    Bring user's address book in line with entries, a list of (name, phone_number) pairs.
+
+    Contacts are matched on the canonical phone key, so each number is stored once per
+    user. With replace=True entries is the whole book and stored numbers missing from it
+    are deleted; otherwise entries is a delta and only the numbers in deleted are removed.
+    Stored contacts without a phone key (numbers saved before they were validated) cannot
+    be matched against an upload and are left as they are.
+    Returns a dict with the created, updated and deleted counts, the phone keys that
+    changed, and the phone numbers that could not be parsed.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    wanted, invalid = {}, []
+    for name, phone_number in entries:
+        key = phone_key(phone_number)
+        if key is None:
+            invalid.append(phone_number)
+        else:
+            wanted[key] = (name, phone_number)
+    delete_keys = set()
+    for phone_number in deleted:
+        key = phone_key(phone_number)
+        if key is None:
+            invalid.append(phone_number)
+        else:
+            delete_keys.add(key)
+
+    with transaction.atomic(using=using):
+        stored = {}
+        to_delete = []
+        existing = (
+            Contact.objects.using(using).select_for_update()
+            .filter(user=user).order_by("id").only("id", "name", "phone_number", "phone_key")
+        )
+        for contact in existing:
+            if contact.phone_key is None:
+                continue
+            if contact.phone_key in stored or contact.phone_key in delete_keys:
+                to_delete.append(contact)
+            elif replace and contact.phone_key not in wanted:
+                to_delete.append(contact)
+            else:
+                stored[contact.phone_key] = contact
+
+        to_create, to_update = [], []
+        for key, (name, phone_number) in wanted.items():
+            contact = stored.get(key)
+            if contact is None:
+                to_create.append(
+                    Contact(user=user, name=name, phone_number=phone_number, phone_key=key, **match_keys(key))
+                )
+            elif (contact.name, contact.phone_number) != (name, phone_number):
+                contact.name, contact.phone_number = name, phone_number
+                to_update.append(contact)
+
+        Contact.objects.using(using).bulk_create(to_create, batch_size=batch_size)
+        Contact.objects.using(using).bulk_update(to_update, ["name", "phone_number"], batch_size=batch_size)
+        delete_ids = [contact.pk for contact in to_delete]
+        for chunk in _chunks(delete_ids, batch_size):
+            # A regular delete, so the post_delete receivers drop the name postings and
+            # lookups of each number like any other contact deletion.
+            Contact.objects.using(using).filter(pk__in=chunk).delete()
+
+        index_names(
+            NameTrigram.CONTACT,
+            [(contact.pk, contact.name) for contact in to_create],
+            using=using,
+            batch_size=batch_size,
+            replace=False,
+        )
+        index_names(
+            NameTrigram.CONTACT,
+            [(contact.pk, contact.name) for contact in to_update],
+            using=using,
+            batch_size=batch_size,
+        )
+
+    changed = {contact.phone_key for contact in to_create + to_update + to_delete}
+    return {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "changed_keys": changed,
+        "invalid": invalid,
+    }
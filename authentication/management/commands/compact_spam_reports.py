@@ -0,0 +1,33 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from authentication.retention import compact_reports
+
+RETENTION = getattr(settings, 'SPAM_REPORT_RETENTION', {})
+
+class Command(BaseCommand):
+    help = 'Roll spam reports older than the retention window into monthly summaries and delete them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=RETENTION.get('DAYS', 365), help='Reports younger than this are kept')
+        parser.add_argument('--batch-size', type=int, default=RETENTION.get('BATCH_SIZE', 5000), help='Reports compacted per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be compacted')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        report = compact_reports(before, batch_size=options['batch_size'], dry_run=options['dry_run'])
+
+        for month, reports in sorted(report['months'].items()):
+            self.stdout.write(f'{month:%Y-%m}: {reports} reports')
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'{report["reports"]} reports created before {before:%Y-%m-%d} would be rolled into at most '
+                f'{report["created"]} monthly summaries; {report["orphans"]} reports without a phone key would be deleted.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {report["reports"]} reports created before {before:%Y-%m-%d}: '
+            f'{report["created"]} summaries created, {report["updated"]} updated, '
+            f'{report["orphans"]} reports without a phone key deleted.'
+        ))
@@ -1,65 +1,166 @@
 import random
+from multiprocessing import get_context
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
 from faker import Faker
-from authentication.models import CustomUser, Contact, SpamReport  #
-from rest_framework_simplejwt.tokens import RefreshToken
+from authentication.models import CustomUser, Contact, SpamReport
+from authentication.phone import match_keys, phone_key
+from authentication.tokens import RefreshToken
 
-class Command(BaseCommand):
-    help = 'Populate the database with fake data for CustomUser, Contact, and SpamReport models, and generate tokens for users'
-
-    def handle(self, *args, **kwargs):
-        fake = Faker()
-        self.stdout.write(self.style.SUCCESS('Populating CustomUsers...'))
-        
-        for _ in range(25):  
-            name = fake.name()
-            phone_number = fake.phone_number()
-            email = fake.email()
-            
-            while len(phone_number) != 10 or not phone_number[0] in '789':
-                phone_number = fake.phone_number()
-
-            while CustomUser.objects.filter(phone_number=phone_number).exists():
-                phone_number = fake.phone_number()
-            
-            password = 'password123'
-            
-            user = CustomUser.objects.create_user(
-                name=name,
-                phone_number=phone_number,
-                email=email,
-                password=password,  
-                is_active=True,
-                is_staff=False
+# Multiplier coprime with 10**9, so i -> (i * STRIDE + offset) % 10**9 never repeats.
+NUMBER_SPACE = 10 ** 9
+STRIDE = 387_420_489
+
+
+def user_phone_number(index, offset):
+    """The index-th generated user number: unique for every index below 3 * 10**9."""
+    prefix, slot = divmod(index, NUMBER_SPACE)
+    return f"{'789'[prefix]}{(slot * STRIDE + offset) % NUMBER_SPACE:09d}"
+
+
+def random_phone_number(rng):
+    return f"{rng.choice('6789')}{rng.randrange(NUMBER_SPACE):09d}"
+
+
+def populate_partition(options, start, stop, log=None):
+    """Create users start..stop-1 with their contacts and spam reports. Returns row counts."""
+    seed = options['seed']
+    rng = random.Random(f"{seed}:{start}")
+    fake = Faker()
+    fake.seed_instance(f"{seed}:{start}")
+    # Faker is slow per call, so draw names from fixed pools instead.
+    first_names = [fake.first_name() for _ in range(500)]
+    last_names = [fake.last_name() for _ in range(500)]
+    offset = random.Random(seed).randrange(NUMBER_SPACE)
+    password = make_password(options['password'])
+    batch_size = options['batch_size']
+    counts = {'users': 0, 'contacts': 0, 'reports': 0}
+
+    for chunk_start in range(start, stop, batch_size):
+        chunk = range(chunk_start, min(chunk_start + batch_size, stop))
+        numbers = [user_phone_number(index, offset) for index in chunk]
+        # One query per chunk skips numbers left over from an earlier run.
+        taken = set(
+            CustomUser.objects.filter(phone_key__in=[phone_key(number) for number in numbers])
+            .values_list('phone_number', flat=True)
+        )
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create(
+                [
+                    CustomUser(
+                        name=f"{first} {last}",
+                        phone_number=number,
+                        phone_key=phone_key(number),
+                        **match_keys(phone_key(number)),
+                        email=f"{first}.{last}.{number[-4:]}@example.com".lower() if rng.random() < 0.7 else None,
+                        password=password,
+                    )
+                    for number, first, last in (
+                        (number, rng.choice(first_names), rng.choice(last_names))
+                        for number in numbers
+                        if number not in taken
+                    )
+                ],
+                batch_size=batch_size,
             )
-            
+
+            contacts, reports = [], []
+            for user in users:
+                for _ in range(rng.randint(options['min_contacts'], options['max_contacts'])):
+                    # Half of the contacts point at other generated users so lookups find them.
+                    if rng.random() < 0.5:
+                        number = user_phone_number(rng.randrange(options['users']), offset)
+                    else:
+                        number = random_phone_number(rng)
+                    name = f"{rng.choice(first_names)} {rng.choice(last_names)}"
+                    key = phone_key(number)
+                    contacts.append(Contact(user=user, name=name, phone_number=number, phone_key=key, **match_keys(key)))
+
+                reported = set()
+                for _ in range(rng.randint(0, options['max_reports'])):
+                    # Draw from a small pool so some numbers collect many reports.
+                    number = f"9{rng.randrange(options['spam_pool']):09d}"
+                    if number not in reported:
+                        reported.add(number)
+                        reports.append(SpamReport(reported_by=user, phone_number=number, phone_key=phone_key(number)))
+
+            Contact.objects.bulk_create(contacts, batch_size=batch_size)
+            SpamReport.objects.bulk_create(reports, batch_size=batch_size, ignore_conflicts=True)
+
+        counts['users'] += len(users)
+        counts['contacts'] += len(contacts)
+        counts['reports'] += len(reports)
+        if log:
+            log(f"Users {chunk.stop - start}/{stop - start}: {counts['contacts']} contacts, {counts['reports']} spam reports")
+    return counts
+
+
+def _populate_worker(args):
+    options, start, stop = args
+    connections.close_all()
+    try:
+        return populate_partition(options, start, stop)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Populate the database with deterministic fake users, contacts and spam reports for development and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=25, help='Number of users to create')
+        parser.add_argument('--min-contacts', type=int, default=1, help='Fewest contacts per user')
+        parser.add_argument('--max-contacts', type=int, default=10, help='Most contacts per user')
+        parser.add_argument('--max-reports', type=int, default=15, help='Most spam reports per user')
+        parser.add_argument('--spam-pool', type=int, default=100000, help='How many distinct numbers spam reports are drawn from')
+        parser.add_argument('--seed', type=int, default=0, help='Seed that makes the dataset reproducible')
+        parser.add_argument('--password', default='password123', help='Password shared by every generated user')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Users written per transaction')
+        parser.add_argument('--workers', type=int, default=1, help='Processes writing disjoint user ranges in parallel (not on SQLite)')
+        parser.add_argument('--tokens', type=int, default=0, help='Print access and refresh tokens for this many users')
+
+    def handle(self, *args, **options):
+        total = options['users']
+        if total > 3 * NUMBER_SPACE:
+            self.stderr.write(self.style.ERROR('At most 3,000,000,000 users can be generated.'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Populating {total} users with seed {options['seed']}..."))
+        workers = max(1, min(options['workers'], total))
+        if workers > 1 and connections['default'].vendor == 'sqlite':
+            # SQLite allows one writer at a time, so parallel partitions fail with "database is locked".
+            self.stderr.write(self.style.WARNING('SQLite cannot take parallel writers; ignoring --workers and writing serially.'))
+            workers = 1
+        if workers == 1:
+            counts = populate_partition(options, 0, total, log=self.stdout.write)
+        else:
+            # Each partition is seeded by its start index, so the output does not depend on scheduling.
+            step = -(-total // workers)
+            partitions = [(options, start, min(start + step, total)) for start in range(0, total, step)]
+            connections.close_all()
+            counts = {'users': 0, 'contacts': 0, 'reports': 0}
+            with get_context('fork').Pool(workers) as pool:
+                for done, partition_counts in enumerate(pool.imap_unordered(_populate_worker, partitions), 1):
+                    for name, count in partition_counts.items():
+                        counts[name] += count
+                    self.stdout.write(f"Partitions {done}/{len(partitions)}: {counts['users']} users")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {counts['users']} users, {counts['contacts']} contacts and {counts['reports']} spam reports."
+        ))
+
+        # Bulk inserts skip the save hooks, so rebuild the derived tables in one pass each.
+        call_command('rebuild_spam_aggregates', stdout=self.stdout)
+        call_command('rebuild_name_index', stdout=self.stdout)
+        call_command('rebuild_number_identities', stdout=self.stdout)
+        call_command('rebuild_spam_filter', stdout=self.stdout)
+
+        for user in CustomUser.objects.order_by('id')[:options['tokens']]:
             refresh = RefreshToken.for_user(user)
-            access_token = refresh.access_token
-            refresh_token = str(refresh)
-            
-            self.stdout.write(self.style.SUCCESS(f'Created user: {name} with phone number: {phone_number}'))
-            self.stdout.write(self.style.SUCCESS(f'Access token: {access_token}'))
-            self.stdout.write(self.style.SUCCESS(f'Refresh token: {refresh_token}'))
-            
-            self.stdout.write(self.style.SUCCESS(f'Populating Contacts for {name}...'))
-            for _ in range(random.randint(1, 10)):  
-                contact_name = fake.name()
-                contact_phone = fake.phone_number()
-                Contact.objects.create(
-                    user=user,
-                    name=contact_name,
-                    phone_number=contact_phone
-                )
-                self.stdout.write(self.style.SUCCESS(f'Created contact: {contact_name} with phone number: {contact_phone}'))
-            
-            
-            self.stdout.write(self.style.SUCCESS(f'Populating SpamReports for {name}...'))
-            for _ in range(random.randint(0, 15)):  
-                spam_phone = fake.phone_number()
-                SpamReport.objects.create(
-                    reported_by=user,
-                    phone_number=spam_phone
-                )
-                self.stdout.write(self.style.SUCCESS(f'Created spam report for: {spam_phone}'))
-        
+            self.stdout.write(self.style.SUCCESS(f'User {user.name} ({user.phone_number})'))
+            self.stdout.write(f'Access token: {refresh.access_token}')
+            self.stdout.write(f'Refresh token: {refresh}')
+
         self.stdout.write(self.style.SUCCESS('Fake data population complete!'))
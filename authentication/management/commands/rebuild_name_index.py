@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from authentication.search import rebuild_name_index, uses_database_trigrams
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram name search index for users and contacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Names per bulk insert')
+
+    def handle(self, *args, **options):
+        if uses_database_trigrams():
+            self.stdout.write(self.style.SUCCESS('PostgreSQL serves name search from its pg_trgm index; nothing to rebuild.'))
+            return
+        self.stdout.write(self.style.SUCCESS('Rebuilding name search index...'))
+        count = rebuild_name_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} names.'))
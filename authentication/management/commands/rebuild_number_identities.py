@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from authentication.models import NumberIdentity
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the crowd-sourced name of every number from all users\' contacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding number identities...'))
+        started = time.perf_counter()
+        count = NumberIdentity.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} number identities in {time.perf_counter() - started:.1f}s.'))
@@ -0,0 +1,16 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from authentication.models import SpamAggregate
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-number SpamAggregate table from SpamReport rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Rebuilding spam aggregates...'))
+        count = SpamAggregate.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} spam aggregate rows.'))
+        # Scores live on the aggregate rows, so the rebuild reset them.
+        call_command('recompute_spam_scores', batch_size=options['batch_size'], stdout=self.stdout)
@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand
+from authentication.scoring import recompute_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute every reporter reputation and decayed spam score from SpamReport rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk write')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Recomputing spam scores...'))
+        started = time.perf_counter()
+        numbers, reporters = recompute_scores(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {numbers} numbers from {reporters} reporters in {time.perf_counter() - started:.1f}s.'
+        ))
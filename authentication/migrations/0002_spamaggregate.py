@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:22
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def backfill_spam_aggregates(apps, schema_editor):
+    SpamReport = apps.get_model('authentication', 'SpamReport')
+    SpamAggregate = apps.get_model('authentication', 'SpamAggregate')
+    rows = (
+        SpamReport.objects.values('phone_number')
+        .annotate(
+            report_count=Count('id'),
+            reporter_count=Count('reported_by', distinct=True),
+            first_reported_at=Min('created_at'),
+            last_reported_at=Max('created_at'),
+        )
+        .order_by()
+    )
+    SpamAggregate.objects.bulk_create(
+        (SpamAggregate(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpamAggregate',
+            fields=[
+                ('phone_number', models.CharField(max_length=15, primary_key=True, serialize=False)),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('reporter_count', models.PositiveIntegerField(default=0)),
+                ('first_reported_at', models.DateTimeField()),
+                ('last_reported_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(backfill_spam_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:24
+
+from django.db import migrations, models
+
+TRIGRAM_INDEXES = (
+    ('authentication_customuser', 'customuser_name_trgm_idx'),
+    ('authentication_contact', 'contact_name_trgm_idx'),
+)
+
+
+def build_name_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        # icontains compiles to UPPER(name) LIKE UPPER(%s), so index that expression.
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for table, index in TRIGRAM_INDEXES:
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin (UPPER(name) gin_trgm_ops)'
+                )
+        return
+
+    NameTrigram = apps.get_model('authentication', 'NameTrigram')
+    sources = (
+        (0, apps.get_model('authentication', 'CustomUser')),
+        (1, apps.get_model('authentication', 'Contact')),
+    )
+    for source, model in sources:
+        batch = []
+        for object_id, name in model.objects.values_list('id', 'name').order_by().iterator(chunk_size=1000):
+            text = name.lower()
+            batch.extend(
+                NameTrigram(trigram=gram, source=source, object_id=object_id)
+                for gram in {text[i:i + 3] for i in range(len(text) - 2)}
+            )
+            if len(batch) >= 1000:
+                NameTrigram.objects.bulk_create(batch, batch_size=1000)
+                batch = []
+        NameTrigram.objects.bulk_create(batch, batch_size=1000)
+
+
+def drop_name_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for _, index in TRIGRAM_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_spamaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('source', models.PositiveSmallIntegerField(choices=[(0, 'User'), (1, 'Contact')])),
+                ('object_id', models.BigIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'source', 'object_id'], name='nametrigram_lookup_idx'), models.Index(fields=['source', 'object_id'], name='nametrigram_object_idx')],
+            },
+        ),
+        migrations.RunPython(build_name_index, drop_name_index),
+    ]
@@ -0,0 +1,127 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:02
+
+from django.db import migrations, models
+import re
+from django.conf import settings
+from django.db.models import Count, Max, Min
+
+
+# A frozen copy of authentication.phone.phone_key as it stood when the keys were first
+# backfilled, so later changes to the live normaliser don't change what this migration
+# writes.
+_EXTENSION_RE = re.compile(r"\s*(?:x|ext\.?|extension)\s*\d*$", re.IGNORECASE)
+_NON_DIGIT_RE = re.compile(r"[^0-9]")
+
+
+def phone_key(value):
+    if value is None:
+        return None
+    value = _EXTENSION_RE.sub("", str(value).strip())
+    digits = _NON_DIGIT_RE.sub("", value)
+    if not digits:
+        return None
+    country_code = str(getattr(settings, "PHONE_DEFAULT_COUNTRY_CODE", "91"))
+    if value.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == 10:
+        digits = country_code + digits
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = country_code + digits[1:]
+    digits = digits.lstrip("0")
+    if not digits or len(digits) > 15:
+        return None
+    return int(digits)
+
+
+def backfill_phone_keys(apps, schema_editor):
+    for model_name in ('CustomUser', 'Contact', 'SpamReport'):
+        model = apps.get_model('authentication', model_name)
+        batch = []
+        for row in model.objects.only('id', 'phone_number').order_by().iterator(chunk_size=1000):
+            row.phone_key = phone_key(row.phone_number)
+            batch.append(row)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['phone_key'])
+                batch = []
+        model.objects.bulk_update(batch, ['phone_key'])
+
+
+def rebuild_spam_aggregates(apps, schema_editor):
+    SpamReport = apps.get_model('authentication', 'SpamReport')
+    SpamAggregate = apps.get_model('authentication', 'SpamAggregate')
+    rows = (
+        SpamReport.objects.filter(phone_key__isnull=False)
+        .values('phone_key')
+        .annotate(
+            report_count=Count('id'),
+            reporter_count=Count('reported_by', distinct=True),
+            first_reported_at=Min('created_at'),
+            last_reported_at=Max('created_at'),
+        )
+        .order_by()
+    )
+    SpamAggregate.objects.bulk_create(
+        (SpamAggregate(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0003_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='phone_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='phone_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='spamreport',
+            name='phone_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_phone_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customuser',
+            name='phone_key',
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['phone_key'], name='contact_phone_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user', 'phone_key'], name='contact_user_phone_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spamreport',
+            index=models.Index(fields=['phone_key', 'reported_by'], name='spamreport_phone_key_idx'),
+        ),
+        # Aggregates were keyed by the raw string; re-key them by the canonical number so
+        # reports filed under different spellings of one number land in the same row.
+        migrations.DeleteModel(
+            name='SpamAggregate',
+        ),
+        migrations.CreateModel(
+            name='SpamAggregate',
+            fields=[
+                ('phone_key', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('reporter_count', models.PositiveIntegerField(default=0)),
+                ('first_reported_at', models.DateTimeField()),
+                ('last_reported_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(rebuild_spam_aggregates, migrations.RunPython.noop),
+    ]
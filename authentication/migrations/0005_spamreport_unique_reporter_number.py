@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:10
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min
+
+
+def drop_duplicate_reports(apps, schema_editor):
+    SpamReport = apps.get_model('authentication', 'SpamReport')
+    keep = (
+        SpamReport.objects.filter(phone_key__isnull=False)
+        .values('phone_key', 'reported_by')
+        .annotate(first_id=Min('id'))
+        .values('first_id')
+    )
+    SpamReport.objects.filter(phone_key__isnull=False).exclude(id__in=keep).delete()
+
+
+def rebuild_spam_aggregates(apps, schema_editor):
+    SpamReport = apps.get_model('authentication', 'SpamReport')
+    SpamAggregate = apps.get_model('authentication', 'SpamAggregate')
+    rows = (
+        SpamReport.objects.filter(phone_key__isnull=False)
+        .values('phone_key')
+        .annotate(
+            report_count=Count('id'),
+            reporter_count=Count('reported_by', distinct=True),
+            first_reported_at=Min('created_at'),
+            last_reported_at=Max('created_at'),
+        )
+        .order_by()
+    )
+    SpamAggregate.objects.all().delete()
+    SpamAggregate.objects.bulk_create(
+        (SpamAggregate(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_phone_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_reports, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='spamreport',
+            name='spamreport_phone_key_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='spamreport',
+            constraint=models.UniqueConstraint(fields=('phone_key', 'reported_by'), name='spamreport_unique_reporter_number'),
+        ),
+        migrations.RunPython(rebuild_spam_aggregates, migrations.RunPython.noop),
+    ]
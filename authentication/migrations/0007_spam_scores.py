@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0006_contact_phone_key_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReporterReputation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reputation', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('reputation', models.FloatField()),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('agreed_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='spamaggregate',
+            name='score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='spamaggregate',
+            name='scored_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
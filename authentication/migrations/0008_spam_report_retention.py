@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0007_spam_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpamReportSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_key', models.BigIntegerField()),
+                ('month', models.DateField()),
+                ('report_count', models.PositiveIntegerField()),
+                ('first_reported_at', models.DateTimeField()),
+                ('last_reported_at', models.DateTimeField()),
+                ('weight', models.FloatField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='spamreport',
+            index=models.Index(fields=['created_at'], name='spamreport_created_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='spamreportsummary',
+            constraint=models.UniqueConstraint(fields=('phone_key', 'month'), name='spamreportsummary_unique_number_month'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:11
+
+from django.db import migrations, models
+from authentication.phone import match_keys
+
+
+def backfill_match_keys(apps, schema_editor):
+    for model_name in ('CustomUser', 'Contact', 'SpamAggregate'):
+        model = apps.get_model('authentication', model_name)
+        batch = []
+        rows = model.objects.filter(phone_key__isnull=False).only('pk', 'phone_key').order_by()
+        for row in rows.iterator(chunk_size=1000):
+            for field, value in match_keys(row.phone_key).items():
+                setattr(row, field, value)
+            batch.append(row)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['phone_prefix_key', 'phone_suffix_key'])
+                batch = []
+        model.objects.bulk_update(batch, ['phone_prefix_key', 'phone_suffix_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0008_spam_report_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contact',
+            name='phone_prefix_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='phone_suffix_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='phone_prefix_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='phone_suffix_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='spamaggregate',
+            name='phone_prefix_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='spamaggregate',
+            name='phone_suffix_key',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_match_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['phone_prefix_key', 'id'], name='contact_phone_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['phone_suffix_key', 'id'], name='contact_phone_suffix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['phone_prefix_key'], name='customuser_phone_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['phone_suffix_key'], name='customuser_phone_suffix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spamaggregate',
+            index=models.Index(fields=['phone_prefix_key'], name='spamaggregate_phone_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spamaggregate',
+            index=models.Index(fields=['phone_suffix_key'], name='spamaggregate_phone_suffix_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0009_phone_match_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberIdentity',
+            fields=[
+                ('phone_key', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('votes', models.PositiveIntegerField()),
+                ('total_votes', models.PositiveIntegerField()),
+                ('alternates', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+import math
+from django.db import migrations
+from django.utils import timezone
+from authentication.scoring import SECONDS_PER_DAY, month_start, spam_scorer
+
+
+def backfill_scores(apps, schema_editor):
+    """
+    Score the aggregates that were reported before scores existed, which 0007 left at
+    score 0 with no scored_at. Reporters are weighted by account age alone, as they are
+    before recompute_spam_scores has computed their reputations.
+    """
+    SpamAggregate = apps.get_model('authentication', 'SpamAggregate')
+    SpamReport = apps.get_model('authentication', 'SpamReport')
+    SpamReportSummary = apps.get_model('authentication', 'SpamReportSummary')
+    now = timezone.now()
+
+    def weight(moment):
+        return math.exp(-spam_scorer.decay_rate * (now - moment).total_seconds())
+
+    keys = list(
+        SpamAggregate.objects.filter(scored_at__isnull=True, report_count__gt=0).values_list('pk', flat=True)
+    )
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        scores = dict.fromkeys(batch, 0.0)
+        reports = SpamReport.objects.filter(phone_key__in=batch).values_list(
+            'phone_key', 'created_at', 'reported_by__date_joined'
+        )
+        for key, created_at, date_joined in reports:
+            age_days = (now - date_joined).total_seconds() / SECONDS_PER_DAY
+            scores[key] += float(spam_scorer.reputation(age_days, 0, 0)) * weight(created_at)
+        summaries = SpamReportSummary.objects.filter(phone_key__in=batch).values_list('phone_key', 'month', 'weight')
+        for key, month, summary_weight in summaries:
+            scores[key] += summary_weight * weight(month_start(month))
+        aggregates = list(SpamAggregate.objects.filter(pk__in=batch))
+        for aggregate in aggregates:
+            aggregate.score = round(scores[aggregate.pk], 4)
+            aggregate.scored_at = now
+        SpamAggregate.objects.bulk_update(aggregates, ['score', 'scored_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0010_number_identity'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
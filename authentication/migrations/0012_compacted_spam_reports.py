@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0011_backfill_spam_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactedSpamReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone_key', models.BigIntegerField()),
+                ('reported_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('phone_key', 'reported_by'), name='compactedspamreport_unique_reporter_number')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0012_compacted_spam_reports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='compactedspamreport',
+            name='month',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='compactedspamreport',
+            name='weight',
+            field=models.FloatField(default=0.0),
+        ),
+    ]
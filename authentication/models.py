@@ -1,8 +1,15 @@
 import re
+from collections import Counter, defaultdict
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Max, Min, Sum, Value, When
 from django.core.validators import EmailValidator
+from django.utils import timezone
+from .phone import format_phone_key, match_keys
 
 
 class CustomUserManager(BaseUserManager):
@@ -55,6 +62,10 @@ class CustomUserManager(BaseUserManager):
 class CustomUser(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=13, unique=True)
+    phone_key = models.BigIntegerField(unique=True, null=True, editable=False)
+    # Sort keys of the number's digits and of its reversed digits; see phone.match_keys().
+    phone_prefix_key = models.BigIntegerField(null=True, editable=False)
+    phone_suffix_key = models.BigIntegerField(null=True, editable=False)
     email = models.EmailField(blank=True, null=True)
     
     is_active = models.BooleanField(default=True)
@@ -66,6 +77,12 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = "phone_number"
     REQUIRED_FIELDS = ["name"]
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["phone_prefix_key"], name="customuser_phone_prefix_idx"),
+            models.Index(fields=["phone_suffix_key"], name="customuser_phone_suffix_idx"),
+        ]
+
     def __str__(self):
         return self.phone_number
 
@@ -74,6 +91,17 @@ class Contact(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="contacts")
     name = models.CharField(max_length=100)
     phone_number = models.CharField(max_length=15)
+    phone_key = models.BigIntegerField(null=True, editable=False)
+    phone_prefix_key = models.BigIntegerField(null=True, editable=False)
+    phone_suffix_key = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["phone_key", "id"], name="contact_phone_key_id_idx"),
+            models.Index(fields=["user", "phone_key"], name="contact_user_phone_key_idx"),
+            models.Index(fields=["phone_prefix_key", "id"], name="contact_phone_prefix_idx"),
+            models.Index(fields=["phone_suffix_key", "id"], name="contact_phone_suffix_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.phone_number})"
@@ -82,7 +110,329 @@ class Contact(models.Model):
 class SpamReport(models.Model):
     reported_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     phone_number = models.CharField(max_length=15)
+    phone_key = models.BigIntegerField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            # One report per reporter and number; its index also serves lookups by number.
+            models.UniqueConstraint(fields=["phone_key", "reported_by"], name="spamreport_unique_reporter_number"),
+        ]
+        indexes = [
+            # Lets compaction find the oldest reports without scanning the table.
+            models.Index(fields=["created_at"], name="spamreport_created_at_idx"),
+        ]
+
     def __str__(self):
         return f"Spam report for {self.phone_number} by {self.reported_by}"
+
+
+class SpamReportSummary(models.Model):
+    """Reports older than the retention window, rolled up per number and calendar month."""
+    phone_key = models.BigIntegerField()
+    month = models.DateField()
+    report_count = models.PositiveIntegerField()
+    first_reported_at = models.DateTimeField()
+    last_reported_at = models.DateTimeField()
+    # The reporters' reputations, each scaled by exp(decay_rate * (created_at - month start))
+    # so that weight * exp(-decay_rate * (now - month start)) is the reports' decayed score.
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["phone_key", "month"], name="spamreportsummary_unique_number_month"),
+        ]
+
+    def __str__(self):
+        return f"{format_phone_key(self.phone_key)} {self.month:%Y-%m}: {self.report_count} reports"
+
+
+class CompactedSpamReport(models.Model):
+    """
+    The reporter and number of a report rolled into a SpamReportSummary. Kept after the
+    report is deleted, so the reporter cannot report the number again and the number's
+    distinct reporters can still be counted.
+    """
+    reported_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    phone_key = models.BigIntegerField()
+    # The summary month the report went into and its share of the summary's weight, so
+    # deleting the reporter takes the report back out. Null for reports compacted before
+    # these were kept, which stay in their summaries.
+    month = models.DateField(null=True)
+    weight = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["phone_key", "reported_by"], name="compactedspamreport_unique_reporter_number"),
+        ]
+
+    def __str__(self):
+        return f"Compacted spam report for {format_phone_key(self.phone_key)} by {self.reported_by}"
+
+
+class SpamAggregateManager(models.Manager):
+    def _summaries(self, reports, rolled_up, compacted_reporters):
+        """
+        Per-number totals over raw reports plus their compacted monthly summaries and the
+        reporters of those. Each side is grouped and ordered by phone_key in the database
+        and merged as a stream.
+        """
+        raw = (
+            reports.filter(phone_key__isnull=False)
+            .values("phone_key")
+            .annotate(
+                report_count=Count("id"),
+                reporter_count=Count("reported_by", distinct=True),
+                first_reported_at=Min("created_at"),
+                last_reported_at=Max("created_at"),
+            )
+            .order_by("phone_key")
+        )
+        compacted = (
+            rolled_up.values("phone_key")
+            .annotate(reports=Sum("report_count"), first=Min("first_reported_at"), last=Max("last_reported_at"))
+            .order_by("phone_key")
+        )
+        compacted_rows = (
+            {
+                "phone_key": row["phone_key"],
+                "report_count": row["reports"],
+                "reporter_count": 0,
+                "first_reported_at": row["first"],
+                "last_reported_at": row["last"],
+            }
+            for row in compacted.iterator()
+        )
+        # A reporter cannot report a number they have a compacted report of, so these
+        # reporters are distinct from the raw reports' ones.
+        reporters = (
+            {"phone_key": row["phone_key"], "report_count": 0, "reporter_count": row["reporters"]}
+            for row in compacted_reporters.values("phone_key").annotate(reporters=Count("id")).order_by("phone_key").iterator()
+        )
+        rows = merge(raw.iterator(), compacted_rows, reporters, key=itemgetter("phone_key"))
+        for key, group in groupby(rows, key=itemgetter("phone_key")):
+            group = list(group)
+            # Compacted reporters always come with their number's summaries, which carry the dates.
+            dated = [row for row in group if "first_reported_at" in row]
+            yield {
+                "phone_key": key,
+                "report_count": sum(row["report_count"] for row in group),
+                "reporter_count": sum(row["reporter_count"] for row in group),
+                "first_reported_at": min(row["first_reported_at"] for row in dated),
+                "last_reported_at": max(row["last_reported_at"] for row in dated),
+                **match_keys(key),
+            }
+
+    def refresh_numbers(self, phone_keys, batch_size=1000):
+        """
+        Recompute the aggregate rows of the given numbers from their reports in one upsert.
+        Numbers left without any report keep their row with zero counts and score.
+        """
+        phone_keys = set(phone_keys)
+        rows = [
+            self.model(**row)
+            for row in self._summaries(
+                SpamReport.objects.filter(phone_key__in=phone_keys),
+                SpamReportSummary.objects.filter(phone_key__in=phone_keys),
+                CompactedSpamReport.objects.filter(phone_key__in=phone_keys),
+            )
+        ]
+        with transaction.atomic():
+            self.filter(pk__in=phone_keys - {row.phone_key for row in rows}).exclude(report_count=0).update(
+                report_count=0, reporter_count=0, score=0.0, scored_at=timezone.now()
+            )
+            self.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["phone_key"],
+                update_fields=["report_count", "reporter_count", "first_reported_at", "last_reported_at"],
+            )
+
+    def add_new_reports(self, phone_keys, now=None, batch_size=1000):
+        """
+        Count newly stored reports into their numbers' rows without rereading any history:
+        phone_keys holds one entry per new report, each from a reporter who had not
+        reported that number before. Call inside a transaction.
+        """
+        counts = Counter(phone_keys)
+        if not counts:
+            return
+        now = now or timezone.now()
+        # Rows for first-time numbers start empty, so every number gets the same update.
+        self.bulk_create(
+            [self.model(phone_key=key, first_reported_at=now, last_reported_at=now, **match_keys(key)) for key in counts],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        by_count = defaultdict(list)
+        for key, count in counts.items():
+            by_count[count].append(key)
+        for count, keys in by_count.items():
+            self.filter(pk__in=keys).update(
+                report_count=F("report_count") + count,
+                reporter_count=F("reporter_count") + count,
+                # A number whose reports were all deleted starts its history again.
+                first_reported_at=Case(When(report_count=0, then=Value(now)), default=F("first_reported_at")),
+                last_reported_at=now,
+            )
+
+    def rebuild(self, batch_size=1000):
+        """
+        Recompute every aggregate row from SpamReport and its summaries. Returns the number
+        of rows written. Numbers left without any report keep their row with zero counts
+        and score, stamped with the rebuild time, so delta snapshots pick up the removal.
+        """
+        rows = self._summaries(
+            SpamReport.objects.all(), SpamReportSummary.objects.all(), CompactedSpamReport.objects.all()
+        )
+        with transaction.atomic():
+            # Scores are reset too; recompute_scores() fills them in again.
+            self.exclude(report_count=0, score=0).update(
+                report_count=0, reporter_count=0, score=0.0, scored_at=timezone.now()
+            )
+            created = self.bulk_create(
+                (self.model(**row) for row in rows),
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["phone_key"],
+                update_fields=["report_count", "reporter_count", "first_reported_at", "last_reported_at"],
+            )
+        return len(created)
+
+
+def normalize_name(name):
+    """The form contact names are compared in: case-folded, with runs of whitespace collapsed."""
+    return " ".join(name.casefold().split())
+
+
+class NumberIdentityManager(models.Manager):
+    def _identities(self, contacts):
+        """
+        Per-number name votes over contacts. Spellings that normalize alike pool their votes
+        and are shown in their most common spelling. Grouped by (phone_key, name) in the
+        database and streamed in phone_key order.
+        """
+        rows = (
+            contacts.filter(phone_key__isnull=False)
+            .values("phone_key", "name")
+            .annotate(votes=Count("id"))
+            .order_by("phone_key", "name")
+        )
+        for key, group in groupby(rows.iterator(), key=itemgetter("phone_key")):
+            votes, spellings = Counter(), defaultdict(Counter)
+            for row in group:
+                normalized = normalize_name(row["name"])
+                votes[normalized] += row["votes"]
+                spellings[normalized][row["name"]] += row["votes"]
+            ranked = sorted(votes.items(), key=lambda item: (-item[1], item[0]))[:self.model.ALTERNATES + 1]
+            names = [
+                {"name": spellings[normalized].most_common(1)[0][0], "votes": count}
+                for normalized, count in ranked
+            ]
+            yield {
+                "phone_key": key,
+                "name": names[0]["name"],
+                "votes": names[0]["votes"],
+                "total_votes": sum(votes.values()),
+                "alternates": names[1:],
+            }
+
+    def refresh_numbers(self, phone_keys, batch_size=1000):
+        """Recompute the identities of the given numbers from their contacts. Returns the rows written."""
+        phone_keys = set(phone_keys)
+        rows = [self.model(**row) for row in self._identities(Contact.objects.filter(phone_key__in=phone_keys))]
+        with transaction.atomic():
+            # Numbers nobody saves any more lose their identity.
+            self.filter(pk__in=phone_keys - {row.phone_key for row in rows}).delete()
+            self.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["phone_key"],
+                update_fields=["name", "votes", "total_votes", "alternates", "updated_at"],
+            )
+        return len(rows)
+
+    def rebuild(self, batch_size=1000):
+        """Recompute every identity from Contact. Returns the number of rows written."""
+        rows = self._identities(Contact.objects.all())
+        with transaction.atomic():
+            self.all().delete()
+            created = self.bulk_create((self.model(**row) for row in rows), batch_size=batch_size)
+        return len(created)
+
+
+class NumberIdentity(models.Model):
+    """The name a number is most often saved under across every user's contacts."""
+    # Runner-up names kept per number.
+    ALTERNATES = 3
+
+    phone_key = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=100)
+    votes = models.PositiveIntegerField()
+    total_votes = models.PositiveIntegerField()
+    # [{"name": ..., "votes": ...}, ...] in descending vote order.
+    alternates = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = NumberIdentityManager()
+
+    def __str__(self):
+        return f"{format_phone_key(self.phone_key)}: {self.name} ({self.votes}/{self.total_votes})"
+
+
+class SpamAggregate(models.Model):
+    phone_key = models.BigIntegerField(primary_key=True)
+    report_count = models.PositiveIntegerField(default=0)
+    reporter_count = models.PositiveIntegerField(default=0)
+    first_reported_at = models.DateTimeField()
+    last_reported_at = models.DateTimeField()
+    # Decayed, reputation-weighted sum of the reports as of scored_at; see scoring.py.
+    score = models.FloatField(default=0.0)
+    scored_at = models.DateTimeField(null=True, blank=True)
+    phone_prefix_key = models.BigIntegerField(null=True, editable=False)
+    phone_suffix_key = models.BigIntegerField(null=True, editable=False)
+
+    objects = SpamAggregateManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["phone_prefix_key"], name="spamaggregate_phone_prefix_idx"),
+            models.Index(fields=["phone_suffix_key"], name="spamaggregate_phone_suffix_idx"),
+        ]
+
+    def __str__(self):
+        return f"{format_phone_key(self.phone_key)}: {self.report_count} reports"
+
+
+class ReporterReputation(models.Model):
+    """How much a user's spam reports count, recomputed by recompute_spam_scores."""
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name="reputation")
+    reputation = models.FloatField()
+    report_count = models.PositiveIntegerField(default=0)
+    agreed_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user}: {self.reputation:.3f}"
+
+
+class NameTrigram(models.Model):
+    """Posting list entry mapping a lowercase name trigram to a user or contact row."""
+    USER = 0
+    CONTACT = 1
+    SOURCE_CHOICES = [(USER, "User"), (CONTACT, "Contact")]
+
+    trigram = models.CharField(max_length=3)
+    source = models.PositiveSmallIntegerField(choices=SOURCE_CHOICES)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["trigram", "source", "object_id"], name="nametrigram_lookup_idx"),
+            models.Index(fields=["source", "object_id"], name="nametrigram_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.trigram!r} -> {self.get_source_display()} {self.object_id}"
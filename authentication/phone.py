@@ -0,0 +1,100 @@
+import re
+from django.conf import settings
+
+# E.164 allows at most 15 digits including the country code; no real number, country
+# code included, has fewer than 7.
+MAX_E164_DIGITS = 15
+MIN_E164_DIGITS = 7
+
+_EXTENSION_RE = re.compile(r"\s*(?:x|ext\.?|extension)\s*\d*$", re.IGNORECASE)
+# ASCII only: int() rejects some characters str.isdigit() and \d accept, such as "²".
+_NON_DIGIT_RE = re.compile(r"[^0-9]")
+# What a written number may contain besides its digits: a leading "+" and separators.
+# Letters (vanity numbers such as 1-800-FLOWERS) and non-ASCII digits are refused
+# rather than silently dropped.
+_NUMBER_RE = re.compile(r"\+?[0-9 ()./-]+")
+
+
+def default_country_code():
+    return str(getattr(settings, "PHONE_DEFAULT_COUNTRY_CODE", "91"))
+
+
+def phone_key(value):
+    """
+    Canonical integer key for a phone number: its E.164 digits, so "+91-98765 43210",
+    "098765-43210" and "9876543210" all map to 919876543210. Returns None for values
+    that cannot be a phone number.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isascii() and value.isdigit():
+        digits = value
+    else:
+        value = _EXTENSION_RE.sub("", value)
+        if not _NUMBER_RE.fullmatch(value):
+            return None
+        digits = _NON_DIGIT_RE.sub("", value)
+
+    country_code = default_country_code()
+    if value.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == 10:
+        digits = country_code + digits
+    elif len(digits) == 11 and digits.startswith("0"):
+        # Drop the national trunk prefix.
+        digits = country_code + digits[1:]
+
+    digits = digits.lstrip("0")
+    if not MIN_E164_DIGITS <= len(digits) <= MAX_E164_DIGITS:
+        return None
+    return int(digits)
+
+
+def format_phone_key(key):
+    return f"+{key}"
+
+
+# Digit strings packed into integers that sort like the strings themselves: the digits
+# left-aligned to MAX_E164_DIGITS places, times 16, plus the digit count. Every number
+# whose digits start with a given prefix then falls into one integer range, which an index
+# answers with a single range scan. Packing the reversed digits turns suffixes into prefixes.
+def digits_sort_key(digits):
+    return int(digits.ljust(MAX_E164_DIGITS, "0")) * 16 + len(digits)
+
+
+def digits_prefix_range(prefix):
+    """[low, high) of the sort keys of the digit strings that start with prefix."""
+    low = digits_sort_key(prefix)
+    high = (int(prefix.ljust(MAX_E164_DIGITS, "0")) + 10 ** (MAX_E164_DIGITS - len(prefix))) * 16
+    return low, high
+
+
+def match_keys(key):
+    """The phone_prefix_key and phone_suffix_key field values of a canonical number."""
+    if key is None:
+        return {"phone_prefix_key": None, "phone_suffix_key": None}
+    digits = str(key)
+    return {"phone_prefix_key": digits_sort_key(digits), "phone_suffix_key": digits_sort_key(digits[::-1])}
+
+
+def partial_digits(value, suffix=False):
+    """
+    The digits a partial number must start (or with suffix=True, end) with in canonical
+    form. A leading "+" or "00" marks an international prefix; other prefixes are national
+    and get the default country code, like phone_key(). Returns "" for values with
+    characters a written number cannot contain.
+    """
+    value = str(value).strip()
+    if not _NUMBER_RE.fullmatch(value):
+        return ""
+    digits = _NON_DIGIT_RE.sub("", value)
+    if suffix or not digits:
+        return digits
+    if value.startswith("+"):
+        return digits.lstrip("0")
+    if digits.startswith("00"):
+        return digits[2:].lstrip("0")
+    return default_country_code() + digits.lstrip("0")
@@ -0,0 +1,125 @@
+"""
+Retention for SpamReport. Reports older than the retention window are rolled up into one
+SpamReportSummary row per number and calendar month and then deleted, so the report table
+only grows with recent activity while counts and scores keep every report. The reporter and
+number of each compacted report are kept as a CompactedSpamReport, which stops the reporter
+from reporting the number again.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import date
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from .models import CompactedSpamReport, SpamReport, SpamReportSummary
+from .scoring import month_start, reputations_of, spam_scorer
+
+
+def _empty_report():
+    return {"reports": 0, "orphans": 0, "created": 0, "updated": 0, "months": Counter()}
+
+
+def _preview(before):
+    """What compaction would do, from one grouped query instead of a pass over the reports."""
+    report = _empty_report()
+    old = SpamReport.objects.filter(created_at__lt=before)
+    report["orphans"] = old.filter(phone_key__isnull=True).count()
+    months = (
+        old.filter(phone_key__isnull=False)
+        .annotate(month=TruncMonth("created_at"))
+        .values("month")
+        .annotate(reports=Count("id"), numbers=Count("phone_key", distinct=True))
+        .order_by("month")
+    )
+    for row in months:
+        month = row["month"].date()
+        report["reports"] += row["reports"]
+        report["months"][month] += row["reports"]
+        # Upper bound: some of these numbers may already have a summary for the month.
+        report["created"] += row["numbers"]
+    return report
+
+
+def _compact_chunk(chunk, now, report, batch_size):
+    orphans = [report_id for report_id, _, _, key in chunk if key is None]
+    reports = [row for row in chunk if row[3] is not None]
+    reputations = reputations_of({reporter_id for _, reporter_id, _, _ in reports}, now)
+
+    rolled_up = defaultdict(lambda: {"report_count": 0, "first": None, "last": None, "weight": 0.0})
+    compacted = []
+    for _, reporter_id, created_at, key in reports:
+        month = date(created_at.year, created_at.month, 1)
+        summary = rolled_up[key, month]
+        summary["report_count"] += 1
+        summary["first"] = min(summary["first"] or created_at, created_at)
+        summary["last"] = max(summary["last"] or created_at, created_at)
+        # Measured from the month start, so the summary decays like the reports it replaces.
+        elapsed = (created_at - month_start(month)).total_seconds()
+        weight = reputations.get(reporter_id, 0.0) * math.exp(spam_scorer.decay_rate * elapsed)
+        summary["weight"] += weight
+        compacted.append(CompactedSpamReport(reported_by_id=reporter_id, phone_key=key, month=month, weight=weight))
+        report["months"][month] += 1
+
+    existing = {
+        (summary.phone_key, summary.month): summary
+        for summary in SpamReportSummary.objects.select_for_update().filter(
+            phone_key__in={key for key, _ in rolled_up}, month__in={month for _, month in rolled_up}
+        )
+    }
+    to_create, to_update = [], []
+    for (key, month), rolled in rolled_up.items():
+        summary = existing.get((key, month))
+        if summary is None:
+            to_create.append(SpamReportSummary(
+                phone_key=key,
+                month=month,
+                report_count=rolled["report_count"],
+                first_reported_at=rolled["first"],
+                last_reported_at=rolled["last"],
+                weight=rolled["weight"],
+            ))
+        else:
+            summary.report_count += rolled["report_count"]
+            summary.first_reported_at = min(summary.first_reported_at, rolled["first"])
+            summary.last_reported_at = max(summary.last_reported_at, rolled["last"])
+            summary.weight += rolled["weight"]
+            to_update.append(summary)
+
+    SpamReportSummary.objects.bulk_create(to_create, batch_size=batch_size)
+    SpamReportSummary.objects.bulk_update(
+        to_update, ["report_count", "first_reported_at", "last_reported_at", "weight"], batch_size=batch_size
+    )
+    CompactedSpamReport.objects.bulk_create(compacted, batch_size=batch_size, ignore_conflicts=True)
+    # The numbers' aggregates and scores already count these reports and stay unchanged, so
+    # skip the collector and the per-row signals that would invalidate their cached lookups.
+    SpamReport.objects.filter(pk__in=[row[0] for row in chunk])._raw_delete(SpamReport.objects.db)
+
+    report["reports"] += len(reports)
+    report["orphans"] += len(orphans)
+    report["created"] += len(to_create)
+    report["updated"] += len(to_update)
+
+
+def compact_reports(before, batch_size=5000, dry_run=False, now=None):
+    """
+    Roll every report created before `before` into its number's monthly summary and delete
+    it, oldest first, one transaction per batch_size reports. Reports without a phone key
+    count towards nothing and are only deleted. With dry_run nothing is written.
+
+    Returns a dict with the compacted "reports", the deleted "orphans", the summaries
+    "created" and "updated", and "months", a Counter of compacted reports per month.
+    """
+    if dry_run:
+        return _preview(before)
+    now = now or timezone.now()
+    report = _empty_report()
+    old = SpamReport.objects.filter(created_at__lt=before).order_by("created_at", "id")
+    while True:
+        with transaction.atomic():
+            # Each batch deletes the reports it read, so the next one starts at the front again.
+            chunk = list(old.values_list("id", "reported_by_id", "created_at", "phone_key")[:batch_size])
+            if not chunk:
+                break
+            _compact_chunk(chunk, now, report, batch_size)
+    return report
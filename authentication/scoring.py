@@ -0,0 +1,201 @@
+"""
+Spam scores. Each report adds its reporter's reputation to the reported number's score,
+and scores decay exponentially with a configurable half-life, so old reports fade and
+reports from new, prolific or contrarian accounts count for less.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import CustomUser, ReporterReputation, SpamAggregate, SpamReport, SpamReportSummary
+
+SECONDS_PER_DAY = 86400
+
+
+def month_start(month):
+    """The aware datetime a SpamReportSummary month starts at."""
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+class SpamScorer:
+    def __init__(self, half_life_days=90, account_age_ramp_days=30, volume_allowance=50, spam_threshold=1.5):
+        self.half_life_days = half_life_days
+        self.account_age_ramp_days = account_age_ramp_days
+        self.volume_allowance = volume_allowance
+        self.spam_threshold = spam_threshold
+        # Per-second decay rate of a report's weight.
+        self.decay_rate = math.log(2) / (half_life_days * SECONDS_PER_DAY)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**{key.lower(): value for key, value in getattr(settings, "SPAM_SCORE", {}).items()})
+
+    def reputation(self, account_age_days, report_count, agreed_count):
+        """
+        Weight of a reporter's reports, about 1 for an established account with no history.
+        Works elementwise on numpy arrays as well as on scalars.
+
+        - Accounts younger than account_age_ramp_days count proportionally less, down to 0.1.
+        - Reporters with more than volume_allowance reports are scaled by sqrt(allowance / reports).
+        - Agreement is the smoothed share of a reporter's numbers that someone else also
+          reported; it scales the weight between 0 and 2.
+        """
+        age = 0.1 + 0.9 * np.clip(account_age_days / self.account_age_ramp_days, 0.0, 1.0)
+        volume = np.sqrt(self.volume_allowance / np.maximum(report_count, self.volume_allowance))
+        agreement = (agreed_count + 1) / (report_count + 2)
+        return age * volume * 2 * agreement
+
+    def decayed(self, score, scored_at, now):
+        if not score or scored_at is None:
+            return 0.0
+        return score * math.exp(-self.decay_rate * (now - scored_at).total_seconds())
+
+    def label(self, score):
+        return "Spam" if score >= self.spam_threshold else "Unknown"
+
+
+spam_scorer = SpamScorer.from_settings()
+
+
+def reputations_of(reporter_ids, now):
+    """{user_id: reputation}; users without a reputation row yet are weighted by account age alone."""
+    reputations = dict(
+        ReporterReputation.objects.filter(user_id__in=reporter_ids).values_list("user_id", "reputation")
+    )
+    missing = set(reporter_ids) - reputations.keys()
+    for user_id, date_joined in CustomUser.objects.filter(pk__in=missing).values_list("id", "date_joined"):
+        age_days = (now - date_joined).total_seconds() / SECONDS_PER_DAY
+        reputations[user_id] = float(spam_scorer.reputation(age_days, 0, 0))
+    return reputations
+
+
+def add_reports(reports, now=None):
+    """
+    Fold newly stored reports, given as (reporter_id, phone_key) pairs, into their numbers'
+    stored scores: each score is decayed to now and the reporters' reputations are added.
+    Call inside a transaction, after the numbers' SpamAggregate rows exist.
+    """
+    if not reports:
+        return
+    now = now or timezone.now()
+    reputations = reputations_of({reporter_id for reporter_id, _ in reports}, now)
+
+    added = defaultdict(float)
+    for reporter_id, key in reports:
+        added[key] += reputations.get(reporter_id, 0.0)
+
+    aggregates = list(SpamAggregate.objects.select_for_update().filter(pk__in=added.keys()).only("score", "scored_at"))
+    for aggregate in aggregates:
+        aggregate.score = round(spam_scorer.decayed(aggregate.score, aggregate.scored_at, now) + added[aggregate.pk], 4)
+        aggregate.scored_at = now
+    SpamAggregate.objects.bulk_update(aggregates, ["score", "scored_at"])
+
+
+def score_numbers(phone_keys, now=None):
+    """
+    Recompute the stored scores of the given numbers from their remaining reports and
+    summaries, weighting reports with their reporters' current reputations. Used when
+    reports are deleted, which add_reports() cannot undo. Call inside a transaction.
+    """
+    phone_keys = set(phone_keys)
+    if not phone_keys:
+        return
+    now = now or timezone.now()
+    reports = list(SpamReport.objects.filter(phone_key__in=phone_keys).values_list("reported_by_id", "phone_key", "created_at"))
+    reputations = reputations_of({reporter_id for reporter_id, _, _ in reports}, now)
+
+    scores = defaultdict(float)
+    for reporter_id, key, created_at in reports:
+        scores[key] += reputations.get(reporter_id, 0.0) * math.exp(-spam_scorer.decay_rate * (now - created_at).total_seconds())
+    for key, month, weight in SpamReportSummary.objects.filter(phone_key__in=phone_keys).values_list("phone_key", "month", "weight"):
+        scores[key] += weight * math.exp(-spam_scorer.decay_rate * (now - month_start(month)).total_seconds())
+
+    aggregates = list(SpamAggregate.objects.select_for_update().filter(pk__in=phone_keys).only("score", "scored_at"))
+    for aggregate in aggregates:
+        aggregate.score = round(scores[aggregate.pk], 4)
+        aggregate.scored_at = now
+    SpamAggregate.objects.bulk_update(aggregates, ["score", "scored_at"])
+
+
+def recompute_scores(now=None, batch_size=1000):
+    """
+    Recompute every reporter's reputation and every number's score from SpamReport with
+    array operations over the whole report table. Compacted reports contribute their
+    summaries' stored weights; reputations only reflect the reports still in the table.
+    Returns (numbers, reporters) written.
+    """
+    now = now or timezone.now()
+    rows = list(
+        SpamReport.objects.filter(phone_key__isnull=False)
+        .values_list("reported_by_id", "phone_key", "created_at")
+        .iterator(chunk_size=10000)
+    )
+    count = len(rows)
+    reporters = np.fromiter((row[0] for row in rows), dtype=np.int64, count=count)
+    keys = np.fromiter((row[1] for row in rows), dtype=np.int64, count=count)
+    ages = now.timestamp() - np.fromiter((row[2].timestamp() for row in rows), dtype=np.float64, count=count)
+    del rows
+
+    summaries = list(SpamReportSummary.objects.values_list("phone_key", "month", "weight").iterator(chunk_size=10000))
+    summary_keys = np.fromiter((row[0] for row in summaries), dtype=np.int64, count=len(summaries))
+    summary_ages = now.timestamp() - np.fromiter(
+        (month_start(row[1]).timestamp() for row in summaries), dtype=np.float64, count=len(summaries)
+    )
+    summary_weights = np.fromiter((row[2] for row in summaries), dtype=np.float64, count=len(summaries))
+    del summaries
+
+    # Index numbers over reports and summaries together; the first count entries are the reports'.
+    key_values, key_index = np.unique(np.concatenate([keys, summary_keys]), return_inverse=True)
+    key_index, summary_index = key_index[:count], key_index[count:]
+    reporter_ids, reporter_index = np.unique(reporters, return_inverse=True)
+
+    # One report per reporter and number, so reports per number is its distinct reporters.
+    reporters_per_number = np.bincount(key_index, minlength=len(key_values))
+    report_counts = np.bincount(reporter_index, minlength=len(reporter_ids))
+    agreed_counts = np.bincount(
+        reporter_index, weights=reporters_per_number[key_index] > 1, minlength=len(reporter_ids)
+    ).astype(np.int64)
+
+    # Reading every user avoids an IN list as long as the reporter set.
+    joined = dict(CustomUser.objects.values_list("id", "date_joined").iterator(chunk_size=10000))
+    account_ages = np.fromiter(
+        ((now - joined[user_id]).total_seconds() / SECONDS_PER_DAY for user_id in reporter_ids.tolist()),
+        dtype=np.float64,
+        count=len(reporter_ids),
+    )
+    reputations = spam_scorer.reputation(account_ages, report_counts, agreed_counts)
+
+    weights = reputations[reporter_index] * np.exp(-spam_scorer.decay_rate * ages)
+    scores = np.bincount(key_index, weights=weights, minlength=len(key_values))
+    scores += np.bincount(
+        summary_index, weights=summary_weights * np.exp(-spam_scorer.decay_rate * summary_ages), minlength=len(key_values)
+    )
+    scores = np.round(scores, 4)
+
+    connection = connections[SpamAggregate.objects.db]
+    table = connection.ops.quote_name(SpamAggregate._meta.db_table)
+    scored_at = connection.ops.adapt_datetimefield_value(now)
+    with transaction.atomic():
+        SpamAggregate.objects.exclude(score=0).update(score=0.0, scored_at=now)
+        # One executemany instead of bulk_update(), whose CASE per row is slow for every number.
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {table} SET score = %s, scored_at = %s WHERE phone_key = %s",
+                [(score, scored_at, key) for key, score in zip(key_values.tolist(), scores.tolist())],
+            )
+        ReporterReputation.objects.all().delete()
+        ReporterReputation.objects.bulk_create(
+            (
+                ReporterReputation(
+                    user_id=user_id, reputation=reputation, report_count=reports, agreed_count=agreed, updated_at=now
+                )
+                for user_id, reputation, reports, agreed in zip(
+                    reporter_ids.tolist(), reputations.tolist(), report_counts.tolist(), agreed_counts.tolist()
+                )
+            ),
+            batch_size=batch_size,
+        )
+    return len(key_values), len(reporter_ids)
@@ -0,0 +1,99 @@
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count
+from .models import Contact, CustomUser, NameTrigram
+
+# Substrings shorter than a trigram cannot be answered from the index.
+MIN_INDEXED_QUERY_LENGTH = 3
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def uses_database_trigrams(using=None):
+    """PostgreSQL answers icontains from a pg_trgm GIN index, so the posting table is not needed there."""
+    return connections[using or DEFAULT_DB_ALIAS].vendor == "postgresql"
+
+
+def _chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_postings(source, rows, using):
+    """
+    Insert the postings of (object_id, name) pairs with one executemany. Postings are
+    plain triples, so skipping model instances makes bulk rebuilds several times faster.
+    """
+    table = connections[using].ops.quote_name(NameTrigram._meta.db_table)
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (trigram, source, object_id) VALUES (%s, %s, %s)",
+            [(gram, source, object_id) for object_id, name in rows for gram in trigrams(name)],
+        )
+
+
+def index_names(source, rows, using=None, batch_size=500, replace=True):
+    """
+    Replace the trigram postings of (object_id, name) pairs belonging to one source.
+    Pass replace=False for rows that were just created and have no postings yet.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    if uses_database_trigrams(using):
+        return
+    with transaction.atomic(using=using):
+        for chunk in _chunked(rows, batch_size):
+            if replace:
+                NameTrigram.objects.using(using).filter(
+                    source=source, object_id__in=[object_id for object_id, _ in chunk]
+                ).delete()
+            _insert_postings(source, chunk, using)
+
+
+def unindex_names(source, object_ids, using=None, batch_size=500):
+    using = using or DEFAULT_DB_ALIAS
+    if uses_database_trigrams(using):
+        return
+    for chunk in _chunked(object_ids, batch_size):
+        NameTrigram.objects.using(using).filter(source=source, object_id__in=chunk).delete()
+
+
+def rebuild_name_index(using=None, batch_size=1000):
+    """Re-index every user and contact name. Returns the number of names indexed."""
+    using = using or DEFAULT_DB_ALIAS
+    if uses_database_trigrams(using):
+        return 0
+    total = 0
+    with transaction.atomic(using=using):
+        NameTrigram.objects.using(using).all().delete()
+        for source, model in ((NameTrigram.USER, CustomUser), (NameTrigram.CONTACT, Contact)):
+            rows = model.objects.using(using).values_list("id", "name").order_by().iterator(chunk_size=batch_size)
+            for chunk in _chunked(rows, batch_size):
+                _insert_postings(source, chunk, using)
+                total += len(chunk)
+    return total
+
+
+def filter_by_name(queryset, query, source):
+    """Restrict queryset to rows whose name contains query, using the trigram index when possible."""
+    queryset = queryset.filter(name__icontains=query)
+    if len(query) < MIN_INDEXED_QUERY_LENGTH or uses_database_trigrams(queryset.db):
+        return queryset
+
+    grams = trigrams(query)
+    candidates = (
+        NameTrigram.objects.using(queryset.db).filter(source=source, trigram__in=grams)
+        .values("object_id")
+        .annotate(hits=Count("id"))
+        .filter(hits=len(grams))
+        .values("object_id")
+    )
+    # icontains still runs, but only against the candidate rows the index produced.
+    return queryset.filter(pk__in=candidates)
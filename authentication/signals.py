@@ -0,0 +1,62 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import CompactedSpamReport, Contact, CustomUser, NameTrigram, SpamReport, SpamReportSummary
+from .backends import token_user_cache
+from .phone import match_keys, phone_key
+from .search import index_names, unindex_names
+
+
+@receiver(pre_save, sender=CustomUser)
+@receiver(pre_save, sender=Contact)
+@receiver(pre_save, sender=SpamReport)
+def set_phone_key(sender, instance, **kwargs):
+    instance.phone_key = phone_key(instance.phone_number)
+    if sender is not SpamReport:
+        for field, value in match_keys(instance.phone_key).items():
+            setattr(instance, field, value)
+
+
+def _name_changed(update_fields):
+    return update_fields is None or "name" in update_fields
+
+
+@receiver(post_save, sender=CustomUser)
+def index_user_name(sender, instance, update_fields=None, using=None, **kwargs):
+    if _name_changed(update_fields):
+        index_names(NameTrigram.USER, [(instance.pk, instance.name)], using=using)
+
+
+@receiver(post_delete, sender=CustomUser)
+def unindex_user_name(sender, instance, using=None, **kwargs):
+    unindex_names(NameTrigram.USER, [instance.pk], using=using)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def forget_token_user(sender, instance, **kwargs):
+    token_user_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Contact)
+def index_contact_name(sender, instance, update_fields=None, using=None, **kwargs):
+    if _name_changed(update_fields):
+        index_names(NameTrigram.CONTACT, [(instance.pk, instance.name)], using=using)
+
+
+@receiver(post_delete, sender=Contact)
+def unindex_contact_name(sender, instance, using=None, **kwargs):
+    unindex_names(NameTrigram.CONTACT, [instance.pk], using=using)
+
+
+@receiver(post_delete, sender=CompactedSpamReport)
+def uncount_compacted_report(sender, instance, using=None, **kwargs):
+    # Deleting the reporter takes their report out of its summary; the number's aggregate
+    # and score are then recomputed from the summaries when the transaction commits.
+    if instance.month is None:
+        return
+    summaries = SpamReportSummary.objects.using(using).filter(phone_key=instance.phone_key, month=instance.month)
+    summaries.filter(report_count__lte=1).delete()
+    summaries.filter(report_count__gt=1).update(
+        report_count=F("report_count") - 1, weight=F("weight") - instance.weight
+    )
@@ -0,0 +1,58 @@
+from django.test import TestCase
+from .contacts import sync_contacts
+from .models import Contact, CustomUser, NameTrigram
+from .search import filter_by_name, rebuild_name_index, trigrams
+
+
+class NameIndexTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user("9000000000", "Owner", password="password123")
+
+    def postings(self, source, object_id):
+        return set(NameTrigram.objects.filter(source=source, object_id=object_id).values_list("trigram", flat=True))
+
+    def found(self, query):
+        return set(filter_by_name(Contact.objects.all(), query, NameTrigram.CONTACT).values_list("name", flat=True))
+
+    def test_saving_and_deleting_keeps_the_postings_in_step(self):
+        contact = Contact.objects.create(user=self.user, name="Plumber Joe", phone_number="9876500001")
+        self.assertEqual(self.postings(NameTrigram.CONTACT, contact.pk), trigrams("Plumber Joe"))
+        self.assertEqual(self.postings(NameTrigram.USER, self.user.pk), trigrams("Owner"))
+
+        contact.name = "Electrician"
+        contact.save()
+        self.assertEqual(self.postings(NameTrigram.CONTACT, contact.pk), trigrams("Electrician"))
+        self.assertEqual(self.found("plumb"), set())
+        self.assertEqual(self.found("TRICIAN"), {"Electrician"})
+
+        # Saving other fields leaves the postings alone.
+        contact.phone_number = "9876500002"
+        contact.save(update_fields=["phone_number"])
+        self.assertEqual(self.postings(NameTrigram.CONTACT, contact.pk), trigrams("Electrician"))
+
+        contact_id = contact.pk
+        contact.delete()
+        self.assertEqual(self.postings(NameTrigram.CONTACT, contact_id), set())
+
+    def test_contact_sync_indexes_its_bulk_writes(self):
+        sync_contacts(self.user, [("Plumber", "9876500001"), ("Baker", "9876500002")])
+        sync_contacts(self.user, [("Master Plumber", "9876500001"), ("Grocer", "9876500003")])
+        self.assertEqual(self.found("plumber"), {"Master Plumber"})
+        self.assertEqual(self.found("bak"), set())
+        self.assertEqual(self.found("grocer"), {"Grocer"})
+        for contact in Contact.objects.all():
+            self.assertEqual(self.postings(NameTrigram.CONTACT, contact.pk), trigrams(contact.name))
+        self.assertEqual(NameTrigram.objects.filter(source=NameTrigram.CONTACT).count(), sum(
+            len(trigrams(name)) for name in Contact.objects.values_list("name", flat=True)
+        ))
+
+    def test_a_rebuild_catches_up_with_writes_that_bypass_signals(self):
+        Contact.objects.bulk_create([Contact(user=self.user, name="Carpenter", phone_number="9876500001")])
+        self.assertEqual(self.found("carpent"), set())
+        Contact.objects.filter(name="Carpenter").update(name="Roofer")
+
+        self.assertEqual(rebuild_name_index(), 2)
+        contact = Contact.objects.get()
+        self.assertEqual(self.postings(NameTrigram.CONTACT, contact.pk), trigrams("Roofer"))
+        self.assertEqual(self.found("roof"), {"Roofer"})
+        self.assertEqual(self.found("carpent"), set())
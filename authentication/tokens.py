@@ -0,0 +1,101 @@
+import threading
+import time
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import aware_utcnow
+from rest_framework_simplejwt import tokens
+
+
+class BlacklistIndex:
+    """
+    In-memory set of the jtis of blacklisted refresh tokens that have not expired yet,
+    answering membership on its own: it is at most refresh_interval seconds (plus one
+    catch-up query) behind the database. New rows are pulled in with one primary-key range
+    query on BlacklistedToken once the set is that old, by one caller while the others keep
+    answering from the set, and expired jtis are dropped as they age out, so the set only
+    ever holds live sessions.
+    """
+
+    def __init__(self, refresh_interval=2):
+        self.refresh_interval = refresh_interval
+        self._expiry = {}
+        self._watermark = None
+        self._refreshed_at = 0.0
+        self._pruned_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _catch_up(self):
+        # Runs under _refresh_lock only; membership checks go on while it queries.
+        started = time.monotonic()
+        watermark, fetched = self._watermark, {}
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+        if watermark is not None:
+            rows = rows.filter(id__gt=watermark)
+        for row_id, jti, expires_at in rows.values_list("id", "token__jti", "token__expires_at").order_by("id").iterator():
+            fetched[jti] = expires_at.timestamp()
+            watermark = row_id
+        with self._lock:
+            self._expiry.update(fetched)
+            if started - self._pruned_at >= 60:
+                now = time.time()
+                self._expiry = {jti: expires_at for jti, expires_at in self._expiry.items() if expires_at > now}
+                self._pruned_at = started
+            self._watermark = watermark or 0
+            self._refreshed_at = started
+
+    def _refresh(self):
+        if self._watermark is None:
+            # Nothing to answer from yet, so wait for the first load.
+            with self._refresh_lock:
+                if self._watermark is None:
+                    self._catch_up()
+        elif time.monotonic() - self._refreshed_at >= self.refresh_interval and self._refresh_lock.acquire(blocking=False):
+            try:
+                self._catch_up()
+            finally:
+                self._refresh_lock.release()
+
+    def __contains__(self, jti):
+        self._refresh()
+        with self._lock:
+            return jti in self._expiry
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._expiry[jti] = exp
+
+    def __len__(self):
+        with self._lock:
+            return len(self._expiry)
+
+
+blacklist_index = BlacklistIndex(**{
+    key.lower(): value for key, value in getattr(settings, "TOKEN_BLACKLIST_INDEX", {}).items()
+})
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    RefreshToken whose blacklist check is answered by BlacklistIndex without a query. A
+    token this worker blacklisted is refused at once; one blacklisted by another worker
+    is refused once the index catches up, within TOKEN_BLACKLIST_INDEX['REFRESH_INTERVAL']
+    seconds.
+    """
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in blacklist_index:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        blacklist_index.add(self.payload[api_settings.JTI_CLAIM], self.payload["exp"])
+        return result
+
+
+class RefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
@@ -1,8 +1,10 @@
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import register_endpoint,logout_endpoint, login_endpoint
 
 urlpatterns = [
     path('register/',register_endpoint , name='register'),
     path('login/', login_endpoint, name='login'),
     path('logout/',logout_endpoint,name='logout'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
@@ -5,12 +5,12 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import authenticate, login, logout
-from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import UserSerializer, LoginSerializer
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from .tokens import RefreshToken
 from uuid import uuid4
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import ValidationError, AuthenticationFailed
+from falsecaller.routers import record_write
 
 User = get_user_model()
 
@@ -30,7 +30,7 @@ def is_valid_password(password):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_endpoint(request):
-    logger.info("Register endpoint hit with data: %s", request.data)
+    logger.info("Register endpoint hit for phone number: %s", request.data.get("phone_number"))
     
     password = request.data.get("password", "")
 
@@ -47,6 +47,7 @@ def register_endpoint(request):
     try:
         if serializer.is_valid():
             user = serializer.save()
+            record_write(user.pk)
             logger.info("User created successfully: %s", user.phone_number)
             return Response({
                 "message": "User created successfully"
@@ -64,7 +65,7 @@ def register_endpoint(request):
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_endpoint(request):
-    logger.info("Login endpoint hit with data: %s", request.data)
+    logger.info("Login endpoint hit for phone number: %s", request.data.get("phone_number"))
     serializer = LoginSerializer(data=request.data)
     try:
         if serializer.is_valid():
@@ -121,22 +122,9 @@ def logout_endpoint(request):
 @permission_classes([IsAuthenticated])
 def logout_endpoint_v2(request):
     logger.info("Logout endpoint v2 hit for user: %s", request.user.phone_number)
-    auth_header = request.headers.get("Authorization", None)
-
-    if auth_header is None:
-        logger.warning("Authorization header missing for user: %s", request.user.phone_number)
-        return Response(
-            {"error": "Authorization header missing"},
-            status=status.HTTP_401_UNAUTHORIZED,
-        )
+    user = request.user
 
     try:
-        token = auth_header.split(" ")[1]
-        jwt_auth = JWTAuthentication()
-        validated_token = jwt_auth.get_validated_token(token)
-        user = jwt_auth.get_user(validated_token)
-        logger.info("Authenticated user for logout: %s", user.phone_number)
-
         refresh_token = request.data.get("refresh_token")
         
         if refresh_token is None:
@@ -155,12 +143,6 @@ def logout_endpoint_v2(request):
             status=status.HTTP_200_OK,
         )
     
-    except IndexError:
-        logger.error("Invalid token format provided for logout")
-        return Response(
-            {"error": "Invalid token format."},
-            status=status.HTTP_401_UNAUTHORIZED,
-        )
     except Exception as e:
         logger.error("Unexpected error during logout v2: %s", str(e))
         return Response(
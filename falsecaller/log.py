@@ -0,0 +1,142 @@
+"""
+Logging that stays off the request path. BackgroundHandler only queues records; a
+listener thread renders them as JSON lines and writes them, so a slow or blocked stream
+never adds to request latency. SamplingFilter thins out high-volume info lines per logger
+before they are queued, and values under sensitive keys are redacted before they can
+reach a message.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from collections.abc import Mapping
+from logging.handlers import QueueHandler, QueueListener
+
+REDACTED = "[redacted]"
+
+# Keys whose values are never logged, matched case-insensitively as substrings.
+SENSITIVE_KEYS = ("password", "token", "secret", "authorization")
+
+# Attributes every LogRecord has; anything else on a record came from `extra`.
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def redact(value):
+    """A copy of value with the values of sensitive keys replaced, through nested mappings and lists."""
+    if isinstance(value, Mapping):
+        return {
+            key: REDACTED if any(word in str(key).lower() for word in SENSITIVE_KEYS) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with any `extra` fields alongside the standard ones."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                entry[name] = redact(value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass a `rates[logger]` share of the records at INFO and below from each logger named
+    in rates (or from its children); warnings and errors always pass.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved = {}
+
+    def _rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Queue records for a listener thread that formats and writes them to stream (stderr by
+    default). When max_queued records are waiting, new ones are dropped and counted
+    instead of blocking the caller.
+    """
+
+    def __init__(self, stream=None, max_queued=10000):
+        super().__init__(queue.Queue(max_queued))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, in the target handler.
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """
+        Freeze the record for the listener thread: merge its arguments, after redacting
+        mappings among them, so later changes to those objects cannot leak into the log.
+        """
+        record = copy.copy(record)
+        if record.args:
+            if isinstance(record.args, Mapping):
+                record.args = redact(record.args)
+            else:
+                record.args = tuple(redact(arg) for arg in record.args)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames that keep changing; render them while they are intact.
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            # Writes whatever is still queued before the thread exits.
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
@@ -0,0 +1,135 @@
+import random
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+# Database that reads of the current request go to; None means the primary.
+_read_alias = ContextVar("replica_read_alias", default=None)
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def _routing_settings():
+    config = getattr(settings, "REPLICA_ROUTING", {})
+    return config.get("CACHE_ALIAS", "default"), config.get("READ_YOUR_WRITES_WINDOW", 5)
+
+
+def _wrote_key(user_id):
+    return f"replica-routing:wrote:{user_id}"
+
+
+class ReplicaRouter:
+    """
+    Send the reads of views decorated with read_from_replica to a replica, and every
+    write, migration and other read to the primary (default) database.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+def reading_from_replica():
+    """Whether reads of the current request go to a replica."""
+    return _read_alias.get() is not None
+
+
+def replica_lag_window():
+    """Seconds a write is assumed to take to reach every replica."""
+    return _routing_settings()[1]
+
+
+def record_write(user_id):
+    """Keep user_id's reads on the primary for the read-your-writes window."""
+    if replica_aliases() and user_id is not None:
+        alias, window = _routing_settings()
+        caches[alias].set(_wrote_key(user_id), True, window)
+
+
+def _replica_for(wrote_recently):
+    replicas = replica_aliases()
+    return random.choice(replicas) if replicas and not wrote_recently else None
+
+
+def _stream_from(alias, content):
+    # Streamed bodies run their queries after the view returns, so route each step again.
+    iterator = iter(content)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield chunk
+
+
+async def _astream_from(alias, content):
+    iterator = aiter(content)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = await anext(iterator)
+        except StopAsyncIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield chunk
+
+
+def _routed(response, alias):
+    if alias and getattr(response, "streaming", False):
+        if response.is_async:
+            response.streaming_content = _astream_from(alias, response.streaming_content)
+        else:
+            response.streaming_content = _stream_from(alias, response.streaming_content)
+    return response
+
+
+def read_from_replica(view):
+    """
+    Route the queries of a read-only view to a randomly chosen replica, unless the
+    requesting user wrote within the read-your-writes window. Apply it below the
+    decorators that authenticate the request, so request.user is resolved.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user_id = getattr(request.user, "pk", None)
+            alias, _ = _routing_settings()
+            wrote = bool(replica_aliases()) and user_id is not None and await caches[alias].aget(_wrote_key(user_id))
+            replica = _replica_for(wrote)
+            token = _read_alias.set(replica)
+            try:
+                return _routed(await view(request, *args, **kwargs), replica)
+            finally:
+                _read_alias.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        user_id = getattr(request.user, "pk", None)
+        alias, _ = _routing_settings()
+        wrote = bool(replica_aliases()) and user_id is not None and caches[alias].get(_wrote_key(user_id))
+        replica = _replica_for(wrote)
+        token = _read_alias.set(replica)
+        try:
+            return _routed(view(request, *args, **kwargs), replica)
+        finally:
+            _read_alias.reset(token)
+    return wrapper
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,12 +26,14 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'authentication',
+    'api',
     'rest_framework',
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,6 +74,110 @@ DATABASES = {
     }
 }
 
+# Read-only lookup views read from one of these aliases; everything else uses 'default'.
+# Set FALSECALLER_REPLICA_DB to a second SQLite file to try it locally (see readme).
+if os.environ.get('FALSECALLER_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['FALSECALLER_REPLICA_DB'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['falsecaller.routers.ReplicaRouter']
+
+# A user who wrote is read from the primary for READ_YOUR_WRITES_WINDOW seconds, tracked in
+# this cache alias. Point it at a shared cache when running several workers. The window also
+# stops lookups read from a replica from caching numbers changed within it.
+REPLICA_ROUTING = {
+    'CACHE_ALIAS': 'default',
+    'READ_YOUR_WRITES_WINDOW': 5,
+}
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Number lookups are served through an in-process LRU in front of this cache alias.
+# TIMEOUT also bounds how long another worker's local tier can serve a stale entry.
+LOOKUP_CACHE = {
+    'ALIAS': 'default',
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 60,
+}
+
+# Bloom filter of reported numbers that lets lookups answer "never reported" without a query.
+# The file lets restarted workers skip the rebuild; the filter is resized once it holds
+# more than CAPACITY numbers. Each refresh rereads the last CATCH_UP_OVERLAP seconds of
+# reports, which covers transactions that commit up to that long after they stamp a report.
+SPAM_FILTER = {
+    'PATH': BASE_DIR / 'spam_filter.bin',
+    'CAPACITY': 1_000_000,
+    'FALSE_POSITIVE_RATE': 0.01,
+    'REFRESH_INTERVAL': 5,
+    'SAVE_INTERVAL': 60,
+    'CATCH_UP_OVERLAP': 60,
+}
+
+# mark_spam only enqueues; reports are written in batches of up to MAX_BATCH, at most
+# FLUSH_INTERVAL seconds after they are accepted. Failed flushes are retried after a delay
+# that doubles per consecutive failure, up to MAX_RETRY_DELAY seconds.
+SPAM_REPORT_BUFFER = {
+    'MAX_BATCH': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 50000,
+    'MAX_RETRY_DELAY': 30.0,
+}
+
+# Crowd-sourced names are recomputed in the background REFRESH_DELAY seconds after a
+# contact change, at most MAX_BATCH numbers per refresh.
+NUMBER_IDENTITY = {
+    'REFRESH_DELAY': 2.0,
+    'MAX_BATCH': 1000,
+}
+
+# Spam scoring: report weights halve every HALF_LIFE_DAYS; a number is labelled spam once
+# its score reaches SPAM_THRESHOLD, more than one reporter without a track record can give it.
+SPAM_SCORE = {
+    'HALF_LIFE_DAYS': 90,
+    'ACCOUNT_AGE_RAMP_DAYS': 30,
+    'VOLUME_ALLOWANCE': 50,
+    'SPAM_THRESHOLD': 1.5,
+}
+
+# compact_spam_reports rolls reports older than DAYS into per-number monthly summaries and
+# deletes them, BATCH_SIZE reports per transaction.
+SPAM_REPORT_RETENTION = {
+    'DAYS': 365,
+    'BATCH_SIZE': 5000,
+}
+
+# export_spam_snapshot writes snapshot and delta files to DIR. A delta also covers the
+# DELTA_OVERLAP seconds before its base version, for reports that committed late.
+SPAM_SNAPSHOT = {
+    'DIR': BASE_DIR / 'spam_snapshots',
+    'DELTA_OVERLAP': 60,
+}
+
+# Per-view request metrics; WINDOW is how many recent requests percentiles are taken over.
+REQUEST_METRICS = {
+    'WINDOW': 1000,
+}
+
+# Besides admin users, /api/metrics/ is open to scrapers sending SCRAPE_TOKEN in an
+# X-Metrics-Token header or connecting from SCRAPE_ADDRESSES (addresses or networks such as
+# '10.0.0.0/8'). Server-Timing headers go to admin users only unless SERVER_TIMING is on.
+METRICS_ACCESS = {
+    'SCRAPE_TOKEN': os.environ.get('FALSECALLER_METRICS_TOKEN', ''),
+    'SCRAPE_ADDRESSES': [],
+    'SERVER_TIMING': False,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -93,12 +200,30 @@ AUTH_PASSWORD_VALIDATORS = [
 AUTH_USER_MODEL = 'authentication.CustomUser'
 
 # DRF Settings
+# JSON goes through orjson when it is installed (see api/renderers.py); the browsable API
+# is only offered while debugging.
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.backends.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+    ) + (('rest_framework.renderers.BrowsableAPIRenderer',) if DEBUG else ()),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
+# Users resolved from access tokens are kept until the token expires. Saving or deleting a
+# user bumps their version in CACHE_ALIAS, which drops their entries in every worker that
+# shares the alias; with the per-process default cache only this worker sees it.
+JWT_USER_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'CACHE_ALIAS': 'default',
+}
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -106,6 +231,14 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.tokens.RefreshSerializer',
+}
+
+# Blacklisted tokens are rejected from memory without a query. Blacklistings made by other
+# workers are pulled in every REFRESH_INTERVAL seconds, so a token blacklisted elsewhere
+# can still be used for up to that long.
+TOKEN_BLACKLIST_INDEX = {
+    'REFRESH_INTERVAL': 2,
 }
 
 
@@ -132,13 +265,30 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-import os
 import logging
 
+# Share of INFO and DEBUG records kept per logger (and its children); warnings and errors
+# are always kept.
+LOG_SAMPLING = {
+    'api.views': 0.1,
+    'api.async_views': 0.1,
+}
+
+# Records are queued by the console handler and written as JSON lines by a background
+# thread; once max_queued are waiting, further ones are dropped rather than block a request.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': 'falsecaller.log.SamplingFilter',
+            'rates': LOG_SAMPLING,
+        },
+    },
     'formatters': {
+        'json': {
+            '()': 'falsecaller.log.JSONFormatter',
+        },
         'verbose': {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
@@ -150,9 +300,11 @@ LOGGING = {
     },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',  
-            'level': 'DEBUG',  
+            'class': 'falsecaller.log.BackgroundHandler',
+            'formatter': 'json',
+            'filters': ['sampling'],
+            'level': 'DEBUG',
+            'max_queued': 10000,
         },
     },
     'loggers': {